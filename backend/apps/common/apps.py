@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 from django.utils.translation import gettext_lazy as _
 
 
@@ -6,3 +7,11 @@ class CommonConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.common"
     verbose_name = _("Common")
+
+    def ready(self):
+        from apps.common import cache, counts
+        from apps.common.db import configure_sqlite
+
+        counts.connect_signals()
+        cache.connect_signals()
+        connection_created.connect(configure_sqlite, dispatch_uid="configure-sqlite")
@@ -0,0 +1,184 @@
+"""
+Async DRF views for read endpoints served under ASGI.
+
+DRF's APIView is synchronous: `request.user` authenticates lazily with a
+blocking ORM query and permissions are plain method calls. AsyncAPIView
+awaits authentication (AsyncJWTAuthentication loads the user with `aget`)
+and permissions (a permission may define `async def has_permission`) before
+awaiting the handler, so a request waiting on the database does not hold a
+worker thread. Querysets are evaluated with async iteration/aget; serializers
+then run on already-loaded objects, so views must select/prefetch everything
+their serializer touches.
+
+With settings.ASYNC_READ_VIEWS (set by config/asgi.py) the URLconfs route
+GET/HEAD of the hot read endpoints to these views via read_write_view() and
+every other method to the existing synchronous view.
+"""
+
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication whose user lookup uses the async ORM."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = await self.user_model.objects.aget(
+                **{jwt_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            jwt_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
+
+
+async def _maybe_await(value):
+    return await value if inspect.isawaitable(value) else value
+
+
+class AsyncAPIView(APIView):
+    authentication_classes = [AsyncJWTAuthentication]
+
+    async def aperform_authentication(self, request):
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, "aauthenticate"):
+                    user_auth = await authenticator.aauthenticate(request)
+                else:
+                    user_auth = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+        request._not_authenticated()
+
+    async def acheck_permissions(self, request):
+        for permission in self.get_permissions():
+            if not await _maybe_await(permission.has_permission(request, self)):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, "message", None),
+                    code=getattr(permission, "code", None),
+                )
+
+    async def acheck_object_permissions(self, request, obj):
+        for permission in self.get_permissions():
+            if not await _maybe_await(permission.has_object_permission(request, self, obj)):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, "message", None),
+                    code=getattr(permission, "code", None),
+                )
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+        await self.aperform_authentication(request)
+        await self.acheck_permissions(request)
+        self.check_throttles(request)
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = await _maybe_await(handler(request, *args, **kwargs))
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        return await sync_to_async(super().options)(request, *args, **kwargs)
+
+
+class AsyncListAPIView(AsyncAPIView, GenericAPIView):
+    async def aget_objects(self):
+        return [obj async for obj in self.filter_queryset(self.get_queryset())]
+
+    async def get(self, request, *args, **kwargs):
+        objects = await self.aget_objects()
+        return Response(self.get_serializer(objects, many=True).data)
+
+
+class AsyncRetrieveAPIView(AsyncAPIView, GenericAPIView):
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError):
+            raise Http404
+        await self.acheck_object_permissions(self.request, obj)
+        return obj
+
+    async def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+
+def read_write_view(read_view, write_view):
+    """
+    One URL, two views: GET/HEAD go to the async `read_view`, everything else
+    to the synchronous `write_view` in a worker thread.
+    """
+
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read_view(request, *args, **kwargs)
+        return await sync_to_async(write_view)(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
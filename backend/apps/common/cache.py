@@ -0,0 +1,266 @@
+"""
+Response caching for public and role-scoped read endpoints.
+
+Views opt in with CachedResponseMixin and name the models their output depends
+on (`cache_models`). Cache keys embed a version counter per model, bumped by
+save/delete/m2m signals for settings.RESPONSE_CACHE_MODELS, so any change to
+a Route, Location or Vehicle makes every dependent entry unreachable instead
+of deleting keys one by one. Stale entries age out via RESPONSE_CACHE_TIMEOUT.
+
+Only serialized `response.data` of 200 responses is cached; authentication,
+permissions and content negotiation still run on every request. A miss takes
+a short rebuild lock so concurrent misses for the same key wait for one
+rebuild instead of all hitting the database (stampede protection).
+
+queryset.update()/bulk_create() bypass signals; call bump_version() after them.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+VERSION_PREFIX = "model-version"
+LOCK_POLL_INTERVAL = 0.02
+# rest_framework.permissions.SAFE_METHODS. This module is imported from
+# AppConfig.ready(), so it keeps DRF (and the optional requests/yaml imports
+# of rest_framework.compat) out of process startup.
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_metrics_lock = threading.Lock()
+CACHE_METRICS = {
+    "hits": 0,
+    "misses": 0,
+    "stampede_waits": 0,
+    "stampede_wait_hits": 0,
+    "uncacheable": 0,
+}
+
+
+def _record(**deltas):
+    with _metrics_lock:
+        for name, delta in deltas.items():
+            CACHE_METRICS[name] += delta
+
+
+def get_cache_metrics():
+    with _metrics_lock:
+        metrics = dict(CACHE_METRICS)
+    lookups = metrics["hits"] + metrics["misses"]
+    metrics["hit_ratio"] = round(metrics["hits"] / lookups, 4) if lookups else None
+    return metrics
+
+
+def reset_cache_metrics():
+    with _metrics_lock:
+        for name in CACHE_METRICS:
+            CACHE_METRICS[name] = 0
+
+
+def _version_key(label):
+    return f"{VERSION_PREFIX}:{label}"
+
+
+def _initial_version():
+    # Clock-based so a counter lost to eviction or a restart never restarts
+    # at a value that older, still-cached entries were keyed with.
+    return time.time_ns()
+
+
+def model_versions(labels):
+    """{label: version} for `labels`, initialising missing counters."""
+    keys = {label: _version_key(label) for label in labels}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for label, key in keys.items():
+        if key not in found:
+            # add() so a concurrent bump is not overwritten.
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[label] = found[key]
+    return versions
+
+
+async def amodel_versions(labels):
+    keys = {label: _version_key(label) for label in labels}
+    found = await cache.aget_many(keys.values())
+    for label, key in keys.items():
+        if key not in found:
+            await cache.aadd(key, _initial_version(), timeout=None)
+            found[key] = await cache.aget(key)
+    return {label: found[key] for label, key in keys.items()}
+
+
+def bump_version(label):
+    key = _version_key(label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+@lru_cache(maxsize=None)
+def cached_models():
+    return tuple(apps.get_model(label) for label in settings.RESPONSE_CACHE_MODELS)
+
+
+def _on_change(sender, **kwargs):
+    label = sender._meta.label
+    transaction.on_commit(lambda: bump_version(label))
+
+
+def _on_m2m_change(sender, instance, action, model, **kwargs):
+    if not action.startswith("post_"):
+        return
+    labels = {type(instance)._meta.label, model._meta.label} & set(
+        settings.RESPONSE_CACHE_MODELS
+    )
+    for label in labels:
+        transaction.on_commit(lambda label=label: bump_version(label))
+
+
+def connect_signals():
+    for model in cached_models():
+        uid = f"response-cache-{model._meta.label}"
+        post_save.connect(_on_change, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_change, sender=model, dispatch_uid=uid)
+        for field in model._meta.local_many_to_many:
+            m2m_changed.connect(
+                _on_m2m_change, sender=field.remote_field.through, dispatch_uid=uid
+            )
+
+
+class CachedResponseMixin:
+    """
+    View opt-in for caching GET list/retrieve responses.
+
+    cache_models: model labels the response depends on.
+    cache_scope: "public" (one entry for everyone), "role" (per user role) or
+        "user" (per user).
+    """
+
+    cache_models = ()
+    cache_scope = "public"
+    cache_timeout = None
+
+    def get_cache_key(self, request, versions=None):
+        if self.cache_scope == "user":
+            scope = f"user-{request.user.pk}"
+        elif self.cache_scope == "role":
+            scope = f"role-{getattr(request.user, 'role', None) or 'anonymous'}"
+        else:
+            scope = "public"
+        if versions is None:
+            versions = model_versions(self.cache_models)
+        version = ".".join(str(versions[label]) for label in self.cache_models)
+        # Host is part of the key because serializers build absolute URLs.
+        target = hashlib.md5(
+            f"{request.get_host()}{request.get_full_path()}".encode()
+        ).hexdigest()
+        return f"response:{self.cache_name()}:{scope}:{version}:{target}"
+
+    def cache_name(self):
+        return type(self).__name__
+
+    def cached_response(self, request, build):
+        """Return a cached Response for this request or build() and cache it."""
+        if request.method not in SAFE_METHODS:
+            return build()
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _record(hits=1)
+            return self._cached(data, "HIT")
+        _record(misses=1)
+
+        lock_key = f"{key}:lock"
+        lock_timeout = settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        if not cache.add(lock_key, 1, timeout=lock_timeout):
+            _record(stampede_waits=1)
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                data = cache.get(key)
+                if data is not None:
+                    _record(stampede_wait_hits=1)
+                    return self._cached(data, "HIT")
+                if cache.get(lock_key) is None:
+                    break
+            # The rebuilder failed or is too slow; serve this one uncached.
+            return build()
+
+        try:
+            response = build()
+            if response.status_code == 200:
+                timeout = self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+                cache.set(key, response.data, timeout=timeout)
+                response["X-Cache"] = "MISS"
+            else:
+                _record(uncacheable=1)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    async def acached_response(self, request, build):
+        """cached_response() for async views; `build` returns an awaitable."""
+        if request.method not in SAFE_METHODS:
+            return await build()
+        versions = await amodel_versions(self.cache_models)
+        key = self.get_cache_key(request, versions)
+        data = await cache.aget(key)
+        if data is not None:
+            _record(hits=1)
+            return self._cached(data, "HIT")
+        _record(misses=1)
+
+        lock_key = f"{key}:lock"
+        lock_timeout = settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        if not await cache.aadd(lock_key, 1, timeout=lock_timeout):
+            _record(stampede_waits=1)
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                data = await cache.aget(key)
+                if data is not None:
+                    _record(stampede_wait_hits=1)
+                    return self._cached(data, "HIT")
+                if await cache.aget(lock_key) is None:
+                    break
+            return await build()
+
+        try:
+            response = await build()
+            if response.status_code == 200:
+                timeout = self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+                await cache.aset(key, response.data, timeout=timeout)
+                response["X-Cache"] = "MISS"
+            else:
+                _record(uncacheable=1)
+            return response
+        finally:
+            await cache.adelete(lock_key)
+
+    def _cached(self, data, state):
+        from rest_framework.response import Response
+
+        response = Response(data)
+        response["X-Cache"] = state
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs),
+        )
@@ -0,0 +1,161 @@
+"""
+Maintained row counts for large tables.
+
+Exact `COUNT(*)` is a full table scan on SQLite. For the models and filters
+listed in settings.TRACKED_ROW_COUNTS we keep a RowCount row that is moved by
+save/delete signals and corrected by `manage.py reconcile_counts`, which also
+covers bulk_create()/update()/queryset.delete() that bypass signals.
+Values served from RowCount are therefore approximate.
+"""
+
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .models import RowCount
+
+
+def count_key(label, filters=None):
+    if not filters:
+        return label
+    return label + "?" + "&".join(f"{k}={v}" for k, v in sorted(filters.items()))
+
+
+@lru_cache(maxsize=None)
+def tracked_models():
+    """{model: [(key, filters), ...]} built from settings.TRACKED_ROW_COUNTS."""
+    tracked = {}
+    for label, filter_list in settings.TRACKED_ROW_COUNTS.items():
+        model = apps.get_model(label)
+        tracked[model] = [(count_key(label, f), f) for f in filter_list]
+    return tracked
+
+
+def _matches(values, filters):
+    return all(str(values.get(field)) == str(value) for field, value in filters.items())
+
+
+def _snapshot(instance, entries):
+    # Read from __dict__ so deferred fields never trigger a query.
+    fields = {field for _, filters in entries for field in filters}
+    return {field: instance.__dict__.get(field) for field in fields}
+
+
+def _apply(key, delta):
+    updated = RowCount.objects.filter(key=key).update(count=F("count") + delta)
+    if not updated:
+        reconcile(keys=[key])
+
+
+def _schedule(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: [_apply(k, d) for k, d in deltas.items()])
+
+
+def _on_post_init(sender, instance, **kwargs):
+    instance._row_count_state = _snapshot(instance, tracked_models()[sender])
+
+
+def _on_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    entries = tracked_models()[sender]
+    current = _snapshot(instance, entries)
+    previous = getattr(instance, "_row_count_state", {})
+    deltas = {}
+    for key, filters in entries:
+        now = _matches(current, filters)
+        if created:
+            deltas[key] = int(now)
+        elif filters:
+            deltas[key] = int(now) - int(_matches(previous, filters))
+    instance._row_count_state = current
+    _schedule(deltas)
+
+
+def record_bulk_create(model, instances):
+    """Count rows inserted with bulk_create(), which sends no post_save."""
+    entries = tracked_models().get(model, [])
+    deltas = {}
+    for instance in instances:
+        current = _snapshot(instance, entries)
+        for key, filters in entries:
+            deltas[key] = deltas.get(key, 0) + int(_matches(current, filters))
+    _schedule(deltas)
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    entries = tracked_models()[sender]
+    current = _snapshot(instance, entries)
+    _schedule({key: -1 for key, filters in entries if _matches(current, filters)})
+
+
+def connect_signals():
+    for model in tracked_models():
+        uid = f"row-count-{model._meta.label}"
+        post_init.connect(_on_post_init, sender=model, dispatch_uid=uid)
+        post_save.connect(_on_post_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_post_delete, sender=model, dispatch_uid=uid)
+
+
+def _exact_count(key):
+    for model, entries in tracked_models().items():
+        for entry_key, filters in entries:
+            if entry_key == key:
+                queryset = model._default_manager.filter(**filters)
+                # Sharded models (Trip) count across every shard.
+                if hasattr(queryset, "scatter_count"):
+                    return queryset.scatter_count()
+                return queryset.count()
+    raise KeyError(f"{key} is not listed in TRACKED_ROW_COUNTS")
+
+
+def reconcile(keys=None):
+    """Recount `keys` (default: all tracked) exactly. Returns {key: drift}."""
+    if keys is None:
+        keys = [key for entries in tracked_models().values() for key, _ in entries]
+    drift = {}
+    for key in keys:
+        exact = _exact_count(key)
+        row, created = RowCount.objects.get_or_create(key=key, defaults={"count": exact})
+        drift[key] = 0 if created else exact - row.count
+        if not created:
+            RowCount.objects.filter(pk=row.pk).update(
+                count=exact, reconciled_at=timezone.now()
+            )
+    return drift
+
+
+def get_count(model, **filters):
+    """
+    Return (count, approximate). Untracked combinations fall back to an exact
+    COUNT(*) and report approximate=False.
+    """
+    key = count_key(model._meta.label, filters)
+    if model not in tracked_models() or key not in dict(tracked_models()[model]):
+        return model._default_manager.filter(**filters).count(), False
+    value = RowCount.objects.filter(key=key).values_list("count", flat=True).first()
+    if value is None:
+        exact = _exact_count(key)
+        RowCount.objects.get_or_create(key=key, defaults={"count": exact})
+        return exact, False
+    return value, True
+
+
+async def aget_count(model, **filters):
+    """get_count() for async views."""
+    key = count_key(model._meta.label, filters)
+    if model not in tracked_models() or key not in dict(tracked_models()[model]):
+        return await model._default_manager.filter(**filters).acount(), False
+    value = await RowCount.objects.filter(key=key).values_list("count", flat=True).afirst()
+    if value is None:
+        # First use of this key: seed it (a scatter count for trips) in a thread.
+        return await sync_to_async(get_count)(model, **filters)
+    return value, True
@@ -0,0 +1,99 @@
+"""
+SQLite connection setup.
+
+Every new SQLite connection gets the PRAGMAs from settings.SQLITE_PRAGMAS
+(WAL, synchronous, mmap_size, cache_size, busy_timeout, ...) and an execute
+wrapper that retries statements failing with "database is locked" outside of
+transactions, recording lock-wait time and retries in LOCK_METRICS.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ("database is locked", "database table is locked")
+
+_metrics_lock = threading.Lock()
+LOCK_METRICS = {
+    "lock_errors": 0,
+    "retries": 0,
+    "retry_successes": 0,
+    "failures": 0,
+    "lock_wait_seconds": 0.0,
+}
+
+
+def _record(**deltas):
+    with _metrics_lock:
+        for name, delta in deltas.items():
+            LOCK_METRICS[name] += delta
+
+
+def get_lock_metrics():
+    with _metrics_lock:
+        return dict(LOCK_METRICS)
+
+
+def reset_lock_metrics():
+    with _metrics_lock:
+        for name in LOCK_METRICS:
+            LOCK_METRICS[name] = type(LOCK_METRICS[name])()
+
+
+def _is_lock_error(exc):
+    return any(message in str(exc) for message in LOCK_ERRORS)
+
+
+class LockRetryWrapper:
+    """
+    Retries a statement that hit a lock. Inside an atomic block the whole
+    transaction has to be retried by the caller, so the error is re-raised.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.retries = settings.SQLITE_LOCK_RETRIES
+        self.backoff = settings.SQLITE_LOCK_BACKOFF
+
+    def __call__(self, execute, sql, params, many, context):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                result = execute(sql, params, many, context)
+                if attempt:
+                    _record(retry_successes=1)
+                return result
+            except OperationalError as exc:
+                waited = time.perf_counter() - started
+                if not _is_lock_error(exc):
+                    raise
+                _record(lock_errors=1, lock_wait_seconds=waited)
+                if self.connection.in_atomic_block or attempt >= self.retries:
+                    _record(failures=1)
+                    raise
+                delay = self.backoff * (2**attempt)
+                attempt += 1
+                _record(retries=1, lock_wait_seconds=delay)
+                logger.warning("SQLite locked, retry %s in %.3fs", attempt, delay)
+                time.sleep(delay)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = {
+        **settings.SQLITE_PRAGMAS,
+        **settings.SQLITE_ALIAS_PRAGMAS.get(connection.alias, {}),
+    }
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+    if not any(isinstance(w, LockRetryWrapper) for w in connection.execute_wrappers):
+        connection.execute_wrappers.append(LockRetryWrapper(connection))
@@ -0,0 +1,196 @@
+"""
+Idempotency-Key support for API POSTs.
+
+An authenticated client that sends `Idempotency-Key: <up to 255 chars>` with
+a POST gets the first response to that key again on every retry. The stored
+response is replayed as bytes with an `Idempotent-Replayed: true` header;
+the view and its serializer do not run again.
+
+- Keys are scoped to the user id in the JWT and stored as a SHA-256 digest
+  in IdempotencyRecord together with a digest of the method, path and body.
+  Reusing a key for a different request is rejected with 422. Requests
+  without a token pass through untouched: anonymous callers share no
+  identity a key could be scoped to.
+- The first request claims its key by inserting a pending record (no
+  status_code yet) under the unique key, so the claim holds across worker
+  processes. A concurrent duplicate fails that insert, polls for the stored
+  response and answers 409 if it does not arrive within
+  IDEMPOTENCY_LOCK_TIMEOUT. A pending record expires after that timeout, so
+  a claim left by a crashed worker is taken over by the next retry.
+- Server errors, auth failures, conflicts and throttling are not stored;
+  their pending record is deleted, so those retries run again.
+- Records expire after IDEMPOTENCY_TTL. Expired rows are swept at most once
+  per IDEMPOTENCY_SWEEP_INTERVAL per process, or by the
+  sweep_idempotency_keys command.
+"""
+
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .middleware import is_api_request
+from .models import IdempotencyRecord
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+LOCK_POLL_INTERVAL = 0.02
+UNSTORED_STATUSES = {401, 403, 409, 429}
+
+_swept_at = 0.0
+
+
+def _json(status, detail, **headers):
+    response = HttpResponse(
+        json.dumps({"detail": detail}), status=status, content_type="application/json"
+    )
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _scope(request):
+    """The JWT user id, or None without a token the view will accept."""
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not header:
+        return None
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    scheme, _, raw = header.partition(" ")
+    if scheme not in api_settings.AUTH_HEADER_TYPES or not raw:
+        return None
+    try:
+        return f"user-{AccessToken(raw)[api_settings.USER_ID_CLAIM]}"
+    except (TokenError, KeyError):
+        return None
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256(f"{request.method} {request.get_full_path()}\n".encode())
+    length = int(request.META.get("CONTENT_LENGTH") or 0)
+    if request.content_type.startswith("multipart/") or length > settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+        # Uploads are left to the upload handlers, which stop an oversized
+        # one mid-stream; their type and size stand in for the body. The
+        # multipart boundary is left out, as a retry may pick a new one.
+        digest.update(f"{request.content_type} {length}".encode())
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = HttpResponse(
+        bytes(record.content), status=record.status_code, content_type=record.content_type
+    )
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _find(key):
+    return IdempotencyRecord.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+
+
+def _claim(key, fingerprint):
+    """Insert a pending record for `key`; None if another request holds it."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            IdempotencyRecord.objects.filter(key=key, expires_at__lte=now).delete()
+            return IdempotencyRecord.objects.create(
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT),
+            )
+    except IntegrityError:
+        return None
+
+
+def sweep_expired():
+    """Delete expired records; returns how many."""
+    global _swept_at
+    _swept_at = time.monotonic()
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def _maybe_sweep():
+    if time.monotonic() - _swept_at > settings.IDEMPOTENCY_SWEEP_INTERVAL:
+        sweep_expired()
+
+
+class IdempotencyMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        value = request.headers.get(HEADER)
+        if value is None or request.method != "POST" or not is_api_request(request):
+            return self.get_response(request)
+        if not 0 < len(value) <= MAX_KEY_LENGTH:
+            return _json(400, f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.")
+        scope = _scope(request)
+        if scope is None:
+            return self.get_response(request)
+
+        key = hashlib.sha256(f"{scope}:{value}".encode()).hexdigest()
+        fingerprint = _fingerprint(request)
+        record = _find(key)
+        if record is None:
+            claim = _claim(key, fingerprint)
+            if claim is not None:
+                return self._run(request, claim)
+        elif not record.pending:
+            return self._answer(record, fingerprint)
+        return self._wait(key, fingerprint)
+
+    def _run(self, request, claim):
+        stored = False
+        try:
+            response = self.get_response(request)
+            if response.status_code < 500 and response.status_code not in UNSTORED_STATUSES:
+                stored = self._store(claim, response)
+            return response
+        finally:
+            if not stored:
+                IdempotencyRecord.objects.filter(pk=claim.pk, status_code__isnull=True).delete()
+
+    def _wait(self, key, fingerprint):
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+        record = _find(key)
+        while record is not None and record.pending and record.fingerprint == fingerprint:
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+            record = _find(key)
+        if record is None or (record.pending and record.fingerprint == fingerprint):
+            return _json(409, f"A request with this {HEADER} is in progress.", **{"Retry-After": "1"})
+        return self._answer(record, fingerprint)
+
+    def _answer(self, record, fingerprint):
+        if record.fingerprint != fingerprint:
+            return _json(422, f"This {HEADER} was used for a different request.")
+        return _replay(record)
+
+    def _store(self, claim, response):
+        if getattr(response, "streaming", False):
+            return False
+        if hasattr(response, "render") and not response.is_rendered:
+            response.render()
+        # A claim that outlived IDEMPOTENCY_LOCK_TIMEOUT may have been taken
+        # over; then the new holder's response is the one kept.
+        stored = IdempotencyRecord.objects.filter(pk=claim.pk, status_code__isnull=True).update(
+            status_code=response.status_code,
+            content_type=response.get("Content-Type", ""),
+            content=response.content,
+            expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+        )
+        _maybe_sweep()
+        return bool(stored)
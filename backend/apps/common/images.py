@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig, SuspiciousFileOperation, ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http.multipartparser import MultiPartParserError
+from django.utils.deconstruct import deconstructible
+from django.utils.translation import gettext_lazy as _
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def validate_upload_size(file):
+    """Reject uploads larger than settings.MAX_UPLOAD_SIZE."""
+    limit = settings.MAX_UPLOAD_SIZE
+    if file and file.size is not None and file.size > limit:
+        raise ValidationError(
+            _("File too large. The maximum upload size is %(limit)s bytes."),
+            params={"limit": limit},
+            code="file_too_large",
+        )
+
+
+class UploadTooLarge(MultiPartParserError, RequestDataTooBig):
+    """
+    A file in the request passed MAX_UPLOAD_SIZE. DRF turns the parser error
+    into a 400 ParseError; plain Django views answer 400 as for any
+    RequestDataTooBig.
+    """
+
+
+class MaxUploadSizeHandler(FileUploadHandler):
+    """
+    First of FILE_UPLOAD_HANDLERS: passes chunks on to the next handler and
+    stops reading the request as soon as one file passes MAX_UPLOAD_SIZE, so
+    an oversized upload is neither received in full nor spooled to disk.
+    The size check in HashedImageStorage stays as a backstop.
+    """
+
+    exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.MAX_UPLOAD_SIZE:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def upload_complete(self):
+        if self.exceeded:
+            raise UploadTooLarge(
+                f"Upload exceeds the maximum size of {settings.MAX_UPLOAD_SIZE} bytes."
+            )
+
+
+def variant_name(name, variant):
+    """`license/ab/abcd.jpg` -> `license/ab/abcd.small.jpg`"""
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{variant}{ext}"
+
+
+def original_name(name):
+    """Inverse of variant_name(): `license/ab/abcd.small.jpg` -> `license/ab/abcd.jpg`"""
+    root, ext = posixpath.splitext(name)
+    base, variant = posixpath.splitext(root)
+    if variant[1:] in settings.IMAGE_VARIANT_SIZES:
+        return base + ext
+    return name
+
+
+def variant_url(field_file, variant, request=None):
+    """
+    Return the URL of a resized variant of `field_file`, falling back to the
+    original while the variant has not been generated yet.
+    """
+    if not field_file:
+        return None
+    storage = field_file.storage
+    name = variant_name(field_file.name, variant)
+    if variant in settings.IMAGE_VARIANT_SIZES and storage.exists(name):
+        url = storage.url(name)
+    else:
+        url = field_file.url
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def generate_variants(storage, name):
+    """Write every configured size of `name` next to the original."""
+    # Pillow costs ~25 ms to import; only the variant pool needs it.
+    from PIL import Image, ImageOps
+
+    source_path = storage.path(name)
+    with Image.open(source_path) as original:
+        image_format = original.format
+        image = ImageOps.exif_transpose(original)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        for variant, size in settings.IMAGE_VARIANT_SIZES.items():
+            target_path = storage.path(variant_name(name, variant))
+            if os.path.exists(target_path):
+                continue
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(target_path), suffix=".part"
+            )
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    resized.save(out, format=image_format, optimize=True, quality=85)
+                os.replace(tmp_path, target_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PIPELINE_WORKERS,
+            thread_name_prefix="image-pipeline",
+        )
+    return _executor
+
+
+def _log_failure(future, name):
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Could not generate image variants for %s: %s", name, exc)
+
+
+def schedule_variants(storage, name):
+    """
+    Queue thumbnail generation on the worker pool. Pillow releases the GIL
+    while decoding, resizing and encoding, so a thread pool is enough to keep
+    the work off the request thread.
+    """
+    future = _get_executor().submit(generate_variants, storage, name)
+    future.add_done_callback(lambda f: _log_failure(f, name))
+    return future
+
+
+@deconstructible
+class HashedImageStorage(FileSystemStorage):
+    """
+    Streams uploads to disk chunk by chunk, enforces MAX_UPLOAD_SIZE and stores
+    the file under its SHA-256 so identical uploads share one file on disk.
+    """
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        limit = settings.MAX_UPLOAD_SIZE
+
+        tmp_dir = self.path(directory)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    size += len(chunk)
+                    if size > limit:
+                        raise SuspiciousFileOperation(
+                            f"Upload exceeds MAX_UPLOAD_SIZE ({limit} bytes)."
+                        )
+                    hasher.update(chunk)
+                    out.write(chunk)
+
+            digest = hasher.hexdigest()
+            final_name = posixpath.join(directory, digest[:2], digest + extension)
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(final_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        schedule_variants(self, final_name)
+        return final_name
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content hash in _save().
+        return name
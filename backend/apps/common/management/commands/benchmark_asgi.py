@@ -0,0 +1,144 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SEED = """
+from apps.users.models import User
+from apps.vehicle.models import Location, Route, Trip
+from rest_framework_simplejwt.tokens import AccessToken
+
+driver = User.objects.create_user("Bench", "Driver", "bench@example.com", "x", role="driver")
+passenger = User.objects.create_user("Bench", "Passenger", "pax@example.com", "x")
+route = Route.objects.create(
+    pickup=Location.objects.create(name="Kabul"),
+    drop=Location.objects.create(name="Herat"),
+    price_af=500,
+)
+route.drivers.add(driver)
+for _ in range({trips}):
+    Trip.objects.create(passenger=passenger, route=route, driver=driver)
+print(AccessToken.for_user(driver))
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def _client(port, request, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors.append(head.split(b"\r\n")[0])
+            latencies.append(time.perf_counter() - started)
+    except (asyncio.IncompleteReadError, ConnectionError) as exc:
+        errors.append(repr(exc))
+    finally:
+        writer.close()
+
+
+async def _load(port, request, concurrency, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(_client(port, request, deadline, latencies, errors) for _ in range(concurrency))
+    )
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent-connection throughput of the driver trip list under the "
+        "WSGI deployment (gunicorn, sync views) versus ASGI (uvicorn, async views)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", default="1,10,100")
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--trips", type=int, default=50)
+        parser.add_argument("--threads", type=int, default=4, help="gunicorn gthread threads")
+
+    def handle(self, *args, **options):
+        manage = os.path.join(settings.ROOT_DIR, "manage.py")
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "DB_NAME": os.path.join(tmp, "bench.sqlite3"),
+                "ALLOWED_HOSTS": "127.0.0.1",
+            }
+            subprocess.run(
+                [sys.executable, manage, "migrate", "--run-syncdb", "-v0"], env=env, check=True
+            )
+            token = subprocess.run(
+                [sys.executable, manage, "shell", "-c", SEED.format(trips=options["trips"])],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout.strip().splitlines()[-1]
+
+            request = (
+                "GET /api/v1/vehicle/driver/trips/ HTTP/1.1\r\n"
+                "Host: 127.0.0.1\r\n"
+                f"Authorization: Bearer {token}\r\n\r\n"
+            ).encode()
+
+            servers = {
+                "wsgi": [
+                    "gunicorn", "config.wsgi:application", "-k", "gthread", "-w", "1",
+                    "--threads", str(options["threads"]), "--log-level", "warning",
+                ],
+                "asgi": [
+                    "uvicorn", "config.asgi:application", "--no-access-log",
+                    "--log-level", "warning",
+                ],
+            }
+            for label, command in servers.items():
+                port = _free_port()
+                bind = ["-b", f"127.0.0.1:{port}"] if label == "wsgi" else ["--port", str(port)]
+                server = subprocess.Popen(
+                    [sys.executable, "-m", *command, *bind], env=env, cwd=settings.ROOT_DIR
+                )
+                try:
+                    _wait_for_port(port)
+                    for concurrency in (int(c) for c in options["concurrency"].split(",")):
+                        latencies, errors = asyncio.run(
+                            _load(port, request, concurrency, options["seconds"])
+                        )
+                        latencies.sort()
+                        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+                        self.stdout.write(
+                            f"{label} c={concurrency:<4} "
+                            f"{len(latencies) / options['seconds']:8.0f} req/s  "
+                            f"p95 {p95 * 1000:7.1f} ms  errors {len(errors)}"
+                        )
+                finally:
+                    server.terminate()
+                    server.wait()
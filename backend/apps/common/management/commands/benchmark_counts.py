@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare exact COUNT(*) with a maintained row-count lookup on a "
+        "synthetic SQLite table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        with tempfile.TemporaryDirectory() as tmp:
+            db = sqlite3.connect(os.path.join(tmp, "bench.sqlite3"))
+            db.execute(
+                "CREATE TABLE trip (pkid INTEGER PRIMARY KEY, status TEXT, fare REAL)"
+            )
+            db.execute(
+                "CREATE TABLE common_rowcount (id INTEGER PRIMARY KEY, "
+                "key TEXT UNIQUE, count INTEGER)"
+            )
+            started = time.perf_counter()
+            db.execute(
+                """
+                WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+                INSERT INTO trip (pkid, status, fare)
+                SELECT n, CASE n % 4 WHEN 0 THEN 'requested' ELSE 'completed' END, n % 500
+                FROM seq
+                """,
+                [rows],
+            )
+            db.execute(
+                "INSERT INTO common_rowcount (key, count) VALUES ('vehicle.Trip', ?)", [rows]
+            )
+            db.commit()
+            self.stdout.write(f"Generated {rows} rows in {time.perf_counter() - started:.1f}s")
+
+            for label, sql in (
+                ("exact COUNT(*)", "SELECT count(*) FROM trip"),
+                (
+                    "maintained count",
+                    "SELECT count FROM common_rowcount WHERE key = 'vehicle.Trip'",
+                ),
+            ):
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    db.execute(sql).fetchone()
+                elapsed = (time.perf_counter() - started) / repeat * 1000
+                self.stdout.write(f"{label:<18} {elapsed:10.3f} ms")
+            db.close()
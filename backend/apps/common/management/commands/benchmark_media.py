@@ -0,0 +1,74 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views.static import serve
+
+from apps.common.media import serve_media_file
+
+
+def _drain(sock):
+    while sock.recv(1 << 20):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare media throughput of the old Python-streamed static() path "
+        "with the sendfile-backed media view over a local socket."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=50)
+
+    def handle(self, *args, **options):
+        size = options["size_mb"] * 1024 * 1024
+        requests = options["requests"]
+        factory = RequestFactory()
+
+        with tempfile.TemporaryDirectory() as root:
+            name = "bench.bin"
+            full_path = os.path.join(root, name)
+            with open(full_path, "wb") as f:
+                f.write(os.urandom(size))
+
+            def python_streamed(sock):
+                response = serve(factory.get("/media/" + name), name, document_root=root)
+                for chunk in response.streaming_content:
+                    sock.sendall(chunk)
+                response.close()
+
+            def sendfile_path(sock):
+                response = serve_media_file(factory.get("/media/" + name), name, full_path)
+                # What wsgi.file_wrapper does for a FileResponse under gunicorn.
+                fd = response.file_to_stream.fileno()
+                offset = 0
+                while offset < size:
+                    offset += os.sendfile(sock.fileno(), fd, offset, size - offset)
+                response.close()
+
+            for label, send in (
+                ("static() / Python-streamed", python_streamed),
+                ("media view / os.sendfile", sendfile_path),
+            ):
+                writer, reader = socket.socketpair()
+                drainer = threading.Thread(target=_drain, args=(reader,))
+                drainer.start()
+                started = time.perf_counter()
+                for _ in range(requests):
+                    send(writer)
+                elapsed = time.perf_counter() - started
+                writer.close()
+                drainer.join()
+                reader.close()
+
+                throughput = size * requests / elapsed / (1024 * 1024)
+                self.stdout.write(
+                    f"{label:<30} {throughput:10.1f} MB/s  "
+                    f"({elapsed / requests * 1000:.2f} ms/request)"
+                )
@@ -0,0 +1,77 @@
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+from django.urls import path
+
+# The MIDDLEWARE list before path dispatching, duplicates included.
+PREVIOUS_MIDDLEWARE = [
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+
+def ping(request):
+    return JsonResponse({"ok": True})
+
+
+urlpatterns = [
+    path("api/v1/ping/", ping),
+    path("ping/", ping),
+]
+
+
+def _start_response(status, headers):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-request cost of the middleware chain on a trivial endpoint: the "
+        "previous MIDDLEWARE list versus the path-dispatched one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        factory = RequestFactory()
+        requests = options["requests"]
+        cases = (
+            ("no middleware", [], "/api/v1/ping/"),
+            ("previous stack, /api/", PREVIOUS_MIDDLEWARE, "/api/v1/ping/"),
+            ("path-dispatched, /api/", settings.MIDDLEWARE, "/api/v1/ping/"),
+            ("path-dispatched, other", settings.MIDDLEWARE, "/ping/"),
+        )
+        results = {}
+        for label, middleware, url in cases:
+            with override_settings(
+                MIDDLEWARE=middleware, ROOT_URLCONF=__name__, ALLOWED_HOSTS=["*"]
+            ):
+                handler = WSGIHandler()
+                environ = factory._base_environ(PATH_INFO=url, REQUEST_METHOD="GET")
+                for _ in range(200):
+                    handler(dict(environ), _start_response)
+                started = time.perf_counter()
+                for _ in range(requests):
+                    handler(dict(environ), _start_response)
+                results[label] = (time.perf_counter() - started) / requests * 1e6
+
+        baseline = results["no middleware"]
+        for label, micros in results.items():
+            self.stdout.write(
+                f"{label:<24} {micros:7.1f} us/request  "
+                f"(middleware {micros - baseline:6.1f} us)"
+            )
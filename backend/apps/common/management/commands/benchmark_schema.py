@@ -0,0 +1,51 @@
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from drf_spectacular.views import SpectacularAPIView
+
+from apps.common.schema import write_schema_artifact
+from apps.common.views import SchemaView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request schema generation with serving the pre-generated "
+        "artifact (plain, gzipped and 304 revalidation)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        accept = {"HTTP_ACCEPT": "application/json"}
+        live = SpectacularAPIView.as_view()
+        artifact = SchemaView.as_view()
+
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            manifest = write_schema_artifact(directory)
+            build = time.perf_counter() - started
+            etag = manifest["formats"]["json"]["etag"]
+
+            cases = (
+                ("live generation", live, accept),
+                ("artifact", artifact, accept),
+                ("artifact, gzip", artifact, {**accept, "HTTP_ACCEPT_ENCODING": "gzip"}),
+                ("artifact, 304", artifact, {**accept, "HTTP_IF_NONE_MATCH": etag}),
+            )
+            with override_settings(OPENAPI_SCHEMA_DIR=directory, OPENAPI_SCHEMA_LIVE=False):
+                self.stdout.write(f"{'generate_schema (once)':<24} {build * 1000:9.1f} ms")
+                for label, view, headers in cases:
+                    started = time.perf_counter()
+                    for _ in range(options["requests"]):
+                        response = view(factory.get("/api/schema/", **headers))
+                        if hasattr(response, "render"):
+                            response.render()
+                    elapsed = (time.perf_counter() - started) / options["requests"]
+                    self.stdout.write(
+                        f"{label:<24} {elapsed * 1000:9.2f} ms/request  "
+                        f"{len(response.content):7d} bytes"
+                    )
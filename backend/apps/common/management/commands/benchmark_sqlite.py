@@ -0,0 +1,89 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _worker(path, pragmas, deadline, write_ratio, results, seed):
+    rng = random.Random(seed)
+    db = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for pragma, value in pragmas.items():
+        db.execute(f"PRAGMA {pragma} = {value}")
+    reads = writes = errors = 0
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute(
+                    "INSERT INTO trip (route_id, status, fare) VALUES (?, 'requested', ?)",
+                    [rng.randint(1, 50), rng.randint(100, 900)],
+                )
+                db.execute("COMMIT")
+                writes += 1
+            else:
+                db.execute(
+                    "SELECT count(*), sum(fare) FROM trip WHERE route_id = ?",
+                    [rng.randint(1, 50)],
+                ).fetchone()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+    db.close()
+    results.append((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mixed read/write throughput on SQLite with default settings versus "
+        "settings.SQLITE_PRAGMAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--write-ratio", type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        for label, pragmas in (("defaults", {}), ("tuned", settings.SQLITE_PRAGMAS)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.sqlite3")
+                db = sqlite3.connect(path)
+                db.execute(
+                    "CREATE TABLE trip (id INTEGER PRIMARY KEY, route_id INTEGER, "
+                    "status TEXT, fare INTEGER)"
+                )
+                db.execute("CREATE INDEX trip_route ON trip (route_id)")
+                db.executemany(
+                    "INSERT INTO trip (route_id, status, fare) VALUES (?, 'completed', ?)",
+                    [(i % 50 + 1, i % 900) for i in range(20000)],
+                )
+                db.commit()
+                db.close()
+
+                results = []
+                deadline = time.perf_counter() + options["seconds"]
+                threads = [
+                    threading.Thread(
+                        target=_worker,
+                        args=(path, pragmas, deadline, options["write_ratio"], results, i),
+                    )
+                    for i in range(options["threads"])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                reads, writes, errors = (sum(column) for column in zip(*results))
+                seconds = options["seconds"]
+                self.stdout.write(
+                    f"{label:<9} reads/s {reads / seconds:10.0f}  "
+                    f"writes/s {writes / seconds:8.0f}  lock errors {errors}"
+                )
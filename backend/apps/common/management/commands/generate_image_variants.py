@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.images import generate_variants
+from apps.profiles.models import Profile
+from apps.vehicle.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for profile photos and license images already on disk."
+
+    def handle(self, *args, **options):
+        sources = [
+            (Profile.objects.exclude(profile_photo=""), "profile_photo"),
+            (Vehicle.objects.exclude(license=""), "license"),
+        ]
+        generated = 0
+        for queryset, field_name in sources:
+            for field_file in (
+                getattr(obj, field_name) for obj in queryset.only(field_name).iterator()
+            ):
+                try:
+                    generate_variants(field_file.storage, field_file.name)
+                    generated += 1
+                except (FileNotFoundError, OSError) as exc:
+                    self.stderr.write(f"Skipping {field_file.name}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {generated} images."))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.common.schema import write_schema_artifact
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the OpenAPI schema (JSON and YAML, plain and gzipped) to "
+        "settings.OPENAPI_SCHEMA_DIR for SchemaView to serve. Run on deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None, help="Defaults to OPENAPI_SCHEMA_DIR.")
+        parser.add_argument(
+            "--release", default=None,
+            help="Release label for the file names; defaults to a content hash.",
+        )
+
+    def handle(self, *args, **options):
+        manifest = write_schema_artifact(options["dir"], options["release"])
+        directory = options["dir"] or settings.OPENAPI_SCHEMA_DIR
+        for fmt, entry in manifest["formats"].items():
+            self.stdout.write(f"{directory}/{entry['file']}  {entry['size']} bytes")
+        self.stdout.write(self.style.SUCCESS(f"Schema version {manifest['version']}"))
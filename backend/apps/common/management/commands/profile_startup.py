@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.startup import TARGETS, group_imports, measure_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Cold-start profile: import the WSGI application (or the URLconf too) "
+        "in a fresh interpreter with -X importtime and print import time per "
+        "app/package, with the module that first pulled each one in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=sorted(TARGETS), default="wsgi")
+        parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument(
+            "--runs", type=int, default=3,
+            help="Report the fastest of this many cold starts.",
+        )
+
+    def handle(self, *args, **options):
+        report = min(
+            (measure_startup(options["target"]) for _ in range(options["runs"])),
+            key=lambda r: r["wall_ms"],
+        )
+        groups = group_imports(report["imports"])
+        total = sum(g["self_ms"] for g in groups)
+
+        self.stdout.write(f"{'group':<28} {'ms':>8} {'share':>6} {'mods':>5}  first imported by")
+        for group in groups[: options["limit"]]:
+            self.stdout.write(
+                f"{group['group']:<28} {group['self_ms']:8.1f} "
+                f"{group['self_ms'] / total:6.1%} {group['modules']:5}  {group['imported_by']}"
+            )
+        self.stdout.write(
+            f"\n{options['target']}: {report['wall_ms']:.0f} ms wall, "
+            f"{total:.0f} ms importing (incl. site), {report['modules']} modules, "
+            f"peak RSS {report['maxrss_kb'] / 1024:.1f} MB"
+        )
@@ -0,0 +1,64 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.common.server import GunicornServer
+
+
+class Command(BaseCommand):
+    help = (
+        "gunicorn with a preloaded master: warm the application once, "
+        "gc.freeze() it before each fork so workers share it copy-on-write."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="127.0.0.1:8000")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--threads", type=int, default=1,
+            help="Threads per worker; more than 1 uses gunicorn's gthread workers.",
+        )
+        parser.add_argument(
+            "--timeout", type=int, default=30,
+            help="Kill a worker that spends longer than this on one request.",
+        )
+        parser.add_argument(
+            "--max-requests", type=int, default=0,
+            help="Recycle a worker after this many requests (0 = never).",
+        )
+        parser.add_argument(
+            "--max-requests-jitter", type=int, default=0,
+            help="Add up to this many requests to --max-requests per worker "
+            "so workers do not all restart together.",
+        )
+        parser.add_argument(
+            "--max-worker-rss", type=int, default=0, metavar="MB",
+            help="Recycle a worker whose RSS grows beyond this (0 = never).",
+        )
+        parser.add_argument("--graceful-timeout", type=int, default=30)
+        parser.add_argument(
+            "--no-preload", action="store_false", dest="preload",
+            help="Import the application in every worker after fork instead.",
+        )
+        parser.add_argument("--access-log", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+        self.server(options).run()
+
+    def server(self, options):
+        return GunicornServer(
+            {
+                "bind": options["bind"],
+                "workers": options["workers"],
+                "threads": options["threads"],
+                "timeout": options["timeout"],
+                "graceful_timeout": options["graceful_timeout"],
+                "max_requests": options["max_requests"],
+                "max_requests_jitter": options["max_requests_jitter"],
+                "preload_app": options["preload"],
+                "accesslog": "-" if options["access_log"] else None,
+            },
+            max_worker_rss_mb=options["max_worker_rss"],
+        )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.idempotency import sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses past IDEMPOTENCY_TTL."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Deleted {sweep_expired()} expired records."))
@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every replica in "
+        "DATABASE_REPLICAS using the online backup API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep syncing every N seconds instead of running once.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured (set DB_REPLICAS).")
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                started = time.perf_counter()
+                self.sync(alias)
+                self.stdout.write(
+                    f"{alias}: synced in {(time.perf_counter() - started) * 1000:.1f} ms"
+                )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def sync(self, alias):
+        source = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"])
+        target = sqlite3.connect(settings.DATABASES[alias]["NAME"])
+        try:
+            synced_at = time.time()
+            # Copies a consistent snapshot of the primary; readers of the
+            # replica keep their connections and see the new pages.
+            source.backup(target)
+            target.execute(
+                "CREATE TABLE IF NOT EXISTS replica_sync_meta (synced_at REAL NOT NULL)"
+            )
+            target.execute("DELETE FROM replica_sync_meta")
+            target.execute("INSERT INTO replica_sync_meta VALUES (?)", [synced_at])
+            target.commit()
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,146 @@
+import os
+import posixpath
+import re
+import stat
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.http import http_date
+
+HASHED_NAME_RE = re.compile(r"(?P<digest>[0-9a-f]{64})(?:\.(?P<variant>\w+))?\.\w+$")
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def clean_media_path(path):
+    """
+    Return `path` only when it is already canonical. Empty, "." and ".."
+    segments are refused rather than resolved, so the path that is checked
+    for permission is the same one that is served.
+    """
+    if any(segment in ("", ".", "..") for segment in path.split("/")):
+        return None
+    return path
+
+
+def media_etag(path, stat_result):
+    """
+    Content-hashed names carry their own strong validator; anything else
+    (e.g. the default profile picture) falls back to inode metadata.
+    """
+    match = HASHED_NAME_RE.search(posixpath.basename(path))
+    if match:
+        return f'"{match["digest"]}{"." + match["variant"] if match["variant"] else ""}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def cache_control(path, private):
+    scope = "private" if private else "public"
+    if HASHED_NAME_RE.search(posixpath.basename(path)):
+        return f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"{scope}, max-age=3600"
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable byte range, None when the
+    header should be ignored, or raise ValueError when it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or (not match["start"] and not match["end"]):
+        return None
+    if match["start"]:
+        start = int(match["start"])
+        end = int(match["end"]) if match["end"] else size - 1
+    else:
+        # Suffix range: the last N bytes.
+        start = max(size - int(match["end"]), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _stream_range(full_path, start, length):
+    with open(full_path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload(path, full_path):
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend == "nginx":
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = settings.MEDIA_SENDFILE_URL_PREFIX + path
+        return response
+    if backend == "apache":
+        response = HttpResponse()
+        response["X-Sendfile"] = full_path
+        return response
+    return None
+
+
+def serve_media_file(request, path, full_path, private=False):
+    """
+    Build the response for a media file that already passed permission checks.
+
+    With MEDIA_SENDFILE_BACKEND set, the front-end server streams the file and
+    handles ranges itself. Otherwise full responses are FileResponses, which
+    WSGI servers hand to wsgi.file_wrapper (os.sendfile under gunicorn), and
+    byte ranges are streamed from Python.
+    """
+    stat_result = os.stat(full_path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(full_path)
+
+    etag = media_etag(path, stat_result)
+    size = stat_result.st_size
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        response = HttpResponseNotModified()
+    else:
+        response = _offload(path, full_path)
+        if response is None:
+            response = _local_response(request, full_path, etag, size)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat_result.st_mtime)
+    response["Cache-Control"] = cache_control(path, private)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _local_response(request, full_path, etag, size):
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _stream_range(full_path, start, length), status=206
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(length)
+            return response
+    return FileResponse(open(full_path, "rb"))
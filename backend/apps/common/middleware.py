@@ -0,0 +1,54 @@
+"""
+Path-dispatched middleware.
+
+API routes (settings.API_PATH_PREFIXES) authenticate with JWT through DRF and
+never touch sessions, CSRF cookies, messages or frame options, so the
+variants below pass those requests straight to the next layer. Everything
+else (admin/, the Swagger UI) runs the stock middleware unchanged.
+
+They subclass the Django middleware they replace so the admin system checks
+still find sessions, auth and messages in MIDDLEWARE.
+"""
+
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import clickjacking, csrf
+
+
+def is_api_request(request):
+    return request.path_info.startswith(settings.API_PATH_PREFIXES)
+
+
+class SkipForAPIMixin:
+    def __call__(self, request):
+        if is_api_request(request):
+            # In async mode this returns the next layer's coroutine unawaited,
+            # which the handler awaits.
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(SkipForAPIMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(SkipForAPIMixin, csrf.CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # View hooks run even when __call__ was skipped.
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(SkipForAPIMixin, auth_middleware.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(SkipForAPIMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(SkipForAPIMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
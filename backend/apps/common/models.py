@@ -13,3 +13,40 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
         ordering = ["-created_at", "-updated_at"]
+
+
+class RowCount(models.Model):
+    """
+    Maintained row count for a model, optionally restricted to a filter
+    (see settings.TRACKED_ROW_COUNTS and apps.common.counts).
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.count}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The stored response to an API POST made with an Idempotency-Key (see
+    apps.common.idempotency). `key` and `fingerprint` are SHA-256 digests.
+    A record without a status_code is a claim by a request still running.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    content = models.BinaryField(default=b"")
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key[:12]} -> {self.status_code or 'pending'}"
+
+    @property
+    def pending(self):
+        return self.status_code is None
@@ -0,0 +1,102 @@
+from django.core.paginator import Paginator
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import get_count
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Uses the maintained row count for unfiltered querysets of tracked models
+    and an exact COUNT(*) for everything else.
+    """
+
+    approximate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if (
+            isinstance(queryset, QuerySet)
+            and not queryset.query.where
+            and not queryset.query.combinator
+            and not queryset.query.is_sliced
+        ):
+            count, self.approximate = get_count(queryset.model)
+            return count
+        return super().count
+
+
+class ApproximateCountPagination(PageNumberPagination):
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["approximate"] = self.page.paginator.approximate
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["approximate"] = {"type": "boolean", "example": True}
+        return schema
+
+
+class NoCountPagination(PageNumberPagination):
+    """
+    Page-number pagination that never counts: it fetches one extra row to
+    decide `has_next`.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        try:
+            self.page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except (TypeError, ValueError):
+            self.page_number = 1
+
+        offset = (self.page_number - 1) * self.page_size
+        rows = list(queryset[offset : offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        return rows[: self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "has_next": self.has_next,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["has_next", "results"],
+            "properties": {
+                "has_next": {"type": "boolean"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,28 @@
+from rest_framework import permissions
+
+from apps.common.images import original_name
+from apps.vehicle.models import Vehicle
+
+
+class CanViewMedia(permissions.BasePermission):
+    """
+    Profile photos are public. License scans (and their resized variants) are
+    only visible to admins and the driver who owns the vehicle.
+    """
+
+    PROTECTED_PREFIXES = ("license/",)
+
+    def has_permission(self, request, view):
+        path = view.kwargs.get("path", "")
+        if not path.startswith(self.PROTECTED_PREFIXES):
+            return True
+
+        user = request.user
+        if not user.is_authenticated:
+            return False
+        if user.role == "admin" or user.is_superuser:
+            return True
+
+        return Vehicle.objects.filter(
+            license=original_name(path), driver=user
+        ).exists()
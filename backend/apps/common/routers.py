@@ -0,0 +1,107 @@
+"""
+Read-replica routing.
+
+Views opt in with ReplicaReadMixin. Inside an opted-in safe request, reads go
+to a replica from settings.DATABASE_REPLICAS whose lag is under
+REPLICA_MAX_LAG_SECONDS; the first write pins the rest of the request to the
+primary so it reads its own writes. Everything else uses `default`.
+"""
+
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+_pinned_to_primary = contextvars.ContextVar("pinned_to_primary", default=False)
+_lag_cache = {}
+
+
+@contextmanager
+def use_replicas():
+    reads_token = _replica_reads.set(True)
+    pin_token = _pinned_to_primary.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(reads_token)
+        _pinned_to_primary.reset(pin_token)
+
+
+def replica_lag(alias):
+    """
+    Seconds since `alias` was last synced by `manage.py sync_replicas`, cached
+    for REPLICA_LAG_CHECK_INTERVAL. Unknown or unreadable replicas are
+    infinitely stale.
+    """
+    now = time.time()
+    checked_at, synced_at = _lag_cache.get(alias, (0, None))
+    if now - checked_at > settings.REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT max(synced_at) FROM replica_sync_meta")
+                synced_at = cursor.fetchone()[0]
+        except DatabaseError:
+            synced_at = None
+        _lag_cache[alias] = (now, synced_at)
+    if synced_at is None:
+        return float("inf")
+    return now - synced_at
+
+
+def healthy_replicas():
+    return [
+        alias
+        for alias in settings.DATABASE_REPLICAS
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS
+    ]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _pinned_to_primary.get():
+            return None
+        replicas = healthy_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if _replica_reads.get():
+            _pinned_to_primary.set(True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are byte copies of the primary, never migrated directly.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    View opt-in: serve safe (GET/HEAD/OPTIONS) requests from a replica.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS:
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self._adispatch_on_replicas(request, *args, **kwargs)
+        with use_replicas():
+            return super().dispatch(request, *args, **kwargs)
+
+    async def _adispatch_on_replicas(self, request, *args, **kwargs):
+        # Context variables follow the ORM into sync_to_async threads.
+        with use_replicas():
+            return await super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,106 @@
+"""
+Build-time OpenAPI schema.
+
+`manage.py generate_schema` writes the drf-spectacular schema once per deploy
+to settings.OPENAPI_SCHEMA_DIR as openapi-<version>.json plus a gzipped copy
+and a manifest naming the current version and its ETag. SchemaView serves that
+artifact; with no artifact, or when OPENAPI_SCHEMA_LIVE (default: DEBUG) is
+on, it generates the schema per request as before.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+MANIFEST_NAME = "manifest.json"
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {}
+
+
+def render_schema():
+    """{"json": bytes, "yaml": bytes} for the public schema."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    return {
+        "json": OpenApiJsonRenderer().render(schema, renderer_context={}),
+        "yaml": OpenApiYamlRenderer().render(schema, renderer_context={}),
+    }
+
+
+def write_schema_artifact(directory=None, version=None):
+    """Generate the schema into `directory` and point the manifest at it."""
+    directory = str(directory or settings.OPENAPI_SCHEMA_DIR)
+    os.makedirs(directory, exist_ok=True)
+    rendered = render_schema()
+    version = version or hashlib.sha256(rendered["json"]).hexdigest()[:12]
+
+    formats = {}
+    for fmt, content in rendered.items():
+        name = f"openapi-{version}.{fmt}"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(content)
+        with gzip.open(os.path.join(directory, name + ".gz"), "wb", compresslevel=9) as f:
+            f.write(content)
+        formats[fmt] = {
+            "file": name,
+            "etag": f'"{hashlib.sha256(content).hexdigest()}"',
+            "size": len(content),
+        }
+
+    manifest = {
+        "version": version,
+        "generated_at": timezone.now().isoformat(),
+        "formats": formats,
+    }
+    # Written last and replaced atomically so readers never see a manifest
+    # pointing at a half-written file.
+    tmp = os.path.join(directory, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST_NAME))
+    return manifest
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def load_artifact():
+    """
+    The current manifest with each format's `content` and `gzip_content`
+    loaded, or None when no schema has been generated. Files are re-read only
+    when the manifest changes.
+    """
+    directory = str(settings.OPENAPI_SCHEMA_DIR)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _manifest_lock:
+        if _manifest_cache.get("key") != (manifest_path, mtime):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            for entry in manifest["formats"].values():
+                path = os.path.join(directory, entry["file"])
+                entry["content"] = _read(path)
+                entry["gzip_content"] = _read(path + ".gz")
+            _manifest_cache.update(key=(manifest_path, mtime), manifest=manifest)
+        return _manifest_cache["manifest"]
+
+
+def live_schema_enabled():
+    live = settings.OPENAPI_SCHEMA_LIVE
+    return settings.DEBUG if live is None else live
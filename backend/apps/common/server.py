@@ -0,0 +1,174 @@
+"""
+`manage.py serve`: gunicorn with a warmed, frozen master.
+
+With preload_app the master imports and warms the whole application once
+(URL resolver, serializer field maps, model metadata, translations, the
+location distance matrix) and closes its database connections. The
+pre_fork hook calls gc.freeze(), so the warmed heap is never touched by the
+cyclic GC again and workers share those pages copy-on-write instead of each
+importing Django, DRF, drf-spectacular, jazzmin, Pillow and phonenumbers on
+their own.
+
+Everything else is gunicorn's: signals (TERM/INT/QUIT stop, HUP reloads,
+TTIN/TTOU resize), worker timeouts, request size limits and --max-requests
+recycling. A worker stuck on one request, such as a client that sends its
+headers a byte at a time, is killed after --timeout. Sync workers should
+still sit behind a buffering proxy (nginx). Workers whose RSS grows past
+--max-worker-rss are recycled after their current request.
+
+Each worker logs its time to ready (from fork) with its RSS and PSS, and
+again after its first request with that request's latency: PSS well under
+RSS is the copy-on-write sharing at work.
+"""
+
+import gc
+import logging
+import os
+import time
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger(__name__)
+
+
+def warm_application():
+    """Import and exercise everything a first request would; return the app."""
+    from django.apps import apps
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.db import DatabaseError, connections
+    from django.urls import get_resolver
+    from django.utils import translation
+    from rest_framework.settings import api_settings
+
+    application = get_wsgi_application()
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # noqa: B018 - populates the resolver caches
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.related_objects  # noqa: B018
+
+    for name in (
+        "DEFAULT_RENDERER_CLASSES",
+        "DEFAULT_PARSER_CLASSES",
+        "DEFAULT_AUTHENTICATION_CLASSES",
+        "DEFAULT_PERMISSION_CLASSES",
+    ):
+        getattr(api_settings, name)
+
+    for serializer_class in _serializer_classes(resolver):
+        try:
+            serializer_class(context={}).fields  # noqa: B018
+        except Exception:  # a serializer that needs a request to build fields
+            logger.debug("Could not warm %s", serializer_class, exc_info=True)
+
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+
+    # Bookings look distances up but never build the matrix themselves.
+    from apps.vehicle.distances import matrix
+
+    try:
+        matrix.refresh()
+    except DatabaseError:
+        logger.warning("Could not build the location distance matrix", exc_info=True)
+    # SQLite handles must not be shared across fork().
+    connections.close_all()
+    return application
+
+
+def _serializer_classes(resolver):
+    seen = set()
+    stack = list(resolver.url_patterns)
+    while stack:
+        pattern = stack.pop()
+        if hasattr(pattern, "url_patterns"):
+            stack.extend(pattern.url_patterns)
+            continue
+        view_class = getattr(pattern.callback, "cls", None)
+        serializer_class = getattr(view_class, "serializer_class", None)
+        if serializer_class is not None and serializer_class not in seen:
+            seen.add(serializer_class)
+            yield serializer_class
+
+
+def memory_usage(pid):
+    """{"rss", "pss", "shared", "private"} in kB from /proc (Linux only)."""
+    fields = {"Rss": 0, "Pss": 0, "Shared_Clean": 0, "Shared_Dirty": 0,
+              "Private_Clean": 0, "Private_Dirty": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    fields[key] = int(value.split()[0])
+    except OSError:
+        return None
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "shared": fields["Shared_Clean"] + fields["Shared_Dirty"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def _memory_summary():
+    usage = memory_usage(os.getpid())
+    if usage is None:
+        return "memory n/a"
+    return f"RSS {usage['rss'] / 1024:.1f} MB, PSS {usage['pss'] / 1024:.1f} MB"
+
+
+class GunicornServer(BaseApplication):
+    """Runs the project under gunicorn with `options` as its settings."""
+
+    def __init__(self, options, max_worker_rss_mb=0):
+        self.options = options
+        self.max_rss_kb = max_worker_rss_mb * 1024
+        # Per worker: each is a forked copy of this object.
+        self._forked_at = None
+        self._request_started = None
+        self._first_request_done = False
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+        for hook in ("pre_fork", "post_fork", "post_worker_init", "pre_request", "post_request"):
+            self.cfg.set(hook, getattr(self, hook))
+
+    def load(self):
+        # Runs in the master with preload_app, in each worker otherwise.
+        application = warm_application()
+        gc.collect()
+        return application
+
+    def pre_fork(self, server, worker):
+        gc.freeze()
+
+    def post_fork(self, server, worker):
+        self._forked_at = time.monotonic()
+
+    def post_worker_init(self, worker):
+        ready_ms = (time.monotonic() - self._forked_at) * 1000 if self._forked_at else 0
+        logger.info("Worker %s ready in %.0f ms (%s)", os.getpid(), ready_ms, _memory_summary())
+
+    def pre_request(self, worker, req):
+        if not self._first_request_done:
+            self._request_started = time.monotonic()
+
+    def post_request(self, worker, req, environ, resp):
+        if not self._first_request_done:
+            self._first_request_done = True
+            latency_ms = (time.monotonic() - (self._request_started or time.monotonic())) * 1000
+            logger.info(
+                "Worker %s served its first request in %.1f ms (%s)",
+                os.getpid(), latency_ms, _memory_summary(),
+            )
+        if not self.max_rss_kb:
+            return
+        usage = memory_usage(os.getpid())
+        if usage and usage["rss"] > self.max_rss_kb:
+            logger.info("Worker %s recycled at %s kB RSS", os.getpid(), usage["rss"])
+            worker.alive = False
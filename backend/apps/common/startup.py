@@ -0,0 +1,113 @@
+"""
+Cold-start measurement.
+
+measure_startup() runs a fresh interpreter with `-X importtime`, imports a
+target (the WSGI application, optionally with the URLconf and every view
+behind it) and returns the wall time, peak RSS and per-module import times.
+group_imports() folds those into one row per app/distribution with the
+module that first pulled it in, which is what `manage.py profile_startup`
+prints and what the startup regression test checks.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+TARGETS = {
+    "wsgi": "import config.wsgi",
+    "urls": (
+        "import config.wsgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns"
+    ),
+}
+
+# ru_maxrss survives exec(), so it can report the parent's peak; VmHWM
+# belongs to the new address space.
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+{target}
+try:
+    with open("/proc/self/status") as status:
+        maxrss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    maxrss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "wall_ms": (time.perf_counter() - started) * 1000,
+    "maxrss_kb": maxrss_kb,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def measure_startup(target="wsgi", env=None):
+    """Import `target` in a new interpreter; return its timings and imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(target=TARGETS[target])],
+        cwd=settings.ROOT_DIR,
+        env={
+            "DJANGO_SETTINGS_MODULE": os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "config.settings.local"
+            ),
+            **os.environ,
+            **(env or {}),
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["imports"] = parse_importtime(result.stderr)
+    return report
+
+
+def parse_importtime(output):
+    """[(depth, self_us, cumulative_us, module)] in the order -X importtime prints them."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def group_name(module):
+    parts = module.split(".")
+    if parts[0] in ("apps", "config") and len(parts) > 1:
+        return ".".join(parts[:2])
+    return parts[0]
+
+
+def group_imports(rows):
+    """
+    One entry per group (an app under apps/, config.*, or a top-level
+    package), largest self time first: {"group", "self_ms", "modules",
+    "imported_by"}. `imported_by` is the first module outside the group that
+    triggered it.
+    """
+    groups = defaultdict(lambda: {"self_ms": 0.0, "modules": 0, "imported_by": ""})
+    # importtime prints children before their parent, so walk backwards to
+    # know each module's importer; the last assignment wins, which is the
+    # group's earliest import.
+    stack = []
+    for depth, self_us, _, module in reversed(rows):
+        del stack[depth:]
+        name = group_name(module)
+        entry = groups[name]
+        entry["self_ms"] += self_us / 1000
+        entry["modules"] += 1
+        entry["imported_by"] = next(
+            (m for m in reversed(stack) if group_name(m) != name), ""
+        )
+        stack.append(module)
+    return sorted(
+        ({"group": name, **entry} for name, entry in groups.items()),
+        key=lambda entry: -entry["self_ms"],
+    )
@@ -1,3 +1,680 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.cache import get_cache_metrics, reset_cache_metrics
+from apps.common.counts import get_count, reconcile
+from apps.common.db import LockRetryWrapper, get_lock_metrics, reset_lock_metrics
+from apps.common.idempotency import REPLAYED_HEADER, _fingerprint
+from apps.common.images import (
+    HashedImageStorage,
+    UploadTooLarge,
+    generate_variants,
+    validate_upload_size,
+    variant_name,
+)
+from apps.common.models import IdempotencyRecord
+from apps.common.pagination import NoCountPagination
+from apps.common.routers import ReplicaRouter, use_replicas
+from apps.common.schema import write_schema_artifact
+from apps.common.management.commands.serve import Command as ServeCommand
+from apps.common.server import _serializer_classes, memory_usage, warm_application
+from apps.common.startup import group_imports, measure_startup, parse_importtime
+from apps.vehicle.models import Location, Route, Trip, Vehicle
+from apps.vehicle.serializers import RouteSerializer, VehicleSerializer
+from apps.vehicle.views import RouteViewSet
+
+User = get_user_model()
+
+
+def make_image(size=(1200, 800), image_format="JPEG", color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        # Variants are generated explicitly; keep the worker pool out of tests.
+        patcher = mock.patch("apps.common.images.schedule_variants")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.storage = HashedImageStorage(location=self.media_root)
+
+    def test_identical_uploads_are_deduplicated(self):
+        data = make_image()
+        first = self.storage.save("license/a.jpg", SimpleUploadedFile("a.jpg", data))
+        second = self.storage.save("license/b.jpg", SimpleUploadedFile("b.jpg", data))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith("license/"))
+        self.assertEqual(len(os.listdir(os.path.dirname(self.storage.path(first)))), 1)
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_size_cap_is_enforced(self):
+        upload = SimpleUploadedFile("big.jpg", make_image())
+        with self.assertRaises(ValidationError):
+            validate_upload_size(upload)
+        with self.assertRaises(SuspiciousFileOperation):
+            self.storage._save("license/big.jpg", upload)
+        self.assertEqual(os.listdir(self.storage.path("license")), [])
+
+    @override_settings(MAX_UPLOAD_SIZE=64 * 1024)
+    def test_oversized_upload_is_cut_off_mid_stream(self):
+        data = os.urandom(1024 * 1024)
+        request = RequestFactory().post(
+            "/", {"profile_photo": SimpleUploadedFile("big.jpg", data)}
+        )
+        body = request.environ["wsgi.input"]
+        read = []
+        original_read = body.read
+
+        def counting_read(*args, **kwargs):
+            chunk = original_read(*args, **kwargs)
+            read.append(len(chunk))
+            return chunk
+
+        body.read = counting_read
+        with self.assertRaises(UploadTooLarge):
+            request.FILES  # noqa: B018
+        self.assertLess(sum(read), len(data) // 2)
+
+        user = User.objects.create_user("Pari", "Passenger", "pari@example.com", "pass12345")
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.patch(
+            reverse("update-profile"),
+            {"profile_photo": SimpleUploadedFile("big.jpg", data)},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("maximum size", str(response.data))
+
+    def test_variants_are_bounded_by_configured_sizes(self):
+        name = self.storage.save(
+            "profile_photos/p.png", SimpleUploadedFile("p.png", make_image(image_format="PNG"))
+        )
+        generate_variants(self.storage, name)
+        with Image.open(self.storage.path(variant_name(name, "thumb"))) as thumb:
+            self.assertEqual(max(thumb.size), 96)
+            self.assertEqual(thumb.format, "PNG")
+
+
+class MediaServeViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        # Variants are generated explicitly; keep the worker pool out of tests.
+        patcher = mock.patch("apps.common.images.schedule_variants")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.storage = HashedImageStorage(location=self.media_root)
+        self.photo = self.storage.save(
+            "profile_photos/p.jpg", SimpleUploadedFile("p.jpg", make_image())
+        )
+        self.client = APIClient()
+
+    def test_strong_etag_and_immutable_cache_for_hashed_names(self):
+        url = reverse("media", kwargs={"path": self.photo})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_request(self):
+        url = reverse("media", kwargs={"path": self.photo})
+        size = os.path.getsize(self.storage.path(self.photo))
+        response = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{size}")
+        self.assertEqual(len(b"".join(response.streaming_content)), 10)
+
+        response = self.client.get(url, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND="nginx")
+    def test_offloads_to_front_end_server(self):
+        response = self.client.get(reverse("media", kwargs={"path": self.photo}))
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.photo)
+
+    def test_license_scans_are_restricted(self):
+        driver = User.objects.create_user(
+            "Dan", "Driver", "dan@example.com", "pass12345", role="driver"
+        )
+        other = User.objects.create_user(
+            "Pat", "Passenger", "pat@example.com", "pass12345"
+        )
+        vehicle = Vehicle.objects.create(
+            driver=driver,
+            model="Corolla",
+            plate_number="KBL-1",
+            type=Vehicle.ECONOMY,
+            license=SimpleUploadedFile("l.jpg", make_image(color="blue")),
+        )
+        url = reverse("media", kwargs={"path": vehicle.license.name})
+
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(driver)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+
+    def test_non_canonical_paths_cannot_bypass_license_check(self):
+        name = self.storage.save("license/l.jpg", SimpleUploadedFile("l.jpg", make_image()))
+        for path in (
+            f"./{name}",
+            f"profile_photos/../{name}",
+            name.replace("/", "//", 1),
+            f"{name}/.",
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f"/media/{path}").status_code, 404)
+        self.assertEqual(self.client.get(f"/media/{name}").status_code, 401)
+
+
+class RowCountTests(TestCase):
+    def create_user(self, email, **extra):
+        return User.objects.create_user("Row", "Count", email, "pass12345", **extra)
+
+    def test_counts_follow_saves_and_deletes(self):
+        self.assertEqual(get_count(User), (0, False))
+        with self.captureOnCommitCallbacks(execute=True):
+            driver = self.create_user("d@example.com", role="driver")
+            self.create_user("p@example.com")
+        self.assertEqual(get_count(User), (2, True))
+        self.assertEqual(get_count(User, role="driver")[0], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            driver.role = "passenger"
+            driver.save()
+        self.assertEqual(get_count(User, role="driver")[0], 0)
+        self.assertEqual(get_count(User, role="passenger")[0], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            driver.delete()
+        self.assertEqual(get_count(User)[0], 1)
+
+    def test_reconcile_corrects_drift_from_bulk_operations(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_user("a@example.com")
+        get_count(User, role="driver")
+        User.objects.filter(email="a@example.com").update(role="driver")
+        self.assertEqual(reconcile()["users.User?role=driver"], 1)
+        self.assertEqual(get_count(User, role="driver")[0], 1)
+
+    def test_profile_list_reports_approximate_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            viewer = self.create_user("v@example.com")
+        client = APIClient()
+        client.force_authenticate(viewer)
+        response = client.get(reverse("all-profiles"))
+        self.assertEqual(response.json()["profiles"]["count"], 1)
+        self.assertTrue(response.json()["profiles"]["approximate"])
+
+
+class NoCountPaginationTests(TestCase):
+    def test_has_next_without_count(self):
+        for i in range(3):
+            User.objects.create_user("No", "Count", f"n{i}@example.com", "pass12345")
+        pagination = NoCountPagination()
+        pagination.page_size = 2
+        request = Request(APIRequestFactory().get("/users/"))
+
+        with self.assertNumQueries(1):
+            page = pagination.paginate_queryset(User.objects.order_by("pkid"), request)
+        self.assertEqual(len(page), 2)
+        data = pagination.get_paginated_response([]).data
+        self.assertTrue(data["has_next"])
+        self.assertIn("page=2", data["next"])
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS["busy_timeout"])
+
+    def test_lock_errors_are_retried_outside_transactions(self):
+        reset_lock_metrics()
+        calls = []
+
+        def flaky_execute(sql, params, many, context):
+            calls.append(sql)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return "ok"
+
+        fake_connection = type("Conn", (), {"in_atomic_block": False})()
+        with override_settings(SQLITE_LOCK_BACKOFF=0):
+            wrapper = LockRetryWrapper(fake_connection)
+        self.assertEqual(wrapper(flaky_execute, "SELECT 1", None, False, {}), "ok")
+        metrics = get_lock_metrics()
+        self.assertEqual((metrics["retries"], metrics["retry_successes"]), (1, 1))
+
+        fake_connection.in_atomic_block = True
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            wrapper(flaky_execute, "SELECT 1", None, False, {})
+        self.assertEqual(get_lock_metrics()["failures"], 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_MAX_LAG_SECONDS=5)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_replica_only_when_opted_in(self):
+        with mock.patch("apps.common.routers.replica_lag", return_value=1):
+            self.assertIsNone(self.router.db_for_read(User))
+            with use_replicas():
+                self.assertEqual(self.router.db_for_read(User), "replica")
+
+    def test_write_pins_rest_of_request_to_primary(self):
+        with mock.patch("apps.common.routers.replica_lag", return_value=1):
+            with use_replicas():
+                self.router.db_for_write(User)
+                self.assertIsNone(self.router.db_for_read(User))
+            with use_replicas():
+                self.assertEqual(self.router.db_for_read(User), "replica")
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch("apps.common.routers.replica_lag", return_value=60):
+            with use_replicas():
+                self.assertEqual(self.router.db_for_read(User), "default")
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_metrics()
+        self.client = APIClient()
+        self.pickup = Location.objects.create(name="Kabul")
+        self.drop = Location.objects.create(name="Herat")
+        self.route = Route.objects.create(pickup=self.pickup, drop=self.drop, price_af=500)
+        self.url = reverse("routes-list")
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(get_cache_metrics()["hits"], 1)
+
+    def test_model_changes_invalidate_dependent_entries(self):
+        self.client.get(self.url)
+        self.pickup.name = "Kabul Airport"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pickup.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("Kabul Airport", response.content.decode())
+
+        driver = User.objects.create_user("D", "R", "driver@example.com", "x", role="driver")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.route.drivers.add(driver)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()[0]["drivers"], [driver.pk])
+
+    @override_settings(RESPONSE_CACHE_LOCK_TIMEOUT=2)
+    def test_concurrent_miss_waits_for_the_rebuild(self):
+        request = Request(APIRequestFactory().get(self.url))
+        cache_key = RouteViewSet().get_cache_key(request)
+        # Another worker holds the rebuild lock and stores the result shortly.
+        cache.add(f"{cache_key}:lock", 1)
+        timer = threading.Timer(0.1, cache.set, [cache_key, ["rebuilt"]])
+        timer.start()
+        self.addCleanup(timer.cancel)
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), ["rebuilt"])
+        self.assertEqual(get_cache_metrics()["stampede_wait_hits"], 1)
+
+
+class SchemaViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.schema_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.schema_dir)
+        cls.manifest = write_schema_artifact(cls.schema_dir, "test")
+
+    def setUp(self):
+        self.client = APIClient(HTTP_ACCEPT="application/json")
+        self.url = reverse("schema")
+        self.entry = self.manifest["formats"]["json"]
+
+    def test_serves_artifact_with_etag_and_gzip(self):
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir, OPENAPI_SCHEMA_LIVE=False):
+            response = self.client.get(self.url)
+            self.assertEqual(response["X-Schema-Version"], "test")
+            self.assertEqual(response["ETag"], self.entry["etag"])
+            self.assertEqual(response.json()["openapi"], "3.0.3")
+
+            zipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(zipped["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(zipped.content), response.content)
+
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.entry["etag"])
+            self.assertEqual(cached.status_code, 304)
+
+    def test_accept_encoding_q_values(self):
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir, OPENAPI_SCHEMA_LIVE=False):
+            for header, zipped in [
+                ("gzip;q=0", False),
+                ("br, gzip; q=0.0", False),
+                ("*;q=0.5", True),
+                ("*, gzip;q=0", False),
+                ("deflate;q=1, GZIP;q=0.2", True),
+                ("identity", False),
+            ]:
+                with self.subTest(header=header):
+                    response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=header)
+                    self.assertEqual(response.get("Content-Encoding") == "gzip", zipped)
+
+    def test_if_none_match_lists_and_wildcard(self):
+        etag = self.entry["etag"]
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir, OPENAPI_SCHEMA_LIVE=False):
+            for header, status_code in [
+                (f'"other", {etag}', 304),
+                (f"W/{etag}", 304),
+                ("*", 304),
+                ('"other"', 200),
+            ]:
+                with self.subTest(header=header):
+                    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+                    self.assertEqual(response.status_code, status_code)
+
+    def test_falls_back_to_live_generation(self):
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir, OPENAPI_SCHEMA_LIVE=True):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Schema-Version", response)
+
+        missing = os.path.join(self.schema_dir, "missing")
+        with override_settings(OPENAPI_SCHEMA_DIR=missing, OPENAPI_SCHEMA_LIVE=False):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Schema-Version", response)
+
+
+class MiddlewareDispatchTests(TestCase):
+    def test_api_routes_skip_session_and_frame_middleware(self):
+        response = self.client.get(reverse("routes-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Frame-Options", response)
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+        self.assertFalse(hasattr(response.wsgi_request, "session"))
+
+    def test_admin_keeps_full_stack(self):
+        response = self.client.get(reverse("admin:login"))
+        self.assertEqual(response["X-Frame-Options"], "DENY")
+        self.assertIn("csrftoken", response.cookies)
+        self.assertTrue(hasattr(response.wsgi_request, "session"))
+
+
+class ServeCommandTests(SimpleTestCase):
+    def test_serializers_are_found_through_the_urlconf(self):
+        serializers = set(_serializer_classes(get_resolver()))
+        self.assertIn(RouteSerializer, serializers)
+        self.assertIn(VehicleSerializer, serializers)
+
+    def test_warm_application_closes_connections(self):
+        with mock.patch("django.db.connections.close_all") as close_all, \
+                mock.patch("apps.vehicle.distances.matrix.refresh") as refresh_distances:
+            self.assertIsInstance(warm_application(), WSGIHandler)
+        close_all.assert_called_once()
+        refresh_distances.assert_called_once_with()
+
+    def test_serve_configures_a_preloaded_gunicorn(self):
+        parser = ServeCommand().create_parser("manage.py", "serve")
+        options = vars(parser.parse_args(
+            ["--workers", "3", "--max-requests", "500", "--timeout", "20", "--max-worker-rss", "1"]
+        ))
+        server = ServeCommand().server(options)
+        cfg = server.cfg
+        self.assertTrue(cfg.preload_app)
+        self.assertEqual((cfg.workers, cfg.max_requests, cfg.timeout), (3, 500, 20))
+
+        with mock.patch("gc.freeze") as freeze:
+            cfg.pre_fork(None, None)
+        freeze.assert_called_once_with()
+
+        worker = SimpleNamespace(alive=True)
+        usage = {"rss": 512, "pss": 256}
+        with mock.patch("apps.common.server.memory_usage", return_value=usage), \
+                self.assertLogs("apps.common.server", "INFO") as logs:
+            cfg.post_fork(None, worker)
+            cfg.post_worker_init(worker)
+            cfg.pre_request(worker, None)
+            cfg.post_request(worker, None, {}, None)
+            cfg.pre_request(worker, None)
+            cfg.post_request(worker, None, {}, None)
+        self.assertTrue(worker.alive)
+        self.assertEqual(len(logs.output), 2)
+        self.assertRegex(logs.output[0], r"ready in \d+ ms \(RSS 0\.5 MB, PSS 0\.2 MB\)")
+        self.assertRegex(logs.output[1], r"first request in [\d.]+ ms \(RSS 0\.5 MB")
+        with mock.patch("apps.common.server.memory_usage", return_value={"rss": 2048, "pss": 1024}):
+            cfg.post_request(worker, None, {}, None)
+        self.assertFalse(worker.alive)
+
+    def test_memory_usage(self):
+        usage = memory_usage(os.getpid())
+        if usage is None:
+            self.skipTest("/proc/<pid>/smaps_rollup is not available")
+        self.assertEqual(set(usage), {"rss", "pss", "shared", "private"})
+        self.assertGreater(usage["rss"], 0)
+        self.assertIsNone(memory_usage(-1))
+
+
+# Cold start of config.wsgi measured at ~0.5 s and ~65 MB peak RSS; the caps
+# leave room for slower machines but catch a heavy import sneaking back in.
+COLD_START_MAX_MS = 1500
+COLD_START_MAX_RSS_MB = 96
+LAZY_MODULES = ("PIL", "requests", "yaml", "rest_framework.serializers", "drf_spectacular.openapi")
+
+
+class StartupTests(SimpleTestCase):
+    def test_cold_start_budget(self):
+        report = measure_startup("wsgi")
+        modules = {name for _, _, _, name in report["imports"]}
+        for lazy in LAZY_MODULES:
+            self.assertNotIn(lazy, modules, f"{lazy} is imported at startup")
+        self.assertLess(report["wall_ms"], COLD_START_MAX_MS)
+        self.assertLess(report["maxrss_kb"] / 1024, COLD_START_MAX_RSS_MB)
+
+    def test_group_imports(self):
+        rows = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       300 |        300 |       PIL._util\n"
+            "import time:       700 |       1000 |     PIL\n"
+            "import time:       100 |       1100 |   apps.common.images\n"
+            "import time:        50 |       1150 | apps.common\n"
+        )
+        self.assertEqual(rows[0], (3, 300, 300, "PIL._util"))
+        groups = {g["group"]: g for g in group_imports(rows)}
+        self.assertEqual(groups["PIL"]["modules"], 2)
+        self.assertAlmostEqual(groups["PIL"]["self_ms"], 1.0)
+        self.assertEqual(groups["PIL"]["imported_by"], "apps.common.images")
+        self.assertEqual(groups["apps.common"]["imported_by"], "")
+
+
+def booking_setup(test):
+    User = get_user_model()
+    test.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "pass12345")
+    test.route = Route.objects.create(
+        pickup=Location.objects.create(name="Kabul"),
+        drop=Location.objects.create(name="Herat"),
+        price_af=500,
+    )
+    test.url = reverse("trip-list-create")
+    test.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(test.passenger)}"}
+
+
+@override_settings(SURGE_TICK_SECONDS=0)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        booking_setup(self)
+        self.client = APIClient()
+
+    def book(self, key=None, **data):
+        headers = dict(self.auth)
+        if key is not None:
+            headers["HTTP_IDEMPOTENCY_KEY"] = key
+        return self.client.post(self.url, {"route_id": self.route.pk, **data}, format="json", **headers)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.book("trip-1")
+        self.assertEqual(first.status_code, 201)
+        with mock.patch("apps.vehicle.serializers.TripRequestSerializer.create") as create:
+            retry = self.book("trip-1")
+        create.assert_not_called()
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(retry[REPLAYED_HEADER], "true")
+        self.assertEqual(Trip.objects.count(), 1)
+
+        self.assertEqual(self.book("trip-1", passenger_count=2).status_code, 422)
+        self.assertEqual(self.book("trip-2").status_code, 201)
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(Trip.objects.count(), 3)
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.book("shared")
+        other = get_user_model().objects.create_user("Omar", "Other", "omar@example.com", "pass12345")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(other)}"}
+        response = self.book("shared")
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertEqual(Trip.objects.count(), 2)
+
+    def test_invalid_keys_and_unstored_errors(self):
+        self.assertEqual(self.book("x" * 256).status_code, 400)
+        self.auth = {"HTTP_AUTHORIZATION": "Bearer not-a-token"}
+        self.assertEqual(self.book("trip-1").status_code, 401)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_anonymous_requests_are_not_idempotent(self):
+        login = {"email": "pari@example.com", "password": "pass12345"}
+        for _ in range(2):
+            response = self.client.post(
+                reverse("token_obtain_pair"), login, format="json", HTTP_IDEMPOTENCY_KEY="login"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.1)
+    def test_claims_are_shared_through_the_database(self):
+        # A claim made by another worker process, which shares no cache.
+        self.book("trip-1")
+        IdempotencyRecord.objects.update(status_code=None, content=b"")
+        response = self.book("trip-1")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Trip.objects.count(), 1)
+
+        # A claim left behind by a worker that died is taken over.
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.book("trip-1").status_code, 201)
+        self.assertEqual(Trip.objects.count(), 2)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 201)
+
+    def test_uploads_are_fingerprinted_without_reading_the_body(self):
+        factory = APIRequestFactory()
+
+        def upload(boundary):
+            body = (
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"about_me\"\r\n\r\n"
+                f"hello\r\n--{boundary}--\r\n"
+            )
+            return factory.generic(
+                "PATCH", "/api/v1/profile/", body, content_type=f"multipart/form-data; boundary={boundary}"
+            )
+
+        first, retry = upload("aaaa"), upload("bbbb")
+        self.assertEqual(_fingerprint(first), _fingerprint(retry))
+        self.assertFalse(first._read_started)
+        self.assertFalse(hasattr(first, "_body"))
+
+        as_json = factory.post("/api/v1/trips/", {"route_id": 1}, format="json")
+        other = factory.post("/api/v1/trips/", {"route_id": 2}, format="json")
+        self.assertNotEqual(_fingerprint(as_json), _fingerprint(other))
+
+    def test_expired_records_are_swept(self):
+        self.book("trip-1")
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.book("trip-1").status_code, 201)
+        self.assertEqual(Trip.objects.count(), 2)
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        call_command("sweep_idempotency_keys", stdout=io.StringIO())
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+
+@override_settings(SURGE_TICK_SECONDS=0)
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        booking_setup(self)
+
+    def test_parallel_duplicates_create_one_trip(self):
+        clients = 8
+        barrier = threading.Barrier(clients)
+        responses = []
+
+        def post():
+            try:
+                barrier.wait()
+                responses.append(
+                    APIClient().post(
+                        self.url, {"route_id": self.route.pk}, format="json",
+                        HTTP_IDEMPOTENCY_KEY="same-trip", **self.auth,
+                    )
+                )
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=post) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Trip.objects.count(), 1)
+        self.assertEqual([r.status_code for r in responses], [201] * clients)
+        self.assertEqual(len({r.content for r in responses}), 1)
+        self.assertEqual(sum(r.has_header(REPLAYED_HEADER) for r in responses), clients - 1)
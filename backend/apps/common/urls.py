@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import CacheStatsView, DatabaseDiagnosticsView
+
+urlpatterns = [
+    path("admin/db-diagnostics/", DatabaseDiagnosticsView.as_view(), name="db-diagnostics"),
+    path("admin/cache-stats/", CacheStatsView.as_view(), name="cache-stats"),
+]
@@ -1,3 +1,143 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+from django.utils._os import safe_join
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from apps.vehicle.permissions import IsAdmin
+
+from .cache import get_cache_metrics
+from .db import get_lock_metrics
+from .media import clean_media_path, serve_media_file
+from .permissions import CanViewMedia
+from .schema import live_schema_enabled, load_artifact
+
+
+class MediaServeView(APIView):
+    """
+    Serves uploaded media after checking access, replacing the DEBUG-only
+    `static()` route so production has a permission-aware path too.
+    """
+
+    permission_classes = [CanViewMedia]
+
+    def initial(self, request, *args, **kwargs):
+        # Permissions, the private flag and the file lookup all read the
+        # cleaned path from self.kwargs.
+        path = clean_media_path(self.kwargs.get("path", ""))
+        if path is None:
+            raise Http404("Media file not found.")
+        self.kwargs["path"] = path
+        super().initial(request, *args, **kwargs)
+
+    def get(self, request, format=None, **kwargs):
+        path = self.kwargs["path"]
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+            return serve_media_file(
+                request,
+                path,
+                full_path,
+                private=path.startswith(CanViewMedia.PROTECTED_PREFIXES),
+            )
+        except (ValueError, FileNotFoundError, NotADirectoryError):
+            raise Http404("Media file not found.")
+
+
+class DatabaseDiagnosticsView(APIView):
+    """
+    PRAGMAs in effect on this worker's connection and its lock-wait metrics.
+    """
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request, format=None):
+        pragmas = {}
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                for pragma in settings.SQLITE_PRAGMAS:
+                    cursor.execute(f"PRAGMA {pragma}")
+                    pragmas[pragma] = cursor.fetchone()[0]
+        return Response(
+            {
+                "vendor": connection.vendor,
+                "pragmas": pragmas,
+                "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+                "lock_metrics": get_lock_metrics(),
+            }
+        )
+
+
+class CacheStatsView(APIView):
+    """
+    Response-cache backend and this worker's hit/miss/stampede counters.
+    """
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request, format=None):
+        return Response(
+            {
+                "backend": settings.CACHES["default"]["BACKEND"],
+                "timeout": settings.RESPONSE_CACHE_TIMEOUT,
+                "metrics": get_cache_metrics(),
+            }
+        )
+
+
+def _etag_matches(if_none_match, etag):
+    """If-None-Match's weak comparison: any listed tag, W/ ignored, or `*`."""
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in etags}
+
+
+def _accepts_gzip(accept_encoding):
+    """Whether Accept-Encoding gives gzip, by name or through `*`, a q-value above 0."""
+    qvalues = {}
+    for coding in accept_encoding.split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            qvalues[name.lower()] = q
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
+
+
+class SchemaView(SpectacularAPIView):
+    """
+    Serves the schema written by `manage.py generate_schema`, falling back to
+    per-request generation in development or when no artifact exists.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        artifact = None if live_schema_enabled() else load_artifact()
+        # ?lang= and ?version= change the schema itself; generate those live.
+        if artifact is None or request.GET.get("lang") or request.GET.get("version"):
+            return super().get(request, *args, **kwargs)
+
+        fmt = "json" if "json" in request.accepted_renderer.format else "yaml"
+        entry = artifact["formats"][fmt]
+        if _etag_matches(request.headers.get("If-None-Match", ""), entry["etag"]):
+            response = HttpResponseNotModified()
+        elif entry["gzip_content"] and _accepts_gzip(request.headers.get("Accept-Encoding", "")):
+            response = HttpResponse(entry["gzip_content"], content_type=request.accepted_media_type)
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(entry["content"], content_type=request.accepted_media_type)
+        response["ETag"] = entry["etag"]
+        response["Cache-Control"] = f"public, max-age={settings.OPENAPI_SCHEMA_MAX_AGE}"
+        response["X-Schema-Version"] = artifact["version"]
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProfilesConfig(AppConfig):
@@ -7,3 +8,6 @@ class ProfilesConfig(AppConfig):
 
     def ready(self):
         from apps.profiles import signals
+        from apps.profiles.search import ensure_search_index
+
+        post_migrate.connect(ensure_search_index, sender=self)
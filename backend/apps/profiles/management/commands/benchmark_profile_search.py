@@ -0,0 +1,114 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.profiles.search import (
+    CREATE_FTS_TABLE,
+    FTS_COLUMNS,
+    FTS_TABLE,
+    RANK_EXPRESSION,
+    SOURCE_SELECT,
+    build_match_query,
+)
+
+FIRST_NAMES = ["ahmad", "mariam", "sina", "zahra", "omid", "farida", "karim", "laila"]
+LAST_NAMES = ["sultani", "rahimi", "karimi", "ahmadi", "noori", "hakimi", "azizi"]
+CITIES = ["Kabul", "Herat", "Mazar", "Kandahar", "Jalalabad", "Bamyan"]
+WORDS = ["driver", "music", "travel", "student", "engineer", "teacher", "cricket", "books"]
+
+LIKE_WHERE = """
+    FROM profiles_profile p JOIN users_user u ON u.pkid = p.user_id
+    WHERE (u.first_name LIKE :a OR u.last_name LIKE :a OR u.email LIKE :a
+       OR p.city LIKE :a OR p.address LIKE :a OR p.about_me LIKE :a)
+      AND (u.first_name LIKE :b OR u.last_name LIKE :b OR u.email LIKE :b
+       OR p.city LIKE :b OR p.address LIKE :b OR p.about_me LIKE :b)
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark FTS5 profile search against icontains (LIKE) scans on a "
+        "synthetic SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=20)
+
+    def handle(self, *args, **options):
+        count = options["profiles"]
+        rng = random.Random(42)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = sqlite3.connect(os.path.join(tmp, "bench.sqlite3"))
+            db.execute(
+                "CREATE TABLE users_user (pkid INTEGER PRIMARY KEY, first_name TEXT, "
+                "last_name TEXT, email TEXT)"
+            )
+            db.execute(
+                "CREATE TABLE profiles_profile (pkid INTEGER PRIMARY KEY, user_id INTEGER, "
+                "city TEXT, address TEXT, about_me TEXT, created_at INTEGER)"
+            )
+
+            started = time.perf_counter()
+            users, profiles = [], []
+            for pk in range(1, count + 1):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                users.append((pk, first, last, f"{first}.{last}{pk}@example.com"))
+                profiles.append(
+                    (
+                        pk,
+                        pk,
+                        rng.choice(CITIES),
+                        f"Street {rng.randint(1, 500)}",
+                        " ".join(rng.sample(WORDS, 3)),
+                        pk,
+                    )
+                )
+            db.executemany("INSERT INTO users_user VALUES (?, ?, ?, ?)", users)
+            db.executemany("INSERT INTO profiles_profile VALUES (?, ?, ?, ?, ?, ?)", profiles)
+            db.commit()
+            self.stdout.write(f"Generated {count} profiles in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            db.execute(CREATE_FTS_TABLE)
+            db.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) {SOURCE_SELECT}"
+            )
+            db.commit()
+            self.stdout.write(f"Built FTS5 index in {time.perf_counter() - started:.1f}s")
+
+            terms = [
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                for _ in range(options["queries"])
+            ]
+            fts_where = f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?"
+
+            # Each query is what the paginated list does: COUNT(*) plus one page.
+            started = time.perf_counter()
+            for term in terms:
+                first, last = term.split()
+                params = {"a": f"%{first}%", "b": f"%{last}%"}
+                db.execute(f"SELECT count(*) {LIKE_WHERE}", params).fetchone()
+                db.execute(
+                    f"SELECT p.pkid {LIKE_WHERE} ORDER BY p.created_at DESC LIMIT 10", params
+                ).fetchall()
+            like_ms = (time.perf_counter() - started) / len(terms) * 1000
+
+            started = time.perf_counter()
+            for term in terms:
+                match = [build_match_query(term)]
+                db.execute(f"SELECT count(*) {fts_where}", match).fetchone()
+                db.execute(
+                    f"SELECT rowid {fts_where} ORDER BY {RANK_EXPRESSION} LIMIT 10", match
+                ).fetchall()
+            fts_ms = (time.perf_counter() - started) / len(terms) * 1000
+
+            db.close()
+
+        self.stdout.write(f"icontains scan: {like_ms:8.2f} ms/query")
+        self.stdout.write(f"FTS5 + bm25:    {fts_ms:8.2f} ms/query")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.profiles.search import fts_enabled, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 profile search index from the profile and user tables."
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("Profile full-text search requires SQLite with FTS5.")
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} profiles."))
@@ -1,3 +1,4 @@
+from apps.common.images import HashedImageStorage, validate_upload_size
 from apps.common.models import TimeStampedModel
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -43,6 +44,9 @@ class Profile(TimeStampedModel):
 
     profile_photo = models.ImageField(
         verbose_name=_("profile photo"),
+        upload_to="profile_photos/",
+        storage=HashedImageStorage(),
+        validators=[validate_upload_size],
         blank=True,
         default="profile_default.png",
         null=True,
@@ -0,0 +1,154 @@
+"""
+Full-text profile search backed by an SQLite FTS5 table.
+
+The index is a standalone FTS5 table keyed by Profile.pkid, kept in sync with
+Profile and User by the signals in apps.profiles.signals. Where the SQLite
+build lacks FTS5, or on other database backends, search falls back to
+`icontains` filters.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "profiles_profile_fts"
+FTS_REBUILD_TABLE = f"{FTS_TABLE}_rebuild"
+FTS_COLUMNS = ["full_name", "email", "city", "address", "about_me"]
+# bm25 weights, in FTS_COLUMNS order: name matches rank above bio matches.
+FTS_WEIGHTS = [10.0, 5.0, 2.0, 2.0, 1.0]
+
+
+def _create_table(table):
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{', '.join(FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+CREATE_FTS_TABLE = _create_table(FTS_TABLE)
+RANK_EXPRESSION = f"bm25({FTS_TABLE}, {', '.join(str(w) for w in FTS_WEIGHTS)})"
+
+# Selects index rows straight from the base tables, used for bulk rebuilds.
+SOURCE_SELECT = """
+    SELECT p.pkid,
+           u.first_name || ' ' || u.last_name,
+           u.email,
+           COALESCE(p.city, ''),
+           COALESCE(p.address, ''),
+           COALESCE(p.about_me, '')
+    FROM profiles_profile p JOIN users_user u ON u.pkid = p.user_id
+"""
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+_fts5_available = {}
+
+
+def fts_enabled(using=DEFAULT_DB_ALIAS):
+    """Whether `using` is SQLite built with FTS5; probed once per alias."""
+    if connections[using].vendor != "sqlite":
+        return False
+    if using not in _fts5_available:
+        with connections[using].cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            _fts5_available[using] = any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+    return _fts5_available[using]
+
+
+def ensure_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate hook: create the FTS5 table if it is missing."""
+    from .models import Profile
+
+    if not fts_enabled(using) or not router.allow_migrate_model(using, Profile):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(CREATE_FTS_TABLE)
+
+
+def build_match_query(text):
+    """
+    Turn free text into a safe FTS5 query: every word becomes a quoted prefix
+    term, and all terms must match.
+    """
+    tokens = TOKEN_RE.findall(text)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def index_profile(profile):
+    if not fts_enabled():
+        return
+    user = profile.user
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [profile.pkid])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                profile.pkid,
+                f"{user.first_name} {user.last_name}",
+                user.email,
+                profile.city or "",
+                profile.address or "",
+                profile.about_me or "",
+            ],
+        )
+
+
+def remove_profile(pkid):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pkid])
+
+
+def rebuild_search_index():
+    """
+    Repopulate the whole index: fill a new table in one statement and swap
+    it in within the same transaction, so searches keep seeing the old index
+    until the new one is complete.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_REBUILD_TABLE}")
+        cursor.execute(_create_table(FTS_REBUILD_TABLE))
+        cursor.execute(
+            f"INSERT INTO {FTS_REBUILD_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) {SOURCE_SELECT}"
+        )
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        cursor.execute(f"ALTER TABLE {FTS_REBUILD_TABLE} RENAME TO {FTS_TABLE}")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_profiles(queryset, text):
+    """
+    Restrict `queryset` to profiles matching `text`, best matches first.
+    """
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+
+    if not fts_enabled():
+        condition = Q()
+        for token in TOKEN_RE.findall(text):
+            condition &= (
+                Q(user__first_name__icontains=token)
+                | Q(user__last_name__icontains=token)
+                | Q(user__email__icontains=token)
+                | Q(city__icontains=token)
+                | Q(address__icontains=token)
+                | Q(about_me__icontains=token)
+            )
+        return queryset.filter(condition)
+
+    # The IN list is evaluated once; the rank only for the profiles in it.
+    table = queryset.model._meta.db_table
+    matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    rank = RawSQL(
+        f"SELECT {RANK_EXPRESSION} FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.pkid",
+        [match],
+    )
+    return queryset.filter(pkid__in=matches).annotate(search_rank=rank).order_by("search_rank")
@@ -1,6 +1,9 @@
 from django_countries.serializer_fields import CountryField
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+
+from apps.common.images import variant_url
+
 from .models import Profile
 User = get_user_model() 
 
@@ -11,7 +14,7 @@ class ProfileSerializers(serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email')
     role = serializers.CharField(source='user.role', read_only=True)
     user_pkid = serializers.IntegerField(source='user.pk', read_only=True)
-    full_name = serializers.SerializerMethodField(read_only=True)
+    full_name = serializers.CharField(source="user.full_name", read_only=True)
     profile_photo = serializers.SerializerMethodField()
     country = CountryField(name_only=True)
 
@@ -35,13 +38,10 @@ class ProfileSerializers(serializers.ModelSerializer):
             "phone_number",
         ]
 
-    def get_full_name(self, obj):
-        first_name = obj.user.first_name.title()
-        last_name = obj.user.last_name.title()
-        return f"{first_name} {last_name}"
-
     def get_profile_photo(self, obj):
-        return obj.profile_photo.url
+        # List views ask for a smaller variant through the serializer context.
+        variant = self.context.get("photo_variant", "medium")
+        return variant_url(obj.profile_photo, variant)
 
     def update(self, instance, validated_data):
         # Extract nested user data
@@ -86,7 +86,7 @@ class AdminUserListSerializer(serializers.ModelSerializer):
     """
     Serializer for the admin user management page (read-only list).
     """
-    full_name = serializers.CharField(source='get_full_name', read_only=True)
+    full_name = serializers.CharField(read_only=True)
 
     class Meta:
         model = User
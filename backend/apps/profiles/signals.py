@@ -1,17 +1,42 @@
 import logging
 
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from apps.profiles.models import Profile
-from config.settings.base import AUTH_USER_MODEL
+from apps.profiles.search import index_profile, remove_profile
 
 logger = logging.getLogger(__name__)
 
+# User columns that feed the search index.
+INDEXED_USER_FIELDS = {"first_name", "last_name", "email"}
 
-@receiver(post_save, sender=AUTH_USER_MODEL)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
         logger.info(f"{instance}'s profile has been created.")
- 
\ No newline at end of file
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    # New users are indexed through their profile's post_save; saves such as
+    # the last_login update on every login leave the index alone.
+    if created or (update_fields is not None and not INDEXED_USER_FIELDS & update_fields):
+        return
+    profile = Profile.objects.filter(user=instance).first()
+    if profile is not None:
+        profile.user = instance
+        index_profile(profile)
+
+
+@receiver(post_save, sender=Profile)
+def index_saved_profile(sender, instance, **kwargs):
+    index_profile(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def unindex_deleted_profile(sender, instance, **kwargs):
+    remove_profile(instance.pkid)
@@ -1,3 +1,139 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.profiles import search
+from apps.profiles.search import build_match_query, rebuild_search_index
+from apps.profiles.views import AsyncProfileDetailAPIView
+from apps.users.admin import UserAdmin
+
+User = get_user_model()
+
+
+class ProfileSearchTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user("Vee", "Viewer", "vee@example.com", "pass12345")
+        self.sina = User.objects.create_user("Sina", "Sultani", "sina@example.com", "pass12345")
+        self.laila = User.objects.create_user("Laila", "Noori", "laila@example.com", "pass12345")
+        self.laila.profile.about_me = "I love driving with Sina's playlist."
+        self.laila.profile.city = "Herat"
+        self.laila.profile.save()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.url = reverse("all-profiles")
+
+    def search(self, text):
+        response = self.client.get(self.url, {"search": text})
+        self.assertEqual(response.status_code, 200)
+        return [p["email"] for p in response.json()["profiles"]["results"]]
+
+    def test_name_matches_rank_above_bio_matches(self):
+        self.assertEqual(self.search("sina"), ["sina@example.com", "laila@example.com"])
+
+    def test_index_follows_user_and_profile_saves(self):
+        self.assertEqual(self.search("herat"), ["laila@example.com"])
+
+        self.sina.last_name = "Rahimi"
+        self.sina.save()
+        self.assertEqual(self.search("rahimi"), ["sina@example.com"])
+        self.assertEqual(self.search("sultani"), [])
+
+        self.laila.profile.delete()
+        self.assertEqual(self.search("herat"), [])
+
+    def test_saves_outside_indexed_fields_skip_reindex(self):
+        with mock.patch("apps.profiles.signals.index_profile") as index_profile:
+            self.sina.save(update_fields=["last_login"])
+            index_profile.assert_not_called()
+            self.sina.save(update_fields=["last_name"])
+            index_profile.assert_called_once_with(self.sina.profile)
+
+    def test_rebuild_swaps_in_a_complete_index(self):
+        self.assertEqual(rebuild_search_index(), 3)
+        self.assertEqual(self.search("sina"), ["sina@example.com", "laila@example.com"])
+
+    def test_falls_back_without_fts5(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchall.return_value = [("ENABLE_JSON1",)]
+        with mock.patch.dict(search._fts5_available, clear=True):
+            with mock.patch.object(search.connections["default"], "cursor", return_value=cursor):
+                self.assertFalse(search.fts_enabled())
+            self.assertEqual(self.search("herat"), ["laila@example.com"])
+        self.assertTrue(search.fts_enabled())
+
+    def test_match_query_is_sanitised(self):
+        self.assertEqual(build_match_query('ali "OR* (x'), '"ali"* "OR"* "x"*')
+        self.assertEqual(self.search('"(*'), [])
+
+    def test_list_avoids_per_row_user_queries(self):
+        self.client.get(self.url)  # seeds the maintained row count
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+
+class AdminUserListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            "Ada", "Admin", "ada@example.com", "pass12345", role="admin"
+        )
+        User.objects.create_user("zahra", "ahmadi", "zahra@example.com", "pass12345")
+        User.objects.create_user("Émile", "Zola", "emile@example.com", "pass12345")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse("admin-user-list")
+
+    def test_full_name_is_stored_normalized(self):
+        user = User.objects.get(email="zahra@example.com")
+        self.assertEqual(user.full_name, "Zahra Ahmadi")
+        self.assertEqual(user.search_name, "zahra ahmadi")
+
+        user.first_name = "mariam"
+        user.save(update_fields=["first_name"])
+        user.refresh_from_db()
+        self.assertEqual(user.full_name, "Mariam Ahmadi")
+
+    def test_admin_search_matches_last_name_and_email_prefix(self):
+        user_admin = UserAdmin(User, admin.site)
+
+        def search(term):
+            queryset, _ = user_admin.get_search_results(None, User.objects.all(), term)
+            return sorted(queryset.values_list("email", flat=True))
+
+        self.assertEqual(search("zola"), ["emile@example.com"])
+        self.assertEqual(search("Ahmadi Za"), ["zahra@example.com"])
+        self.assertEqual(search("ZAHRA@Ex"), ["zahra@example.com"])
+        self.assertEqual(search("E"), ["emile@example.com"])
+
+        self.assertIn("users_user_email_lower_idx", User.objects.search_by_email("ad").explain())
+        self.assertIn("users_user_search_last_idx", User.objects.search_by_name("zo").explain())
+
+    def test_str_falls_back_to_email_before_save(self):
+        self.assertEqual(str(User(email="new@example.com")), "new@example.com")
+
+    def test_search_and_ordering_use_stored_name(self):
+        response = self.client.get(self.url, {"search": "emile z"})
+        self.assertEqual([u["email"] for u in response.json()], ["emile@example.com"])
+
+        response = self.client.get(self.url, {"ordering": "full_name"})
+        self.assertEqual(
+            [u["full_name"] for u in response.json()],
+            ["Ada Admin", "Zahra Ahmadi", "Émile Zola"],
+        )
+
 
-# Create your tests here.
+class AsyncProfileDetailTests(TestCase):
+    def test_returns_own_profile(self):
+        user = User.objects.create_user("Sina", "Sultani", "sina@example.com", "pass12345")
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}"
+        )
+        response = async_to_sync(AsyncProfileDetailAPIView.as_view())(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], "sina@example.com")
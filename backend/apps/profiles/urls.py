@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -12,3 +13,9 @@ urlpatterns = [
     path("admin/users/", AdminUserListView.as_view(), name="admin-user-list"),
     path("admin/users/<int:pkid>/", AdminUserDetailView.as_view(), name="admin-user-detail"),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    # Under ASGI, GET me/ is served by the async view.
+    urlpatterns = [
+        path("me/", views.AsyncProfileDetailAPIView.as_view(), name="my-profile"),
+    ] + urlpatterns
@@ -1,29 +1,48 @@
-from config.settings.local import DEFAULT_FROM_EMAIL
 from django.contrib.auth import get_user_model
 from django.core.mail import send_mail
-from rest_framework import generics, status
+from rest_framework import filters, generics, status
 from rest_framework.exceptions import NotFound
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from apps.common.async_views import AsyncRetrieveAPIView
+from apps.common.routers import ReplicaReadMixin
 from apps.vehicle.permissions import IsAdmin
 from .models import Profile
 from .pagination import ProfilePagination
 from .renderers import ProfileJsonRenderers, ProfilesJsonRenderers
+from .search import search_profiles
 from .serializers import ProfileSerializers, UpdateProfileSerializer,AdminUserUpdateSerializer,AdminUserListSerializer,AdminUserUpdateSerializer
 
 User = get_user_model()
 
-class ProfileListAPIView(generics.ListAPIView):
-    queryset = Profile.objects.all()
+class ProfileListAPIView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    Lists profiles. `?search=<text>` runs a ranked full-text search over name,
+    email, city, address and about_me.
+    """
+
+    queryset = Profile.objects.select_related("user")
     serializer_class = ProfileSerializers
     permission_classes = [IsAuthenticated]
     pagination_class = ProfilePagination
     renderer_classes = [ProfilesJsonRenderers]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["photo_variant"] = "small"
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        search = self.request.query_params.get("search", "").strip()
+        if search:
+            queryset = search_profiles(queryset, search)
+        return queryset
+
 
-class ProfileDetailAPIView(generics.RetrieveAPIView):
+class ProfileDetailAPIView(ReplicaReadMixin, generics.RetrieveAPIView):
     permission_classes = [AllowAny]
     serializer_class = ProfileSerializers
     renderer_classes = [ProfileJsonRenderers]
@@ -38,6 +57,22 @@ class ProfileDetailAPIView(generics.RetrieveAPIView):
         return profile
 
 
+class AsyncProfileDetailAPIView(ReplicaReadMixin, AsyncRetrieveAPIView):
+    """
+    GET side of ProfileDetailAPIView for ASGI (settings.ASYNC_READ_VIEWS).
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ProfileSerializers
+    renderer_classes = [ProfileJsonRenderers]
+
+    async def aget_object(self):
+        try:
+            return await Profile.objects.select_related("user").aget(user=self.request.user)
+        except Profile.DoesNotExist:
+            raise NotFound("Profile not found.")
+
+
 class UpdateProfileAPIView(generics.UpdateAPIView):
     serializer_class = ProfileSerializers
     pagination_class = ProfilePagination
@@ -58,10 +93,22 @@ class UpdateProfileAPIView(generics.UpdateAPIView):
 class AdminUserListView(generics.ListAPIView):
     """
     Provides a list of all users for the admin dashboard.
+
+    `?search=` is a prefix match on the stored full name and `?ordering=`
+    accepts full_name, email and date_joined (prefix with `-` to reverse).
     """
-    queryset = User.objects.all().order_by('-date_joined')
+    queryset = User.objects.all()
     serializer_class = AdminUserListSerializer
     permission_classes = [IsAdmin]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ["full_name", "email", "date_joined"]
+    ordering = ["-date_joined"]
+
+    def get_queryset(self):
+        search = self.request.query_params.get("search", "").strip()
+        if search:
+            return User.objects.search_by_name(search)
+        return super().get_queryset()
 
 class AdminUserDetailView(generics.RetrieveUpdateAPIView):
     """
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 
 from .forms import UserChangeForm, UserCreationForm
@@ -16,8 +17,7 @@ class UserAdmin(BaseUserAdmin):
         "pkid",
         "id",
         "email",
-        "first_name",
-        "last_name",
+        "full_name",
         "role",
         "is_staff",
         "is_active",
@@ -66,7 +66,16 @@ class UserAdmin(BaseUserAdmin):
         ),
     )
 
-    search_fields = ["email", "first_name", "last_name"]
+    search_fields = ["email", "full_name"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Prefix lookups on the indexed names and lower(email) instead of the
+        # default icontains scan over every row.
+        if not search_term:
+            return queryset, False
+        by_name = User.objects.search_by_name(search_term).values("pk")
+        by_email = User.objects.search_by_email(search_term).values("pk")
+        return queryset.filter(Q(pk__in=by_name) | Q(pk__in=by_email)), False
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.users.models import compose_full_name, normalize_search_key
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Populate the stored full_name/search_name/search_last_first columns "
+        "in primary-key batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(
+                User.objects.filter(pkid__gt=last_pk)
+                .order_by("pkid")
+                .only(
+                    "pkid", "first_name", "last_name", "full_name", "search_name",
+                    "search_last_first",
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            changed = []
+            for user in batch:
+                full_name = compose_full_name(user.first_name, user.last_name)
+                keys = (
+                    full_name,
+                    normalize_search_key(full_name),
+                    normalize_search_key(f"{user.last_name} {user.first_name}"),
+                )
+                if (user.full_name, user.search_name, user.search_last_first) != keys:
+                    user.full_name, user.search_name, user.search_last_first = keys
+                    changed.append(user)
+            # bulk_update skips save(), so signals and auto fields are untouched.
+            User.objects.bulk_update(changed, ["full_name", "search_name", "search_last_first"])
+            updated += len(changed)
+            last_pk = batch[-1].pkid
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} users."))
@@ -1,6 +1,8 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 
@@ -50,3 +52,28 @@ class CustomUserManager(BaseUserManager):
             raise ValueError(_("Superuser must have an email address."))
 
         return self.create_user(first_name, last_name, email, password, **extra_fields)
+
+    def search_by_name(self, text):
+        """
+        Prefix match on the normalized "first last" or "last first" name.
+        Expressed as ranges so the search_name and search_last_first indexes
+        are used instead of a LIKE scan.
+        """
+        from .models import normalize_search_key
+
+        key = normalize_search_key(text)
+        if not key:
+            return self.get_queryset()
+        return self.get_queryset().filter(
+            Q(search_name__gte=key, search_name__lt=key + "\uffff")
+            | Q(search_last_first__gte=key, search_last_first__lt=key + "\uffff")
+        )
+
+    def search_by_email(self, text):
+        """Case-insensitive email prefix match on the lower(email) index."""
+        key = text.strip().lower()
+        if not key:
+            return self.get_queryset()
+        return self.get_queryset().alias(email_lower=Lower("email")).filter(
+            email_lower__gte=key, email_lower__lt=key + "\uffff"
+        )
@@ -1,7 +1,9 @@
+import unicodedata
 import uuid
 
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -12,6 +14,17 @@ from .managers import CustomUserManager
 # ----------------------------
 
 
+def compose_full_name(first_name, last_name):
+    return f"{first_name.title()} {last_name.title()}"
+
+
+def normalize_search_key(text):
+    """Case- and accent-insensitive key used for indexed name lookups."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     class Role(models.TextChoices):
         PASSENGER = "passenger", _("Passenger")
@@ -23,6 +36,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=150, unique=True, blank=True, null=True)
     first_name = models.CharField(verbose_name=_("First Name"), max_length=255)
     last_name = models.CharField(verbose_name=_("Last Name"), max_length=255)
+    # Denormalized from first/last name on save so lists can sort and search
+    # on an index instead of recomputing the name per row.
+    full_name = models.CharField(
+        verbose_name=_("Full Name"), max_length=511, blank=True, editable=False
+    )
+    search_name = models.CharField(max_length=511, blank=True, editable=False)
+    # "last first", so a search for the last name alone is a prefix match too.
+    search_last_first = models.CharField(max_length=511, blank=True, editable=False)
     email = models.CharField(
         verbose_name=_("Email"), max_length=255, db_index=True, unique=True
     )
@@ -44,13 +65,19 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _("user")
         verbose_name_plural = _("users")
+        indexes = [
+            models.Index(fields=["full_name"], name="users_user_full_name_idx"),
+            models.Index(fields=["search_name"], name="users_user_search_name_idx"),
+            models.Index(fields=["search_last_first"], name="users_user_search_last_idx"),
+            models.Index(Lower("email"), name="users_user_email_lower_idx"),
+        ]
 
     def __str__(self):
-        return self.get_full_name
+        return self.full_name or self.email
 
     @property
     def get_full_name(self):
-        return f"{self.first_name.title()} {self.last_name.title()}"
+        return self.full_name or compose_full_name(self.first_name, self.last_name)
 
     @property
     def get_short_name(self):
@@ -60,4 +87,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         if not self.username:
             email_username, _ = self.email.split("@")
             self.username = email_username
+        self.full_name = compose_full_name(self.first_name, self.last_name)
+        self.search_name = normalize_search_key(self.full_name)
+        self.search_last_first = normalize_search_key(f"{self.last_name} {self.first_name}")
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"first_name", "last_name"} & set(update_fields):
+            kwargs["update_fields"] = {
+                *update_fields, "full_name", "search_name", "search_last_first"
+            }
         super(User, self).save(*args, **kwargs)
@@ -3,6 +3,8 @@ from django_countries.serializer_fields import CountryField
 from phonenumber_field.serializerfields import PhoneNumberField
 from rest_framework import serializers
 
+from apps.common.images import variant_url
+
 User = get_user_model()
 
 
@@ -33,7 +35,7 @@ class UserSerializer(serializers.ModelSerializer):
     def get_profile_photo(self, obj):
         try:
             if obj.profile.profile_photo and hasattr(obj.profile.profile_photo, "url"):
-                return obj.profile.profile_photo.url
+                return variant_url(obj.profile.profile_photo, "medium")
         except Exception:
             pass
         return None
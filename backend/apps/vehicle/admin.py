@@ -1,8 +1,52 @@
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
 
 from .models import Location, Route, Trip, Vehicle
+from .sharding import shard_for_pk, trip_shard_aliases
 
-admin.site.register(Trip)
+
+class TripShardFilter(admin.SimpleListFilter):
+    """Lists the trips of one shard at a time, `default` unless chosen."""
+
+    title = _("shard")
+    parameter_name = "shard"
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in trip_shard_aliases()]
+
+    def has_output(self):
+        return len(self.lookup_choices) > 1
+
+    def value(self):
+        value = super().value()
+        return value if value in trip_shard_aliases() else DEFAULT_DB_ALIAS
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == lookup,
+                "query_string": changelist.get_query_string({self.parameter_name: lookup}),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value())
+
+
+class TripAdmin(admin.ModelAdmin):
+    list_filter = [TripShardFilter, "status"]
+
+    def get_object(self, request, object_id, from_field=None):
+        # Trip pks carry their shard; look the trip up there.
+        try:
+            return self.get_queryset(request).using(shard_for_pk(object_id)).get(pk=object_id)
+        except (Trip.DoesNotExist, ValidationError, TypeError, ValueError):
+            return None
+
+
+admin.site.register(Trip, TripAdmin)
 admin.site.register(Location)
 admin.site.register(Vehicle)
 admin.site.register(Route)
@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 from django.utils.translation import gettext_lazy as _
 
 
@@ -6,3 +8,13 @@ class VehicleConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.vehicle"
     verbose_name = _("Vehicle")
+
+    def ready(self):
+        from apps.vehicle import availability, eta, expiry, sharding
+
+        post_migrate.connect(sharding.ensure_shard_sequence, sender=self)
+        sharding.connect_signals()
+        availability.connect_signals()
+        eta.connect_signals()
+        if settings.TRIP_EXPIRY_INTERVAL_SECONDS:
+            expiry.sweeper.start()
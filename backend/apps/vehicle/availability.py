@@ -0,0 +1,189 @@
+"""
+Driver availability.
+
+A trip with a driver that is neither completed nor cancelled occupies the
+driver over [start, end):
+- start is its start_time, scheduled_for or request_time, whichever is
+  set first;
+- end is its end_time or, until then, the start plus an estimate. The
+  estimate covers distance_km at settings.TRIP_AVERAGE_SPEED_KMH, is at
+  least TRIP_MIN_DURATION_MINUTES, and adds TRIP_TURNAROUND_MINUTES.
+
+`calendar` keeps one IntervalTree per driver, loaded from the trip shards
+the first time that driver is asked about. Saving or deleting an assigned
+trip bumps the "vehicle.Trip" version counter of apps.common.cache on
+commit, and every process then drops its loaded trees.
+
+The in-memory check answers the trip board and rejects most clashes early.
+Accepting views repeat it with `fresh=True`, straight from the database,
+inside the write transaction (BEGIN IMMEDIATE on SQLite), so two workers
+assigning the same driver on one shard at the same moment cannot both pass.
+"""
+
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from apps.common.cache import bump_version, model_versions
+
+from . import eligibility
+from .models import Trip
+from .sharding import trip_shard_aliases
+
+TRIP_LABEL = "vehicle.Trip"
+FREE_STATUSES = ("completed", "cancelled")
+
+
+def trip_interval(trip):
+    """(start, end) POSIX timestamps during which `trip` occupies its driver."""
+    start = trip.start_time or trip.scheduled_for or trip.request_time
+    if start is None:  # not saved yet
+        start = timezone.now()
+    if trip.end_time is not None:
+        return start.timestamp(), max(trip.end_time.timestamp(), start.timestamp())
+    minutes = max(
+        settings.TRIP_MIN_DURATION_MINUTES,
+        (trip.distance_km or 0) / settings.TRIP_AVERAGE_SPEED_KMH * 60,
+    ) + settings.TRIP_TURNAROUND_MINUTES
+    return start.timestamp(), start.timestamp() + minutes * 60
+
+
+class IntervalTree:
+    """
+    Half-open intervals sorted by start, augmented with the running maximum
+    of their ends: the in-order layout of a balanced interval tree. "Does
+    anything overlap [a, b)?" is one bisection; listing the overlaps walks
+    back only while the running maximum still reaches past `a`.
+    """
+
+    def __init__(self, intervals=()):
+        items = sorted(intervals)
+        self._starts = [start for start, _, _ in items]
+        self._ends = [end for _, end, _ in items]
+        self._keys = [key for _, _, key in items]
+        self._max_end = list(accumulate(self._ends, max))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end, key):
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._keys.insert(i, key)
+        self._max_end.insert(i, end)
+        running = self._max_end[i - 1] if i else -math.inf
+        for j in range(i, len(self._ends)):
+            running = max(running, self._ends[j])
+            self._max_end[j] = running
+
+    def is_free(self, start, end=None):
+        """Whether nothing overlaps [start, end), or covers `start` when `end` is None."""
+        if end is None:
+            i = bisect_right(self._starts, start)
+        else:
+            i = bisect_left(self._starts, end)
+        return i == 0 or self._max_end[i - 1] <= start
+
+    def overlapping(self, start, end):
+        """Keys of the intervals overlapping [start, end)."""
+        found = []
+        j = bisect_left(self._starts, end) - 1
+        while j >= 0 and self._max_end[j] > start:
+            if self._ends[j] > start:
+                found.append(self._keys[j])
+            j -= 1
+        return found
+
+
+class DriverCalendar:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trees = {}  # driver_id -> IntervalTree of (start, end, (trip pk, pool_id))
+        self._version = None
+
+    def _load(self, driver_id):
+        intervals = []
+        for alias in trip_shard_aliases():
+            trips = (
+                Trip.objects.using(alias)
+                .filter(driver_id=driver_id)
+                .exclude(status__in=FREE_STATUSES)
+                .only(
+                    "pk", "start_time", "end_time", "scheduled_for", "request_time", "distance_km",
+                    "pool_id",
+                )
+            )
+            intervals.extend((*trip_interval(trip), (trip.pk, trip.pool_id)) for trip in trips)
+        return IntervalTree(intervals)
+
+    def tree(self, driver_id):
+        version = model_versions([TRIP_LABEL])[TRIP_LABEL]
+        with self._lock:
+            if version != self._version:
+                self._trees, self._version = {}, version
+            tree = self._trees.get(driver_id)
+        if tree is None:
+            tree = self._load(driver_id)
+            with self._lock:
+                tree = self._trees.setdefault(driver_id, tree)
+        return tree
+
+    def conflicts(self, driver_id, trip, fresh=False):
+        """
+        pks of the driver's other trips that overlap `trip`, other than those
+        pooled with it. `fresh` reads the trips from the database instead of
+        the loaded tree.
+        """
+        tree = self._load(driver_id) if fresh else self.tree(driver_id)
+        return [
+            pk
+            for pk, pool_id in tree.overlapping(*trip_interval(trip))
+            if pk != trip.pk and (pool_id is None or pool_id != trip.pool_id)
+        ]
+
+    def is_free(self, driver_id, start, end=None):
+        """Whether `driver_id` has no trip over [start, end) (datetimes), or at `start`."""
+        return self.tree(driver_id).is_free(
+            start.timestamp(), end.timestamp() if end is not None else None
+        )
+
+    def free_drivers(self, route_id, start, end=None, vehicle_type="", passengers=1):
+        """Drivers eligible for `route_id` with no trip over [start, end), or at `start`."""
+        return {
+            driver_id
+            for driver_id in eligibility.index.drivers_for(route_id, vehicle_type, passengers)
+            if self.is_free(driver_id, start, end)
+        }
+
+    def record(self, trip):
+        """Add a just-assigned trip to its driver's loaded tree, ahead of the version bump."""
+        with self._lock:
+            tree = self._trees.get(trip.driver_id)
+            if tree is not None:
+                tree.add(*trip_interval(trip), (trip.pk, trip.pool_id))
+
+    def clear(self):
+        with self._lock:
+            self._trees = {}
+
+
+calendar = DriverCalendar()
+
+
+def _on_trip_change(sender, instance, created=False, **kwargs):
+    # New unassigned bookings cannot change anyone's calendar.
+    if created and instance.driver_id is None:
+        return
+    transaction.on_commit(lambda: bump_version(TRIP_LABEL), using=instance._state.db)
+
+
+def connect_signals():
+    post_save.connect(_on_trip_change, sender=Trip, dispatch_uid="driver-availability")
+    post_delete.connect(_on_trip_change, sender=Trip, dispatch_uid="driver-availability")
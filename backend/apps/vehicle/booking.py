@@ -0,0 +1,160 @@
+"""
+Group-commit booking ingestion.
+
+With settings.BOOKING_GROUP_COMMIT on, TripRequestSerializer.create() does
+not save the trip itself. The request thread validates it, fills in its
+UUID, region and distance, and queues it on `writer`. A single writer
+thread inserts the queue with bulk_create(): one transaction per trip shard
+per batch, instead of one commit per booking that SQLite would serialise.
+The writer flushes BOOKING_FLUSH_INTERVAL_MS after the first queued
+booking, or as soon as BOOKING_BATCH_SIZE are waiting; when its last flush
+wrote a single trip it does not wait at all, so a lone client pays no
+latency for a group that is not coming. Each request thread
+blocks on the Future of its own trip and returns once that trip is
+committed. With BOOKING_FLUSH_INTERVAL_MS = 0 there is no writer thread and
+each submit() flushes in the calling thread.
+
+If a batch fails, its trips are retried one by one, so a bad row only fails
+its own request. bulk_create() sends no post_save, so row counts are
+adjusted here. No other post_save receiver acts on a new unassigned trip.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.common.counts import record_bulk_create
+
+from .models import Trip
+from .sharding import shard_for_region
+
+logger = logging.getLogger(__name__)
+
+
+class BookingWriter:
+    def __init__(self):
+        self._queue = deque()  # (trip, future)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, trip):
+        """Queue an unsaved Trip; returns a Future resolving to it once committed."""
+        trip.populate_from_route()
+        future = Future()
+        with self._lock:
+            self._queue.append((trip, future))
+            pending = len(self._queue)
+        if not settings.BOOKING_FLUSH_INTERVAL_MS:
+            self.flush()
+            return future
+        self._ensure_thread()
+        if pending == 1 or pending >= settings.BOOKING_BATCH_SIZE:
+            self._wakeup.set()
+        return future
+
+    def save(self, trip):
+        """
+        submit() and wait for the commit. A trip still queued after
+        BOOKING_COMMIT_TIMEOUT is withdrawn, so a request that gave up never
+        books it later; one the writer has already started on is waited for.
+        """
+        future = self.submit(trip)
+        try:
+            return future.result(timeout=settings.BOOKING_COMMIT_TIMEOUT)
+        except TimeoutError:
+            with self._lock:
+                try:
+                    self._queue.remove((trip, future))
+                except ValueError:
+                    pass  # already taken by flush()
+                cancelled = future.cancel()
+            if cancelled:
+                raise
+            return future.result()
+
+    def flush(self):
+        """Write everything queued; returns the number of trips committed."""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [
+                    self._queue.popleft()
+                    for _ in range(min(settings.BOOKING_BATCH_SIZE, len(self._queue)))
+                ]
+            if not batch:
+                return written
+            by_shard = defaultdict(list)
+            for trip, future in batch:
+                if future.set_running_or_notify_cancel():
+                    by_shard[shard_for_region(trip.region)].append((trip, future))
+            for alias, entries in by_shard.items():
+                written += self._write(alias, entries)
+
+    def _write(self, alias, entries):
+        trips = [trip for trip, _ in entries]
+        try:
+            with transaction.atomic(using=alias):
+                Trip.objects.using(alias).bulk_create(trips)
+        except Exception:
+            logger.exception("Booking batch of %s failed; inserting one by one", len(trips))
+            return self._write_each(alias, entries)
+        record_bulk_create(Trip, trips)
+        for trip, future in entries:
+            trip._state.adding, trip._state.db = False, alias
+            future.set_result(trip)
+        return len(entries)
+
+    def _write_each(self, alias, entries):
+        written = 0
+        for trip, future in entries:
+            try:
+                with transaction.atomic(using=alias):
+                    Trip.objects.using(alias).bulk_create([trip])
+            except Exception as exc:
+                future.set_exception(exc)
+                continue
+            record_bulk_create(Trip, [trip])
+            trip._state.adding, trip._state.db = False, alias
+            future.set_result(trip)
+            written += 1
+        return written
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="booking-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        interval = settings.BOOKING_FLUSH_INTERVAL_MS / 1000
+        grouped = 0
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Let the rest of the group arrive, unless a full batch is waiting
+            # or the last flush found nothing to group with.
+            if grouped > 1 and len(self._queue) < settings.BOOKING_BATCH_SIZE:
+                time.sleep(interval)
+            try:
+                grouped = self.flush()
+            except Exception:
+                logger.exception("Booking writer failed")
+            if self._queue:
+                self._wakeup.set()
+
+
+writer = BookingWriter()
@@ -0,0 +1,260 @@
+"""
+Great-circle distances between Locations.
+
+A snapshot matrix of pairwise haversine distances (float32 km) is computed
+with NumPy over every Location with coordinates. Row i belongs to the i-th
+smallest located pk; the snapshot stores those pks next to the matrix and a
+lookup finds its rows with a binary search. With
+settings.DISTANCE_MATRIX_PATH the snapshot lives in a memory-mapped .npy
+file that all workers on the host share through the page cache; without
+it, each process keeps its own copy in memory.
+
+Locations added, moved or deleted after the snapshot do not trigger an n^2
+rebuild. Each process computes only their rows (O(n) each) into an overlay.
+Changes are noticed through the Location version counter of
+apps.common.cache, or when a lookup meets an unknown pk.
+
+The first lookup in a process without a snapshot builds one (or maps the
+shared file), however the process was started. Later rebuilds are never run
+by lookups, which happen inside bookings. They run in refresh(): at worker
+start-up (apps.common.server.warm_application) and in
+`manage.py backfill_trip_distances`, which with a path also writes the
+snapshot every worker remaps. Once the overlay would outgrow
+OVERLAY_REBUILD_RATIO of the locations, lookups keep their previous state
+(unknown locations give None, so the trip is left for the backfill) until
+such a refresh.
+
+Memory: n^2 * 4 bytes for n located Locations, whatever their pks
+(1k -> 4 MB, 8k -> 256 MB).
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from apps.common.cache import model_versions
+
+from .models import Location
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+OVERLAY_REBUILD_RATIO = 0.125
+LOCATION_LABEL = "vehicle.Location"
+
+
+def haversine_matrix(a, b):
+    """(n, 2) x (m, 2) arrays of (lat, lon) degrees -> (n, m) float32 km; NaN rows stay NaN."""
+    a = np.radians(np.asarray(a, dtype=np.float64))
+    b = np.radians(np.asarray(b, dtype=np.float64))
+    lat1, lon1 = a[:, 0:1], a[:, 1:2]
+    lat2, lon2 = b[:, 0], b[:, 1]
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))).astype(np.float32)
+
+
+def _positions(pks, query):
+    """Positions of `query` pks in the sorted array `pks`, and which were found."""
+    positions = np.searchsorted(pks, query)
+    found = positions < len(pks)
+    found[found] = pks[positions[found]] == query[found]
+    return positions, found
+
+
+class DistanceMatrix:
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pks = np.zeros(0, dtype=np.int64)  # located pks, sorted
+        self._coords = np.zeros((0, 2))  # their current coordinates
+        self._known = frozenset()  # every Location pk, with or without coordinates
+        self._snapshot = None
+        self._snapshot_pks = np.zeros(0, dtype=np.int64)
+        self._snapshot_coords = np.zeros((0, 2))
+        self._snapshot_stat = None
+        self._overlay = {}  # pk -> row of distances to every located pk
+        self._version = None
+        self._deferred = False  # a rebuild is due but was left to refresh()
+
+    # --- lookups ---
+
+    def distance(self, a, b):
+        """km between Locations `a` and `b` (pks), or None if either has no coordinates."""
+        found = self.distances([a], [b])[0]
+        return None if np.isnan(found) else float(found)
+
+    def distances(self, a, b):
+        """Vectorised distance() for equal-length pk arrays; NaN where unknown."""
+        a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+        if self._stale() or not set(np.concatenate([a, b]).tolist()) <= self._known:
+            self._sync()
+        ia, found_a = _positions(self._pks, a)
+        ib, found_b = _positions(self._pks, b)
+        located = found_a & found_b
+        out = np.full(len(a), np.nan, dtype=np.float32)
+        sa, in_a = _positions(self._snapshot_pks, a)
+        sb, in_b = _positions(self._snapshot_pks, b)
+        in_snapshot = located & in_a & in_b
+        if self._snapshot is not None and in_snapshot.any():
+            out[in_snapshot] = self._snapshot[sa[in_snapshot], sb[in_snapshot]]
+        overlay = self._overlay
+        if overlay:
+            for i in np.flatnonzero(located).tolist():
+                row = overlay.get(int(a[i]))
+                if row is not None:
+                    out[i] = row[ib[i]]
+                elif (row := overlay.get(int(b[i]))) is not None:
+                    out[i] = row[ia[i]]
+        return out
+
+    # --- maintenance ---
+
+    def _stale(self):
+        if model_versions([LOCATION_LABEL])[LOCATION_LABEL] != self._version:
+            return True
+        # Waiting for a rebuild: pick up a snapshot another process wrote.
+        return self._deferred and self.path is not None and self._snapshot_file() != self._snapshot_stat
+
+    def _sync(self):
+        """
+        refresh() from a lookup. Past the first snapshot it never rebuilds
+        and never waits for a refresh under way.
+        """
+        if not self._lock.acquire(blocking=self._snapshot is None):
+            return
+        try:
+            self._refresh(rebuild=False)
+        finally:
+            self._lock.release()
+
+    def refresh(self, rebuild=True):
+        """
+        Bring the matrix in line with the Location table. With `rebuild`
+        false, a due rebuild is skipped: lookups keep the previous state
+        until a refresh() that may rebuild.
+        """
+        with self._lock:
+            self._refresh(rebuild)
+
+    def _refresh(self, rebuild):
+        version = model_versions([LOCATION_LABEL])[LOCATION_LABEL]
+        rows = list(Location.objects.order_by("pk").values_list("pk", "latitude", "longitude"))
+        located = [(pk, lat, lon) for pk, lat, lon in rows if lat is not None and lon is not None]
+        pks = np.array([pk for pk, _, _ in located], dtype=np.int64)
+        coords = np.array([(lat, lon) for _, lat, lon in located], dtype=np.float64).reshape(-1, 2)
+
+        self._load_snapshot()
+        changed = self._changed_pks(pks, coords) if self._snapshot is not None else None
+        if changed is None or len(changed) > max(16, OVERLAY_REBUILD_RATIO * len(pks)):
+            # Only the first snapshot of a process is built on demand.
+            if not rebuild and self._snapshot is not None:
+                if not self._deferred:
+                    logger.warning(
+                        "The location distance matrix needs a rebuild; lookups use the "
+                        "previous one until the next warm-up or backfill_trip_distances."
+                    )
+                self._deferred = True
+                self._known = frozenset(pk for pk, _, _ in rows)
+                self._version = version
+                return
+            self._rebuild(pks, coords)
+            overlay = {}
+        else:
+            # Cleared or deleted locations need no row: lookups check
+            # coordinates first.
+            rows_of = _positions(pks, np.array(changed, dtype=np.int64))[0]
+            overlay = dict(zip(changed, haversine_matrix(coords[rows_of], coords))) if changed else {}
+        self._overlay = overlay
+        self._pks, self._coords = pks, coords
+        self._known = frozenset(pk for pk, _, _ in rows)
+        self._version = version
+        self._deferred = False
+
+    def _changed_pks(self, pks, coords):
+        """Located `pks` that are new or moved since the snapshot."""
+        positions, found = _positions(self._snapshot_pks, pks)
+        moved = np.zeros(len(pks), dtype=bool)
+        moved[found] = (self._snapshot_coords[positions[found]] != coords[found]).any(axis=1)
+        return pks[~found | moved].tolist()
+
+    def _rebuild(self, pks, coords):
+        logger.info("Building the %sx%s location distance matrix", len(pks), len(pks))
+        matrix = haversine_matrix(coords, coords)
+        if self.path is None:
+            self._snapshot, self._snapshot_pks, self._snapshot_coords = matrix, pks, coords
+            return
+        self._write_snapshot(matrix, pks, coords)
+        self._load_snapshot()
+
+    # --- memory-mapped snapshot ---
+
+    def _write_snapshot(self, matrix, pks, coords):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(fd)
+        try:
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=matrix.shape)
+            out[:] = matrix
+            out.flush()
+            del out
+            with open(tmp_path + ".json", "w") as f:
+                json.dump({"pks": pks.tolist(), "coords": coords.tolist()}, f)
+            # Coordinates first: a reader that sees the new matrix must not
+            # pair it with the old coordinates.
+            os.replace(tmp_path + ".json", self.path + ".json")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            for leftover in (tmp_path, tmp_path + ".json"):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+            raise
+
+    def _snapshot_file(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load_snapshot(self):
+        """(Re)map the snapshot file if another process replaced it."""
+        if self.path is None:
+            return
+        key = self._snapshot_file()
+        if key is None:
+            self._snapshot = None
+            return
+        if key == self._snapshot_stat:
+            return
+        try:
+            with open(self.path + ".json") as f:
+                data = json.load(f)
+            pks = np.array(data["pks"], dtype=np.int64)
+            coords = np.array(data["coords"], dtype=np.float64).reshape(-1, 2)
+            matrix = np.load(self.path, mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            logger.warning("Unreadable distance matrix at %s; rebuilding", self.path)
+            self._snapshot = None
+            return
+        if matrix.shape != (len(pks), len(pks)) or coords.shape != (len(pks), 2):
+            self._snapshot = None
+            return
+        self._snapshot, self._snapshot_pks, self._snapshot_coords = matrix, pks, coords
+        self._snapshot_stat = key
+
+
+matrix = DistanceMatrix(settings.DISTANCE_MATRIX_PATH)
+
+
+def route_distance_km(route):
+    """Pickup-to-drop distance of `route`, or None without coordinates."""
+    return matrix.distance(route.pickup_id, route.drop_id)
@@ -0,0 +1,121 @@
+"""
+Which drivers can take which trips.
+
+A driver can take a trip on a route they serve (Route.drivers) if one of
+their vehicles fits it: of the trip's requested vehicle type, when it has
+one, and with at least Trip.passenger_count seats
+(Vehicle.SEAT_CAPACITY).
+
+`index` precomputes route -> vehicle type -> drivers, plus the routes and
+vehicle types of each driver, from three queries. It rebuilds when the
+Route, Vehicle or Location version counters of apps.common.cache change,
+and at least every settings.MODEL_INDEX_MAX_AGE seconds, since a locmem
+counter only moves in the worker that saved. The trip board and the
+nearby-driver search read it instead of joining routes, drivers and
+vehicles on every request; the accepting views ask again with `fresh=True`,
+from the database, before they assign.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from apps.common.cache import model_versions
+
+from .models import Route, Vehicle
+from .sharding import shards_for_regions
+
+LABELS = ("vehicle.Route", "vehicle.Vehicle", "vehicle.Location")
+
+
+def fits(vehicle_types, vehicle_type, passengers):
+    """Whether any of `vehicle_types` can take a trip for `vehicle_type` (or any) and `passengers`."""
+    candidates = (vehicle_type,) if vehicle_type else vehicle_types
+    return any(
+        t in vehicle_types and Vehicle.SEAT_CAPACITY[t] >= passengers for t in candidates
+    )
+
+
+class EligibilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = None
+        self._by_route = {}  # route_id -> {vehicle type -> frozenset(driver_ids)}
+        self._routes_of = {}  # driver_id -> {route_id: pickup region}
+        self._types_of = {}  # driver_id -> frozenset(vehicle types)
+        self._loaded_at = 0.0
+
+    def refresh(self, force=False):
+        versions = model_versions(LABELS)
+        expired = time.monotonic() - self._loaded_at >= settings.MODEL_INDEX_MAX_AGE
+        if versions == self._versions and not expired and not force:
+            return
+        with self._lock:
+            regions = dict(Route.objects.values_list("pk", "pickup__region"))
+            types_of = defaultdict(set)
+            for driver_id, vehicle_type in Vehicle.objects.values_list("driver_id", "type").distinct():
+                types_of[driver_id].add(vehicle_type)
+            by_route = defaultdict(lambda: defaultdict(set))
+            routes_of = defaultdict(dict)
+            for route_id, driver_id in Route.drivers.through.objects.values_list("route_id", "user_id"):
+                routes_of[driver_id][route_id] = regions[route_id]
+                for vehicle_type in types_of.get(driver_id, ()):
+                    by_route[route_id][vehicle_type].add(driver_id)
+
+            self._by_route = {
+                route_id: {t: frozenset(drivers) for t, drivers in per_type.items()}
+                for route_id, per_type in by_route.items()
+            }
+            self._routes_of = dict(routes_of)
+            self._types_of = {driver_id: frozenset(types) for driver_id, types in types_of.items()}
+            self._versions = versions
+            self._loaded_at = time.monotonic()
+
+    def drivers_for(self, route_id, vehicle_type="", passengers=1):
+        """Drivers on `route_id` with a vehicle that fits the trip."""
+        self.refresh()
+        per_type = self._by_route.get(route_id, {})
+        drivers = set()
+        for t, members in per_type.items():
+            if (not vehicle_type or t == vehicle_type) and Vehicle.SEAT_CAPACITY[t] >= passengers:
+                drivers |= members
+        return drivers
+
+    def serves(self, driver_id, route_id, fresh=False):
+        """Whether `driver_id` serves `route_id`; `fresh` asks the database."""
+        if fresh:
+            return Route.drivers.through.objects.filter(route_id=route_id, user_id=driver_id).exists()
+        self.refresh()
+        return route_id in self._routes_of.get(driver_id, {})
+
+    def can_take(self, driver_id, trip, fresh=False):
+        return self.serves(driver_id, trip.route_id, fresh) and fits(
+            self.vehicle_types(driver_id, fresh), trip.vehicle_type, trip.passenger_count
+        )
+
+    def vehicle_types(self, driver_id, fresh=False):
+        if fresh:
+            return frozenset(Vehicle.objects.filter(driver_id=driver_id).values_list("type", flat=True))
+        self.refresh()
+        return self._types_of.get(driver_id, frozenset())
+
+    def board(self, driver_id):
+        """
+        (filter, shard aliases) selecting the trips `driver_id` could take,
+        or None when they serve no route or have no vehicle.
+        """
+        self.refresh()
+        routes = self._routes_of.get(driver_id)
+        types = self._types_of.get(driver_id)
+        if not routes or not types:
+            return None
+        fitting = Q()
+        for t in sorted(types):
+            fitting |= Q(vehicle_type__in=["", t], passenger_count__lte=Vehicle.SEAT_CAPACITY[t])
+        return Q(route_id__in=sorted(routes)) & fitting, shards_for_regions(routes.values())
+
+
+index = EligibilityIndex()
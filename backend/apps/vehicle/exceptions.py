@@ -0,0 +1,9 @@
+from rest_framework.exceptions import APIException
+
+
+class BookingTimeout(APIException):
+    status_code = 503
+    default_detail = "The booking could not be saved in time. Please try again."
+    default_code = "booking_timeout"
+    # Sent as Retry-After by DRF's exception handler.
+    wait = 1
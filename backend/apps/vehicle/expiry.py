@@ -0,0 +1,161 @@
+"""
+Expiry of stale trip requests.
+
+A trip still `requested`, without a driver and not scheduled for later is
+cancelled once its request_time is more than TRIP_EXPIRY_MINUTES old, so it
+drops off every driver's board. Each shard is swept in batches of at most
+TRIP_EXPIRY_BATCH_SIZE trips, found through the (status, request_time)
+index oldest first. Every batch is its own short transaction that re-checks
+the status and driver, so a trip accepted meanwhile is left alone and the
+write lock is released between batches.
+
+The passengers of the expired trips are emailed once the batch is
+committed. `sweep()` returns how many trips it expired; the totals and the
+last sweep are in get_expiry_metrics().
+
+Run it with the expire_trips command, or set TRIP_EXPIRY_INTERVAL_SECONDS
+to sweep from a background thread started by VehicleConfig.ready(). Under
+`manage.py serve` that is the gunicorn master, which loads the app before
+forking, so one thread sweeps for all of its workers.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Trip
+from .sharding import trip_shard_aliases
+
+logger = logging.getLogger(__name__)
+
+_metrics_lock = threading.Lock()
+EXPIRY_METRICS = {
+    "sweeps": 0,
+    "expired": 0,
+    "notified": 0,
+    "last_expired": 0,
+    "last_duration_ms": None,
+    "last_swept_at": None,
+}
+
+
+def get_expiry_metrics():
+    with _metrics_lock:
+        return dict(EXPIRY_METRICS)
+
+
+def stale_trips(cutoff, using):
+    """Unanswered, unscheduled trips requested before `cutoff` on shard `using`."""
+    return Trip.objects.using(using).filter(
+        status="requested",
+        request_time__lt=cutoff,
+        driver__isnull=True,
+        scheduled_for__isnull=True,
+    )
+
+
+def _expire_batch(cutoff, using, batch_size):
+    with transaction.atomic(using=using):
+        expired = list(
+            stale_trips(cutoff, using)
+            .order_by("request_time")
+            .values_list("pk", "passenger_id", "route_id")[:batch_size]
+        )
+        if expired:
+            Trip.objects.using(using).filter(pk__in=[pk for pk, _, _ in expired]).update(
+                status="cancelled", updated_at=timezone.now()
+            )
+    return expired
+
+
+def notify_passengers(expired):
+    """Email the passenger of each expired (pk, passenger_id, route_id); returns how many were sent."""
+    User = get_user_model()
+    passengers = User.objects.in_bulk({passenger_id for _, passenger_id, _ in expired})
+    messages = []
+    for _, passenger_id, _ in expired:
+        passenger = passengers.get(passenger_id)
+        if passenger is None or not passenger.email:
+            continue
+        message = EmailMessage(
+            subject="Your trip request has expired",
+            body=render_to_string(
+                "email/trip_expired.html",
+                {"user": passenger, "minutes": settings.TRIP_EXPIRY_MINUTES},
+            ),
+            to=[passenger.email],
+        )
+        message.content_subtype = "html"
+        messages.append(message)
+    if not messages:
+        return 0
+    try:
+        return get_connection().send_messages(messages) or 0
+    except Exception:
+        logger.exception("Could not notify %s passengers of expired trips", len(messages))
+        return 0
+
+
+def sweep(max_age_minutes=None, batch_size=None, notify=True):
+    """Cancel every stale trip request on every shard; returns how many."""
+    started = time.perf_counter()
+    max_age = settings.TRIP_EXPIRY_MINUTES if max_age_minutes is None else max_age_minutes
+    batch_size = batch_size or settings.TRIP_EXPIRY_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(minutes=max_age)
+    expired = notified = 0
+    for alias in trip_shard_aliases():
+        while True:
+            batch = _expire_batch(cutoff, alias, batch_size)
+            expired += len(batch)
+            if notify and batch:
+                notified += notify_passengers(batch)
+            if len(batch) < batch_size:
+                break
+
+    duration = (time.perf_counter() - started) * 1e3
+    with _metrics_lock:
+        EXPIRY_METRICS["sweeps"] += 1
+        EXPIRY_METRICS["expired"] += expired
+        EXPIRY_METRICS["notified"] += notified
+        EXPIRY_METRICS["last_expired"] = expired
+        EXPIRY_METRICS["last_duration_ms"] = round(duration, 1)
+        EXPIRY_METRICS["last_swept_at"] = timezone.now().isoformat()
+    logger.info("Expired %s stale trip requests in %.0f ms", expired, duration)
+    return expired
+
+
+class Sweeper:
+    """Runs sweep() every TRIP_EXPIRY_INTERVAL_SECONDS on a daemon thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if not settings.TRIP_EXPIRY_INTERVAL_SECONDS:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trip-expiry", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.TRIP_EXPIRY_INTERVAL_SECONDS)
+            try:
+                sweep()
+            except Exception:
+                logger.exception("Trip expiry sweep failed")
+
+
+sweeper = Sweeper()
@@ -0,0 +1,132 @@
+"""
+Demand forecasting per route.
+
+The last FORECAST_HISTORY_WEEKS weeks of complete hours are counted into one
+bookings-per-hour row per route (Trip.request_time). Each row is folded into
+its weeks, and every hour of the week is smoothed exponentially across them:
+the latest week weighs FORECAST_SMOOTHING, each older week (1 -
+FORECAST_SMOOTHING) times the next. A smoothing of 0 gives the plain
+seasonal average. All routes are fitted at once, as one weighted sum over a
+(routes, weeks, 168) array.
+
+The fitted hour-of-week profile is kept in the cache for
+FORECAST_CACHE_SECONDS. The next-N-hours forecast reads it as the hours
+move on, so it stays usable between refreshes. `manage.py
+refresh_demand_forecast` rebuilds it and is meant to run hourly. A request
+that finds no forecast builds one itself.
+
+Trips are read as (route_id, "YYYY-MM-DD HH") pairs in chunks. SQLite
+stores datetimes as UTC text, so NumPy parses the hour directly and the
+rows never become Python datetimes.
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from .models import Route, Trip
+from .sharding import trip_shard_aliases
+
+HOURS_PER_WEEK = 168
+CACHE_KEY = "forecast:route-demand"
+CHUNK_SIZE = 100_000
+
+
+def _hour(hour_index):
+    return datetime.fromtimestamp(hour_index * 3600, tz=dt_timezone.utc)
+
+
+def hourly_counts(route_ids, start_hour, hours):
+    """
+    Bookings per route (rows, in `route_ids` order, which must be sorted) and
+    hour since `start_hour` (columns), over `hours` hours. Also returns how
+    many trips were counted.
+    """
+    counts = np.zeros(len(route_ids) * hours, dtype=np.int64)
+    counted = 0
+    if not len(route_ids):
+        return counts.reshape(0, hours), counted
+    since, until = _hour(start_hour), _hour(start_hour + hours)
+    for alias in trip_shard_aliases():
+        rows = (
+            Trip.objects.using(alias)
+            .filter(request_time__gte=since, request_time__lt=until)
+            .annotate(hour=Substr(Cast("request_time", CharField()), 1, 13))
+            .values_list("route_id", "hour")
+            .order_by()
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        while chunk := list(islice(rows, CHUNK_SIZE)):
+            routes = np.fromiter((route_id for route_id, _ in chunk), dtype=np.int64, count=len(chunk))
+            offsets = (
+                np.array([hour for _, hour in chunk], dtype="datetime64[h]").astype(np.int64) - start_hour
+            )
+            positions = np.searchsorted(route_ids, routes)
+            known = (positions < len(route_ids)) & (route_ids[np.minimum(positions, len(route_ids) - 1)] == routes)
+            counts += np.bincount(
+                positions[known] * hours + offsets[known], minlength=counts.size
+            )
+            counted += int(known.sum())
+    return counts.reshape(len(route_ids), hours), counted
+
+
+def fit(counts, weeks, smoothing):
+    """(routes, weeks * 168) hourly counts -> (routes, 168) smoothed profile."""
+    series = counts.reshape(counts.shape[0], weeks, HOURS_PER_WEEK)
+    if smoothing:
+        weights = smoothing * (1 - smoothing) ** np.arange(weeks - 1, -1, -1, dtype=np.float64)
+    else:
+        weights = np.ones(weeks)
+    weights /= weights.sum()
+    return np.tensordot(series, weights, axes=([1], [0])).astype(np.float32)
+
+
+def build(now=None):
+    """Fit the profile of every route from history up to the last complete hour."""
+    now = now or timezone.now()
+    weeks = settings.FORECAST_HISTORY_WEEKS
+    end_hour = int(now.timestamp() // 3600)
+    start_hour = end_hour - weeks * HOURS_PER_WEEK
+    route_ids = np.array(sorted(Route.objects.values_list("pk", flat=True)), dtype=np.int64)
+
+    started = time.perf_counter()
+    counts, trips = hourly_counts(route_ids, start_hour, weeks * HOURS_PER_WEEK)
+    loaded = time.perf_counter()
+    profile = fit(counts, weeks, settings.FORECAST_SMOOTHING)
+    return {
+        "route_ids": route_ids,
+        "profile": profile,
+        "start_hour": start_hour,
+        "generated_at": now,
+        "trips": trips,
+        "load_seconds": loaded - started,
+        "fit_seconds": time.perf_counter() - loaded,
+    }
+
+
+def refresh(now=None):
+    forecast = build(now)
+    cache.set(CACHE_KEY, forecast, timeout=settings.FORECAST_CACHE_SECONDS)
+    return forecast
+
+
+def get_forecast():
+    return cache.get(CACHE_KEY) or refresh()
+
+
+def next_hours(forecast, hours, now=None):
+    """
+    (start of the current hour and the `hours` - 1 after it, (routes, hours)
+    expected bookings in each).
+    """
+    now = now or timezone.now()
+    first = int(now.timestamp() // 3600)
+    columns = (np.arange(first, first + hours) - forecast["start_hour"]) % HOURS_PER_WEEK
+    return [_hour(first + i) for i in range(hours)], forecast["profile"][:, columns]
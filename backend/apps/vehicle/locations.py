@@ -0,0 +1,466 @@
+"""
+Live driver positions.
+
+Drivers post batches of GPS points (DriverLocationIngestView). The newest
+point per driver goes into `grid`, an in-memory uniform lat/lon grid of
+settings.DRIVER_GRID_CELL_DEG cells; positions older than
+settings.DRIVER_LOCATION_TTL are ignored by queries and swept periodically.
+Every point is queued on `writer`, which bulk-inserts DriverLocation rows
+from a background thread. The same thread deletes rows older than
+settings.DRIVER_LOCATION_RETENTION, at most once per
+DRIVER_LOCATION_PRUNE_INTERVAL and in DRIVER_LOCATION_BATCH_SIZE batches;
+`manage.py prune_driver_locations` does the same on demand.
+
+The grid is per process. Before answering a query it tails DriverLocation
+(at most once per flush interval), so points ingested by other workers show
+up once they have been flushed.
+
+nearest_available_drivers() ranks drivers by great-circle distance from a
+pickup Location with an expanding ring search over the grid and skips
+drivers who are on an in-progress trip.
+"""
+
+import atexit
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import DriverLocation, Trip
+from .sharding import trip_shard_aliases
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+INSERT_FIELDS = ("driver", "latitude", "longitude", "recorded_at")
+
+NearbyDriver = namedtuple(
+    "NearbyDriver", "driver_id distance_km latitude longitude recorded_at"
+)
+
+_metrics_lock = threading.Lock()
+LOCATION_METRICS = {
+    "points_received": 0,
+    "points_flushed": 0,
+    "points_dropped": 0,
+    "points_pruned": 0,
+    "flush_errors": 0,
+}
+
+
+def _record(**deltas):
+    with _metrics_lock:
+        for name, delta in deltas.items():
+            LOCATION_METRICS[name] += delta
+
+
+def get_location_metrics():
+    with _metrics_lock:
+        return dict(LOCATION_METRICS)
+
+
+def reset_location_metrics():
+    with _metrics_lock:
+        for name in LOCATION_METRICS:
+            LOCATION_METRICS[name] = 0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _ring(ci, cj, r):
+    """Cells at Chebyshev distance exactly `r` from (ci, cj)."""
+    if r == 0:
+        yield ci, cj
+        return
+    for j in range(cj - r, cj + r + 1):
+        yield ci - r, j
+        yield ci + r, j
+    for i in range(ci - r + 1, ci + r):
+        yield i, cj - r
+        yield i, cj + r
+
+
+class DriverGrid:
+    """Latest position per driver, bucketed by grid cell. Thread-safe."""
+
+    def __init__(self, cell_deg=None, ttl=None):
+        self.cell_deg = cell_deg or settings.DRIVER_GRID_CELL_DEG
+        self.ttl = ttl or settings.DRIVER_LOCATION_TTL
+        self._positions = {}  # driver_id -> (lat, lon, recorded_at, cell)
+        self._cells = {}  # cell -> {driver_id}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+        self._synced_at = None
+        self._synced_pk = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _cell(self, latitude, longitude):
+        return int(latitude // self.cell_deg), int(longitude // self.cell_deg)
+
+    def _put(self, driver_id, latitude, longitude, recorded_at):
+        current = self._positions.get(driver_id)
+        if current is not None:
+            if current[2] >= recorded_at:
+                return False
+            old_cell = current[3]
+        else:
+            old_cell = None
+        cell = self._cell(latitude, longitude)
+        if cell != old_cell:
+            if old_cell is not None:
+                members = self._cells[old_cell]
+                members.discard(driver_id)
+                if not members:
+                    del self._cells[old_cell]
+            members = self._cells.get(cell)
+            if members is None:
+                members = self._cells[cell] = set()
+            members.add(driver_id)
+        self._positions[driver_id] = (latitude, longitude, recorded_at, cell)
+        return True
+
+    def update(self, driver_id, latitude, longitude, recorded_at=None):
+        """Record a position (epoch seconds); older points than the stored one are ignored."""
+        with self._lock:
+            applied = self._put(
+                driver_id, latitude, longitude, time.time() if recorded_at is None else recorded_at
+            )
+        self._maybe_sweep()
+        return applied
+
+    def update_many(self, points):
+        """update() for an iterable of (driver_id, latitude, longitude, recorded_at)."""
+        put = self._put
+        with self._lock:
+            applied = sum(put(*point) for point in points)
+        self._maybe_sweep()
+        return applied
+
+    def get(self, driver_id):
+        position = self._positions.get(driver_id)
+        if position is None or position[2] < time.time() - self.ttl:
+            return None
+        return position[:3]
+
+    def live_driver_ids(self, now=None):
+        """Drivers whose latest position is within the TTL."""
+        fresh_after = (now or time.time()) - self.ttl
+        with self._lock:
+            return [d for d, p in self._positions.items() if p[2] >= fresh_after]
+
+    def remove(self, driver_id):
+        with self._lock:
+            position = self._positions.pop(driver_id, None)
+            if position is not None:
+                members = self._cells[position[3]]
+                members.discard(driver_id)
+                if not members:
+                    del self._cells[position[3]]
+
+    def sweep(self, now=None):
+        """Drop positions older than the TTL; returns how many were dropped."""
+        expired_before = (now or time.time()) - self.ttl
+        with self._lock:
+            expired = [d for d, p in self._positions.items() if p[2] < expired_before]
+        for driver_id in expired:
+            self.remove(driver_id)
+        self._swept_at = time.monotonic()
+        return len(expired)
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._swept_at > self.ttl / 4:
+            self.sweep()
+
+    def clear(self):
+        with self._lock:
+            self._positions.clear()
+            self._cells.clear()
+        self._synced_at = None
+        self._synced_pk = 0
+
+    def nearest(self, latitude, longitude, k=5, radius_km=None, drivers=None, now=None):
+        """
+        Up to `k` NearbyDriver, closest first, within `radius_km`. `drivers`
+        restricts the search to those ids (checked directly, no grid scan).
+        """
+        if radius_km is None:
+            radius_km = settings.DRIVER_SEARCH_RADIUS_KM
+        fresh_after = (now or time.time()) - self.ttl
+        # Candidates are ranked by equirectangular distance (exact enough at
+        # city scale and much cheaper); only the k winners get haversine.
+        ky = KM_PER_DEGREE
+        kx = KM_PER_DEGREE * math.cos(math.radians(latitude))
+        max_d2 = (radius_km * 1.01) ** 2
+        found = []
+
+        def consider(driver_id):
+            lat, lon, recorded_at, _ = positions[driver_id]
+            if recorded_at >= fresh_after:
+                d2 = ((lat - latitude) * ky) ** 2 + ((lon - longitude) * kx) ** 2
+                if d2 <= max_d2:
+                    found.append((d2, driver_id, lat, lon, recorded_at))
+
+        with self._lock:
+            positions = self._positions
+            if drivers is not None:
+                for driver_id in drivers:
+                    if driver_id in positions:
+                        consider(driver_id)
+            else:
+                # Every point outside the rings searched so far is at least
+                # ring * cell_km away, so stop once the k-th best is closer.
+                # Cells narrow towards the poles: size them at the far edge.
+                edge_lat = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.0)
+                cell_km = self.cell_deg * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+                ci, cj = self._cell(latitude, longitude)
+                cells = self._cells
+                for ring in range(math.ceil(radius_km / cell_km) + 1):
+                    for cell in _ring(ci, cj, ring):
+                        for driver_id in cells.get(cell, ()):
+                            consider(driver_id)
+                    if len(found) >= k:
+                        found = heapq.nsmallest(k, found)
+                        if found[-1][0] <= (ring * cell_km) ** 2:
+                            break
+
+        nearby = []
+        for _, driver_id, lat, lon, recorded_at in heapq.nsmallest(k, found):
+            distance = haversine_km(latitude, longitude, lat, lon)
+            if distance <= radius_km:
+                nearby.append(NearbyDriver(driver_id, distance, lat, lon, recorded_at))
+        return nearby
+
+    def sync_from_db(self, force=False):
+        """Apply points flushed by other processes since the last sync."""
+        interval = settings.DRIVER_LOCATION_FLUSH_INTERVAL
+        started = time.monotonic()
+        if not force and self._synced_at is not None and started - self._synced_at < interval:
+            return 0
+        self._synced_at = started
+
+        if self._synced_pk:
+            new = DriverLocation.objects.filter(pk__gt=self._synced_pk)
+        else:
+            new = DriverLocation.objects.filter(
+                recorded_at__gte=timezone.now() - timedelta(seconds=self.ttl)
+            )
+        # Only the newest new point per driver matters.
+        latest = new.values("driver").annotate(last=Max("pk")).values("last")
+        rows = list(
+            DriverLocation.objects.filter(pk__in=latest).values_list(
+                "pk", "driver_id", "latitude", "longitude", "recorded_at"
+            )
+        )
+        if not rows:
+            return 0
+        self._synced_pk = max(self._synced_pk, max(row[0] for row in rows))
+        return self.update_many(
+            (driver_id, lat, lon, recorded_at.timestamp())
+            for _, driver_id, lat, lon, recorded_at in rows
+        )
+
+
+def _insert_rows(rows):
+    """
+    INSERT rows with executemany(): several times faster than bulk_create(),
+    which builds a model instance per point and splits inserts by SQLite's
+    variable limit.
+    """
+    alias = router.db_for_write(DriverLocation)
+    connection = connections[alias]
+    meta = DriverLocation._meta
+    columns = [meta.get_field(name).column for name in INSERT_FIELDS]
+    sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+        connection.ops.quote_name(meta.db_table),
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        cursor.executemany(
+            sql,
+            [(driver_id, lat, lon, adapt(recorded_at)) for driver_id, lat, lon, recorded_at in rows],
+        )
+
+
+def prune(retention=None, batch_size=None):
+    """
+    Delete DriverLocation rows recorded more than `retention` seconds ago
+    (never less than DRIVER_LOCATION_TTL), one batch per transaction;
+    returns how many.
+    """
+    retention = max(retention or settings.DRIVER_LOCATION_RETENTION, settings.DRIVER_LOCATION_TTL)
+    batch_size = batch_size or settings.DRIVER_LOCATION_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    old = DriverLocation.objects.filter(recorded_at__lt=cutoff).order_by()
+    pruned = 0
+    while True:
+        deleted, _ = DriverLocation.objects.filter(pk__in=old.values("pk")[:batch_size]).delete()
+        pruned += deleted
+        if deleted < batch_size:
+            break
+    _record(points_pruned=pruned)
+    return pruned
+
+
+class LocationWriter:
+    """
+    Buffers DriverLocation rows and bulk-inserts them from a background
+    thread, which also prunes old rows.
+    """
+
+    def __init__(self):
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pruned_at = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add_many(self, rows):
+        """Queue (driver_id, latitude, longitude, recorded_at) rows."""
+        with self._lock:
+            self._buffer.extend(rows)
+            overflow = len(self._buffer) - settings.DRIVER_LOCATION_BUFFER_MAX
+            for _ in range(overflow):
+                self._buffer.popleft()
+            pending = len(self._buffer)
+        if overflow > 0:
+            _record(points_dropped=overflow)
+            logger.warning("Driver location buffer full; dropped %s points", overflow)
+
+        if not settings.DRIVER_LOCATION_FLUSH_INTERVAL:
+            self.flush()
+            self.maybe_prune()
+            return
+        self._ensure_thread()
+        if pending >= settings.DRIVER_LOCATION_BATCH_SIZE:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered; returns the number of rows written."""
+        written = 0
+        batch_size = settings.DRIVER_LOCATION_BATCH_SIZE
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [
+                        self._buffer.popleft()
+                        for _ in range(min(batch_size, len(self._buffer)))
+                    ]
+                if not batch:
+                    return written
+                try:
+                    _insert_rows(batch)
+                except Exception:
+                    # Put the batch back in order and let the next flush retry.
+                    with self._lock:
+                        self._buffer.extendleft(reversed(batch))
+                    _record(flush_errors=1)
+                    raise
+                written += len(batch)
+                _record(points_flushed=len(batch))
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="driver-location-writer", daemon=True
+            )
+            self._thread.start()
+
+    def maybe_prune(self):
+        """prune() if DRIVER_LOCATION_PRUNE_INTERVAL has passed since the last one."""
+        now = time.monotonic()
+        interval = settings.DRIVER_LOCATION_PRUNE_INTERVAL
+        if self._pruned_at is not None and now - self._pruned_at < interval:
+            return 0
+        self._pruned_at = now
+        return prune()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.DRIVER_LOCATION_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not write driver locations; will retry")
+                continue
+            try:
+                self.maybe_prune()
+            except Exception:
+                logger.exception("Could not prune driver locations")
+
+
+grid = DriverGrid()
+writer = LocationWriter()
+
+
+def ingest(driver_id, points):
+    """
+    Accept a driver's (latitude, longitude, recorded_at) points: the newest
+    one updates the grid, all of them are queued for persistence. Missing
+    timestamps default to now and future ones are clamped to it.
+    """
+    now = timezone.now()
+    rows = [(driver_id, lat, lon, min(recorded_at or now, now)) for lat, lon, recorded_at in points]
+    _record(points_received=len(rows))
+    # Newest fix wins; among equal timestamps, the last one in the batch.
+    _, lat, lon, recorded_at = max(reversed(rows), key=lambda row: row[3])
+    grid.update(driver_id, lat, lon, recorded_at.timestamp())
+    writer.add_many(rows)
+    return len(rows)
+
+
+def busy_driver_ids(driver_ids):
+    """The subset of `driver_ids` currently on an in-progress trip."""
+    busy = set()
+    for alias in trip_shard_aliases():
+        busy.update(
+            Trip.objects.using(alias)
+            .filter(status="in_progress", driver_id__in=driver_ids)
+            .values_list("driver_id", flat=True)
+        )
+    return busy
+
+
+def nearest_available_drivers(location, k=5, radius_km=None, drivers=None):
+    """Closest free drivers to `location` (a Location with coordinates)."""
+    if location.latitude is None or location.longitude is None:
+        return []
+    grid.sync_from_db()
+    want = k
+    while True:
+        found = grid.nearest(location.latitude, location.longitude, want, radius_km, drivers)
+        busy = busy_driver_ids([d.driver_id for d in found]) if found else set()
+        available = [d for d in found if d.driver_id not in busy]
+        if len(available) >= k or len(found) < want:
+            return available[:k]
+        want *= 2
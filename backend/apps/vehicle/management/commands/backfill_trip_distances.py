@@ -0,0 +1,49 @@
+import math
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from apps.vehicle.distances import matrix
+from apps.vehicle.models import Route, Trip
+from apps.vehicle.sharding import trip_shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill Trip.distance_km from the location distance matrix for trips "
+        "booked without one (or every trip with --all)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Recompute trips that already have a distance."
+        )
+
+    def handle(self, *args, **options):
+        # Rebuilds the matrix if due; with DISTANCE_MATRIX_PATH every worker
+        # picks the new snapshot up.
+        matrix.refresh()
+        # Distances depend only on the route, so each shard gets one UPDATE
+        # per route rather than one per trip.
+        routes = list(
+            Route.objects.using(DEFAULT_DB_ALIAS).values_list("pk", "pickup_id", "drop_id")
+        )
+        pks, pickups, drops = zip(*routes) if routes else ((), (), ())
+        km = dict(zip(pks, matrix.distances(pickups, drops).tolist()))
+
+        total = 0
+        for alias in trip_shard_aliases():
+            trips = Trip.objects.using(alias)
+            if not options["all"]:
+                trips = trips.filter(distance_km=0)
+            pending = trips.order_by().values_list("route_id", flat=True).distinct()
+            updated = 0
+            with transaction.atomic(using=alias):
+                for route_id in list(pending):
+                    distance = km.get(route_id)
+                    if distance is None or math.isnan(distance):
+                        continue
+                    updated += trips.filter(route_id=route_id).update(distance_km=distance)
+            self.stdout.write(f"{alias}: {updated} trips")
+            total += updated
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} trips."))
@@ -0,0 +1,76 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.vehicle import distances
+from apps.vehicle.booking import BookingWriter
+from apps.vehicle.models import Location, Route, Trip
+
+
+class Command(BaseCommand):
+    help = (
+        "Booking ingestion: bookings per second with one commit per booking "
+        "against the group-commit writer, at several client counts. Writes "
+        "to the configured database and deletes its rows afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=2_000, help="Bookings per run.")
+        parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        passenger = get_user_model().objects.create_user(
+            "Bench", "Passenger", f"bench-{tag}@example.com", "x"
+        )
+        pickup = Location.objects.create(name=f"bench-{tag}-a", latitude=34.5553, longitude=69.2075)
+        drop = Location.objects.create(name=f"bench-{tag}-b", latitude=34.3529, longitude=62.2040)
+        route = Route.objects.create(pickup=pickup, drop=drop, price_af=500)
+        distances.matrix.refresh()
+        try:
+            self.stdout.write(f"{options['bookings']} bookings per run")
+            for clients in options["clients"]:
+                for name, book in self.modes():
+                    rate = self.run(book, passenger, route, clients, options["bookings"])
+                    self.stdout.write(f"  {clients:>3} clients  {name:<18} {rate:10,.0f} bookings/s")
+        finally:
+            Trip.objects.filter(route=route).delete()
+            route.delete()
+            pickup.delete()
+            drop.delete()
+            passenger.delete()
+
+    def modes(self):
+        writer = BookingWriter()
+        return (
+            ("commit per booking", lambda trip: trip.save()),
+            ("group commit", writer.save),
+        )
+
+    def run(self, book, passenger, route, clients, total):
+        per_client = total // clients
+        errors = []
+
+        def client():
+            try:
+                for _ in range(per_client):
+                    book(Trip(passenger=passenger, route=route, fare=route.price_af))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            self.stderr.write(f"  {len(errors)} clients failed: {errors[0]!r}")
+        return per_client * (clients - len(errors)) / elapsed
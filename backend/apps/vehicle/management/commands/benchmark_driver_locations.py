@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.vehicle.locations import DriverGrid
+
+# Greater Kabul, roughly 40 x 40 km.
+BOUNDS = (34.35, 34.70, 68.95, 69.40)
+
+
+class Command(BaseCommand):
+    help = (
+        "Driver location grid: position updates per second (single and "
+        "batched) and k-nearest query latency at a given fleet size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=10_000)
+        parser.add_argument("--updates", type=int, default=500_000)
+        parser.add_argument("--queries", type=int, default=2_000)
+        parser.add_argument("--batch", type=int, default=500)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        lat_min, lat_max, lon_min, lon_max = BOUNDS
+        drivers, updates = options["drivers"], options["updates"]
+        now = time.time()
+        points = [
+            (
+                rng.randrange(drivers),
+                rng.uniform(lat_min, lat_max),
+                rng.uniform(lon_min, lon_max),
+                now + i * 1e-6,
+            )
+            for i in range(updates)
+        ]
+
+        grid = DriverGrid(ttl=3600)
+        started = time.perf_counter()
+        for point in points:
+            grid.update(*point)
+        single = updates / (time.perf_counter() - started)
+
+        grid = DriverGrid(ttl=3600)
+        batch = options["batch"]
+        started = time.perf_counter()
+        for i in range(0, updates, batch):
+            grid.update_many(points[i:i + batch])
+        batched = updates / (time.perf_counter() - started)
+
+        self.stdout.write(f"{drivers} drivers, {updates} updates")
+        self.stdout.write(f"  update()            {single:12,.0f} updates/s")
+        self.stdout.write(f"  update_many({batch})   {batched:12,.0f} updates/s")
+
+        for k in (1, 5, 20):
+            latencies = []
+            for _ in range(options["queries"]):
+                lat, lon = rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max)
+                started = time.perf_counter()
+                grid.nearest(lat, lon, k=k)
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1e6
+            p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+            self.stdout.write(f"  nearest k={k:<3}       p50 {p50:8.1f} us  p99 {p99:8.1f} us")
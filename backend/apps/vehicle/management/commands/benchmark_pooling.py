@@ -0,0 +1,69 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+from apps.vehicle.models import Vehicle
+from apps.vehicle.pooling import PoolingEngine
+
+
+class Command(BaseCommand):
+    help = (
+        "Ride pooling: packing every open trip into bundles from scratch, "
+        "then the per-booking cost of pooling incrementally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trips", type=int, default=100_000)
+        parser.add_argument("--routes", type=int, default=500)
+        parser.add_argument("--hours", type=int, default=24, help="Span of the trips' start times.")
+        parser.add_argument("--bookings", type=int, default=10_000, help="Incremental bookings.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        types = [t for t, _ in Vehicle.VEHICLE_TYPE_CHOICES]
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        span = options["hours"] * 3600
+
+        def rows(count, first_pk):
+            for pk in range(first_pk, first_pk + count):
+                yield (
+                    pk,
+                    rng.randrange(options["routes"]),
+                    rng.choice(["", "", "", *types]),
+                    rng.choice([1, 1, 1, 2, 2, 3, 4]),
+                    None,
+                    start + timedelta(seconds=rng.uniform(0, span)),
+                )
+
+        trips = list(rows(options["trips"], 1))
+        engine = PoolingEngine()
+        started = time.perf_counter()
+        engine.add(trips)
+        build = time.perf_counter() - started
+
+        bundles = {engine.bundle_of(pk) for pk, *_ in trips}
+        pooled = sum(1 for bundle in bundles if len(bundle) > 1)
+        seats = {pk: passengers for pk, _, _, passengers, _, _ in trips}
+        occupancy = sum(sum(seats[pk] for pk in bundle) for bundle in bundles) / len(bundles)
+
+        latencies = []
+        for row in rows(options["bookings"], options["trips"] + 1):
+            started = time.perf_counter()
+            engine.add([row])
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+
+        self.stdout.write(
+            f"{options['trips']} open trips, {options['routes']} routes over {options['hours']} h"
+        )
+        self.stdout.write(f"  full pack           {build * 1e3:8.1f} ms  ({len(trips) / build:,.0f} trips/s)")
+        self.stdout.write(
+            f"  bundles             {len(bundles):8,d}  ({pooled:,d} pooled, "
+            f"{occupancy:.2f} passengers/vehicle vs "
+            f"{sum(seats.values()) / len(trips):.2f} unpooled)"
+        )
+        self.stdout.write(f"  incremental add     p50 {p50:7.1f} us  p99 {p99:7.1f} us")
@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.vehicle.pricing import SurgeEngine
+
+
+class Command(BaseCommand):
+    help = (
+        "Surge pricing: cost of one tick (driver sample, bookings, "
+        "vectorised recompute) across all routes, and per-quote latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--routes", type=int, default=5_000)
+        parser.add_argument("--drivers", type=int, default=20_000)
+        parser.add_argument("--routes-per-driver", type=int, default=3)
+        parser.add_argument("--bookings", type=int, default=2_000, help="Bookings per tick.")
+        parser.add_argument("--quotes", type=int, default=200_000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        routes, drivers = options["routes"], options["drivers"]
+        route_ids = list(range(1, routes + 1))
+        pairs = [
+            (rng.choice(route_ids), driver_id)
+            for driver_id in range(1, drivers + 1)
+            for _ in range(options["routes_per_driver"])
+        ]
+        engine = SurgeEngine(autotick=False)
+
+        started = time.perf_counter()
+        engine.set_routes(route_ids, [500] * routes, pairs)
+        install = time.perf_counter() - started
+
+        ticks = 50
+        sample = record = recompute = 0.0
+        for tick in range(ticks):
+            available = rng.sample(range(1, drivers + 1), drivers // 2)
+            booked = [rng.choice(route_ids) for _ in range(options["bookings"])]
+            now = tick * 5.0
+            started = time.perf_counter()
+            engine.sample_drivers(available, now=now)
+            sample += time.perf_counter() - started
+            started = time.perf_counter()
+            engine.record_requests(booked, now=now)
+            record += time.perf_counter() - started
+            started = time.perf_counter()
+            engine.recompute()
+            recompute += time.perf_counter() - started
+
+        latencies = []
+        for _ in range(options["quotes"]):
+            route_id = rng.choice(route_ids)
+            started = time.perf_counter()
+            engine.quote(route_id)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+
+        self.stdout.write(f"{routes} routes, {len(pairs)} route/driver pairs")
+        self.stdout.write(f"  set_routes          {install * 1e3:10.2f} ms")
+        self.stdout.write(f"  sample_drivers      {sample / ticks * 1e3:10.2f} ms/tick")
+        self.stdout.write(f"  record_requests     {record / ticks * 1e3:10.2f} ms/tick")
+        self.stdout.write(f"  recompute           {recompute / ticks * 1e3:10.2f} ms/tick")
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        self.stdout.write(f"  quote               p50 {p50:6.2f} us  p99 {p99:6.2f} us")
@@ -0,0 +1,120 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.vehicle.eligibility import EligibilityIndex
+from apps.vehicle.models import Location, Route, Trip, Vehicle
+from apps.vehicle.sharding import shards_for_regions
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Driver trip board: the previous route-join query against the "
+        "eligibility index, on synthetic data that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--routes", type=int, default=200)
+        parser.add_argument("--drivers", type=int, default=500)
+        parser.add_argument("--routes-per-driver", type=int, default=5)
+        parser.add_argument("--trips", type=int, default=20_000)
+        parser.add_argument("--requests", type=int, default=300)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(42)
+        User = get_user_model()
+        types = [t for t, _ in Vehicle.VEHICLE_TYPE_CHOICES]
+
+        locations = Location.objects.bulk_create(
+            Location(name=f"bench-{i}", region=f"region-{i % 4}") for i in range(options["routes"] + 1)
+        )
+        routes = Route.objects.bulk_create(
+            Route(pickup=locations[i], drop=locations[i + 1], price_af=500)
+            for i in range(options["routes"])
+        )
+        drivers = User.objects.bulk_create(
+            User(
+                first_name="Bench", last_name=str(i), email=f"bench-driver-{i}@example.com",
+                username=f"bench-driver-{i}", role=User.Role.DRIVER,
+            )
+            for i in range(options["drivers"])
+        )
+        passenger = User.objects.create_user("Bench", "Passenger", "bench-passenger@example.com", "x")
+        Vehicle.objects.bulk_create(
+            Vehicle(
+                driver=driver, model="Bench", plate_number=f"BENCH-{driver.pk}",
+                type=rng.choice(types), license="license/bench.jpg",
+            )
+            for driver in drivers
+        )
+        Route.drivers.through.objects.bulk_create(
+            Route.drivers.through(route_id=route.pk, user_id=driver.pk)
+            for driver in drivers
+            for route in rng.sample(routes, options["routes_per_driver"])
+        )
+        # bulk_create skips Trip.save(), which would look these up per row.
+        Trip.objects.bulk_create(
+            Trip(
+                passenger=passenger, route=route, region=route.pickup.region,
+                passenger_count=rng.choice([1, 1, 2, 3, 4, 5, 6, 7]),
+                vehicle_type=rng.choice(["", "", "", *types]),
+            )
+            for route in (rng.choice(routes) for _ in range(options["trips"]))
+        )
+
+        def previous(driver):
+            driver_routes = list(driver.available_routes.select_related("pickup"))
+            return Trip.objects.filter(
+                status="requested",
+                driver__isnull=True,
+                route_id__in=[route.pk for route in driver_routes],
+            ).select_related("route__pickup", "route__drop", "passenger").order_by(
+                "request_time"
+            ).scatter(aliases=shards_for_regions(route.pickup.region for route in driver_routes))
+
+        index = EligibilityIndex()
+        started = time.perf_counter()
+        index.refresh(force=True)
+        build = time.perf_counter() - started
+
+        def indexed(driver):
+            fitting, aliases = index.board(driver.pk)
+            return Trip.objects.filter(
+                fitting, status="requested", driver__isnull=True
+            ).select_related("route__pickup", "route__drop", "passenger").order_by(
+                "request_time"
+            ).scatter(aliases=aliases)
+
+        sample = [rng.choice(drivers) for _ in range(options["requests"])]
+        self.stdout.write(
+            f"{options['routes']} routes, {options['drivers']} drivers, {options['trips']} open trips"
+        )
+        self.stdout.write(f"  index build         {build * 1e3:8.1f} ms")
+        for name, board in (("previous query", previous), ("eligibility index", indexed)):
+            latencies, rows = [], 0
+            for driver in sample:
+                started = time.perf_counter()
+                rows += len(board(driver))
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1e3
+            p99 = latencies[int(len(latencies) * 0.99)] * 1e3
+            self.stdout.write(
+                f"  {name:<19} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  "
+                f"{rows / len(sample):7.1f} trips/board"
+            )
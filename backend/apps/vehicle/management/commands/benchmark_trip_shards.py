@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _writer(paths, pragmas, deadline, results, seed):
+    # Separate processes, so SQLite's write lock is the bottleneck, not the GIL.
+    rng = random.Random(seed)
+    connections = []
+    for path in paths:
+        db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        for pragma, value in pragmas.items():
+            db.execute(f"PRAGMA {pragma} = {value}")
+        connections.append(db)
+    writes = errors = 0
+    while time.perf_counter() < deadline:
+        # Each booking lands on the shard of its (uniformly random) region.
+        db = rng.choice(connections)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT INTO trip (route_id, status, fare) VALUES (?, 'requested', ?)",
+                [rng.randint(1, 50), rng.randint(100, 900)],
+            )
+            db.execute("COMMIT")
+            writes += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+    for db in connections:
+        db.close()
+    results.put((writes, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent trip-insert throughput on one SQLite database versus the "
+        "same load spread over N region shards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, default=4)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+
+    def handle(self, *args, **options):
+        for shards in (1, options["shards"]):
+            with tempfile.TemporaryDirectory() as tmp:
+                paths = [os.path.join(tmp, f"shard{i}.sqlite3") for i in range(shards)]
+                for path in paths:
+                    db = sqlite3.connect(path)
+                    db.execute(
+                        "CREATE TABLE trip (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "route_id INTEGER, status TEXT, fare INTEGER)"
+                    )
+                    db.execute("CREATE INDEX trip_route ON trip (route_id)")
+                    db.commit()
+                    db.close()
+
+                results = multiprocessing.Queue()
+                deadline = time.perf_counter() + options["seconds"]
+                workers = [
+                    multiprocessing.Process(
+                        target=_writer,
+                        args=(paths, dict(settings.SQLITE_PRAGMAS), deadline, results, i),
+                    )
+                    for i in range(options["workers"])
+                ]
+                for worker in workers:
+                    worker.start()
+                counts = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+
+                writes, errors = (sum(column) for column in zip(*counts))
+                self.stdout.write(
+                    f"{shards} shard(s)  writes/s {writes / options['seconds']:8.0f}  "
+                    f"lock errors {errors}"
+                )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.vehicle.expiry import sweep
+
+
+class Command(BaseCommand):
+    help = "Cancel trip requests no driver answered within TRIP_EXPIRY_MINUTES and notify their passengers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, help="Override TRIP_EXPIRY_MINUTES.")
+        parser.add_argument("--batch-size", type=int, help="Override TRIP_EXPIRY_BATCH_SIZE.")
+        parser.add_argument("--no-notify", action="store_true", help="Do not email passengers.")
+
+    def handle(self, *args, **options):
+        expired = sweep(
+            max_age_minutes=options["minutes"],
+            batch_size=options["batch_size"],
+            notify=not options["no_notify"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} trip requests."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.vehicle.locations import prune
+
+
+class Command(BaseCommand):
+    help = "Delete driver location points older than DRIVER_LOCATION_RETENTION."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=int, help="Override DRIVER_LOCATION_RETENTION.")
+        parser.add_argument("--batch-size", type=int, help="Override DRIVER_LOCATION_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        pruned = prune(retention=options["seconds"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} driver location points."))
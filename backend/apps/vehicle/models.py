@@ -1,8 +1,12 @@
+from apps.common.images import HashedImageStorage, validate_upload_size
 from apps.common.models import TimeStampedModel
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from .sharding import TripManager
+
 User = get_user_model()
 
 
@@ -20,6 +24,8 @@ class Vehicle(TimeStampedModel):
         (VAN, "Van"),
         (ELECTRIC, "Electric"),
     ]
+    # Passenger seats by type; trips with more passengers are not offered.
+    SEAT_CAPACITY = {LUXURY: 4, ECONOMY: 4, SUV: 6, VAN: 8, ELECTRIC: 4}
 
     driver = models.ForeignKey(
         User,
@@ -29,7 +35,11 @@ class Vehicle(TimeStampedModel):
     )
     model = models.CharField(max_length=200)
     plate_number = models.CharField(max_length=20, unique=True)
-    license = models.ImageField(upload_to="license/")
+    license = models.ImageField(
+        upload_to="license/",
+        storage=HashedImageStorage(),
+        validators=[validate_upload_size],
+    )
     type = models.CharField(max_length=20, choices=VEHICLE_TYPE_CHOICES)
 
     def __str__(self):
@@ -43,6 +53,18 @@ class Vehicle(TimeStampedModel):
 
 class Location(TimeStampedModel):
     name = models.CharField(max_length=255, unique=True)
+    # Trips picked up here are stored in the shard mapped to this region
+    # (settings.TRIP_SHARDS).
+    region = models.CharField(max_length=50, blank=True, default="", db_index=True)
+    # WGS84 coordinates; used to find drivers near a pickup point.
+    latitude = models.FloatField(
+        null=True, blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    longitude = models.FloatField(
+        null=True, blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
 
     def __str__(self):
         return self.name
@@ -66,6 +88,9 @@ class Route(TimeStampedModel):
     vehicles = models.ManyToManyField(
         Vehicle, blank=True, related_name="available_routes"
     )
+    # Median and 90th percentile trip duration, from RouteDurationSketch.
+    eta_p50_minutes = models.FloatField(null=True, blank=True, editable=False)
+    eta_p90_minutes = models.FloatField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Route"
@@ -158,9 +183,15 @@ class Trip(TimeStampedModel):
 
     distance_km = models.FloatField(default=0)
     fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Surge multiplier applied to the route price when the trip was booked.
+    surge_multiplier = models.DecimalField(max_digits=4, decimal_places=2, default=1)
 
     # --- NEW FIELDS TO STORE MORE DETAILS ---
     passenger_count = models.PositiveSmallIntegerField(default=1)
+    # Requested vehicle type; blank takes any vehicle with enough seats.
+    vehicle_type = models.CharField(
+        max_length=20, choices=Vehicle.VEHICLE_TYPE_CHOICES, blank=True, default=""
+    )
     notes_for_driver = models.TextField(blank=True)
     scheduled_for = models.DateTimeField(null=True, blank=True, help_text="If not null, the trip is scheduled for a future time.")
     # --- END OF NEW FIELDS ---
@@ -177,10 +208,81 @@ class Trip(TimeStampedModel):
     request_time = models.DateTimeField(auto_now_add=True)
     start_time = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    # Pickup region, copied from the route on creation; selects the shard.
+    region = models.CharField(max_length=50, blank=True, default="", editable=False)
+    # Shared by the trips of a pooled bundle a driver accepted together.
+    pool_id = models.UUIDField(null=True, blank=True, editable=False)
+
+    objects = TripManager()
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            # Open requests, oldest first: the trip board and the expiry sweep.
+            models.Index(fields=["status", "request_time"], name="trip_status_request_time_idx"),
+        ]
 
     def __str__(self):
         return f"Trip {self.id} by {self.passenger.get_full_name}"
 
+    def clean(self):
+        super().clean()
+        if self.driver_id and self.status not in ("completed", "cancelled"):
+            from .availability import calendar
+
+            if calendar.conflicts(self.driver_id, self):
+                raise ValidationError({"driver": "The driver has another trip at this time."})
+
+    def populate_from_route(self):
+        """Copy the pickup region and route distance; bulk inserts call this instead of save()."""
+        if not self.route_id:
+            return
+        if not self.region:
+            self.region = self.route.pickup.region
+        if not self.distance_km:
+            from .distances import route_distance_km
+
+            self.distance_km = route_distance_km(self.route) or 0
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.populate_from_route()
+        super().save(*args, **kwargs)
+
+
+class DriverLocation(models.Model):
+    """
+    One GPS point reported by a driver. Rows are written behind in batches by
+    apps.vehicle.locations; the latest point per driver lives in memory.
+    """
+
+    driver = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="locations"
+    )
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.driver_id} @ {self.latitude:.5f},{self.longitude:.5f}"
+
+
+class RouteDurationSketch(models.Model):
+    """
+    Streaming quantile sketch of a route's completed trip durations in
+    minutes, maintained by apps.vehicle.eta.
+    """
+
+    route = models.OneToOneField(
+        Route, on_delete=models.CASCADE, primary_key=True, related_name="duration_sketch"
+    )
+    trips = models.PositiveIntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Durations of route {self.route_id} ({self.trips} trips)"
+
+
 class DriverApplication(TimeStampedModel):
     class Status(models.TextChoices):
         PENDING = "pending", "Pending"
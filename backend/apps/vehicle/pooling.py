@@ -0,0 +1,231 @@
+"""
+Ride pooling.
+
+Open trips (requested, no driver) are grouped by route, requested vehicle
+type and POOL_WINDOW_MINUTES window of their start (scheduled_for, else
+request_time). Each group is packed into vehicle-sized bundles with first
+fit decreasing: largest passenger_count first, each trip into the first
+bundle with seats left. The seats are those of the requested vehicle type,
+or POOL_DEFAULT_SEATS for trips that take any vehicle.
+
+`engine` keeps the groups in memory. sync() tails every trip shard past the
+last pk it has seen, as the surge engine does, and repacks only the groups
+that received trips. So bookings are pooled as they arrive, whichever
+process or the group-commit writer inserted them. Every
+POOL_RELOAD_SECONDS it reloads all open trips, dropping those taken or
+cancelled meanwhile. Callers that close trips can discard() them at once.
+
+The driver board offers a bundle only when the driver sees all of its trips
+and has a vehicle that seats them all together. Passengers split one fare
+for the vehicle, the largest member fare times POOL_FARE_FACTOR, by
+passenger_count. No passenger pays more than their own fare.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.db.models import Max
+
+from .eligibility import fits
+from .models import Trip, Vehicle
+from .sharding import trip_shard_aliases
+
+OPEN_FIELDS = ("pk", "route_id", "vehicle_type", "passenger_count", "scheduled_for", "request_time")
+CENT = Decimal("0.01")
+
+
+def seats_for(vehicle_type, default=None):
+    if vehicle_type:
+        return Vehicle.SEAT_CAPACITY[vehicle_type]
+    return settings.POOL_DEFAULT_SEATS if default is None else default
+
+
+def pool_key(route_id, vehicle_type, start, window=None):
+    """The group of a trip starting at `start` (a datetime)."""
+    window = window or settings.POOL_WINDOW_MINUTES * 60
+    return route_id, vehicle_type, int(start.timestamp() // window)
+
+
+def pack(items, seats):
+    """
+    First fit decreasing. `items` are (pk, passengers); returns tuples of pks
+    whose passengers fit `seats`. A trip larger than `seats` rides alone.
+    """
+    bins = []  # [seats left, [pks]]
+    for pk, passengers in sorted(items, key=lambda item: (-item[1], item[0])):
+        for entry in bins:
+            if entry[0] >= passengers:
+                entry[0] -= passengers
+                entry[1].append(pk)
+                break
+        else:
+            bins.append([seats - passengers, [pk]])
+    return [tuple(pks) for _, pks in bins]
+
+
+def split_fares(fares, passengers):
+    """
+    Each member's share of the bundle fare, max(fares) * POOL_FARE_FACTOR
+    (at most the sum of the fares), split by passengers. A member whose
+    share would exceed their own fare pays that fare and the rest is split
+    among the others. Shares are rounded down to the cent.
+    """
+    if len(fares) == 1:
+        return list(fares)
+    factor = Decimal(str(settings.POOL_FARE_FACTOR))
+    remaining = min(sum(fares), max(fares) * factor)
+    shares = [None] * len(fares)
+    open_ = set(range(len(fares)))
+    while open_:
+        seats = sum(passengers[i] for i in open_)
+        capped = {i for i in open_ if remaining * passengers[i] / seats > fares[i]}
+        if not capped:
+            for i in open_:
+                shares[i] = (remaining * passengers[i] / seats).quantize(CENT, rounding=ROUND_DOWN)
+            break
+        for i in capped:
+            shares[i] = fares[i]
+            remaining -= fares[i]
+        open_ -= capped
+    return shares
+
+
+class Bundle:
+    """Trips offered to a driver as one unit; each trip gets a `fare_share`."""
+
+    def __init__(self, trips):
+        self.trips = sorted(trips, key=lambda trip: trip.request_time)
+        self.passenger_count = sum(trip.passenger_count for trip in self.trips)
+        shares = split_fares(
+            [trip.fare if trip.fare is not None else trip.route.price_af for trip in self.trips],
+            [trip.passenger_count for trip in self.trips],
+        )
+        for trip, share in zip(self.trips, shares):
+            trip.fare_share = share
+        self.fare = sum(shares)
+
+    @property
+    def pooled(self):
+        return len(self.trips) > 1
+
+
+class PoolingEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = defaultdict(dict)  # key -> {pk: passengers}
+        self._key_of = {}  # pk -> key
+        self._bundle_of = {}  # pk -> tuple of pks
+        self._cursors = {}  # shard alias -> last pk seen
+        self._loaded_at = None
+
+    def __len__(self):
+        return len(self._key_of)
+
+    def add(self, rows):
+        """Add open trips given as OPEN_FIELDS tuples; repacks only their groups."""
+        dirty = set()
+        window = settings.POOL_WINDOW_MINUTES * 60
+        with self._lock:
+            for pk, route_id, vehicle_type, passengers, scheduled_for, request_time in rows:
+                if pk in self._key_of:
+                    continue
+                key = pool_key(route_id, vehicle_type, scheduled_for or request_time, window)
+                self._groups[key][pk] = passengers
+                self._key_of[pk] = key
+                dirty.add(key)
+            self._repack(dirty)
+
+    def discard(self, pks):
+        dirty = set()
+        with self._lock:
+            for pk in pks:
+                key = self._key_of.pop(pk, None)
+                if key is None:
+                    continue
+                self._bundle_of.pop(pk, None)
+                del self._groups[key][pk]
+                dirty.add(key)
+            self._repack(dirty)
+
+    def _repack(self, keys):
+        default_seats = settings.POOL_DEFAULT_SEATS
+        for key in keys:
+            members = self._groups.get(key)
+            if not members:
+                self._groups.pop(key, None)
+                continue
+            if len(members) == 1:
+                self._bundle_of.update((pk, (pk,)) for pk in members)
+                continue
+            for pks in pack(members.items(), seats_for(key[1], default_seats)):
+                for pk in pks:
+                    self._bundle_of[pk] = pks
+
+    def bundle_of(self, pk):
+        return self._bundle_of.get(pk, (pk,))
+
+    def reload(self):
+        """Rebuild from every open trip on every shard."""
+        rows, cursors = [], {}
+        for alias in trip_shard_aliases():
+            trips = Trip.objects.using(alias)
+            cursors[alias] = trips.aggregate(last=Max("pk"))["last"] or 0
+            rows.extend(
+                trips.filter(status="requested", driver__isnull=True, pk__lte=cursors[alias])
+                .values_list(*OPEN_FIELDS)
+            )
+        with self._lock:
+            self._groups, self._key_of, self._bundle_of = defaultdict(dict), {}, {}
+            self._cursors = cursors
+            self._loaded_at = time.monotonic()
+        self.add(rows)
+
+    def sync(self):
+        """Pool trips booked since the last call, or reload when due."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > settings.POOL_RELOAD_SECONDS:
+            self.reload()
+            return
+        rows = []
+        for alias in trip_shard_aliases():
+            cursor = self._cursors.get(alias, 0)
+            new = list(
+                Trip.objects.using(alias)
+                .filter(pk__gt=cursor)
+                .values_list(*OPEN_FIELDS, "status", "driver_id")
+            )
+            if new:
+                self._cursors[alias] = max(row[0] for row in new)
+            rows.extend(row[:-2] for row in new if row[-2] == "requested" and row[-1] is None)
+        self.add(rows)
+
+    def bundles_for(self, trips, vehicle_types):
+        """
+        Arrange a driver's board `trips` into Bundles. A bundle whose members
+        are not all on the board, or that no vehicle of `vehicle_types`
+        seats, is offered trip by trip.
+        """
+        by_pk = {trip.pk: trip for trip in trips}
+        units, seen = [], set()
+        for trip in trips:
+            if trip.pk in seen:
+                continue
+            members = self.bundle_of(trip.pk)
+            passengers = sum(by_pk[pk].passenger_count for pk in members if pk in by_pk)
+            if all(pk in by_pk for pk in members) and fits(vehicle_types, trip.vehicle_type, passengers):
+                group = [by_pk[pk] for pk in members]
+            else:
+                group = [trip]
+            seen.update(member.pk for member in group)
+            units.append(Bundle(group))
+        return units
+
+    def clear(self):
+        with self._lock:
+            self._groups, self._key_of, self._bundle_of = defaultdict(dict), {}, {}
+            self._cursors, self._loaded_at = {}, None
+
+
+engine = PoolingEngine()
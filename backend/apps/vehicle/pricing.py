@@ -0,0 +1,245 @@
+"""
+Demand-responsive (surge) pricing per Route.
+
+`engine` keeps two sliding windows per route in memory, as ring buffers of
+settings.SURGE_BUCKET_SECONDS buckets spanning settings.SURGE_WINDOW_SECONDS:
+
+- requests: trips booked on the route, tailed from every trip shard by pk,
+  so bookings made by other workers count too;
+- drivers: samples of the route's drivers that have a live position in
+  locations.grid and are not on an in-progress trip.
+
+Every tick (settings.SURGE_TICK_SECONDS, on a background thread) the
+multiplier of every route is recomputed at once with NumPy from requests
+per available driver over the window, bounded to
+[1, SURGE_MAX_MULTIPLIER], moved at most SURGE_MAX_STEP per tick and
+rounded to SURGE_ROUNDING. Quotes and bookings only read the multiplier:
+one dict lookup. They price it against the route's price_af as read with
+the route itself, so a quote and the booking that follows charge the same
+base fare in every worker. The route set reloads on Route version bumps
+and at least every settings.MODEL_INDEX_MAX_AGE seconds.
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.common.cache import model_versions
+
+from . import locations
+from .models import Route, Trip
+from .sharding import trip_shard_aliases
+
+logger = logging.getLogger(__name__)
+
+ROUTE_LABEL = "vehicle.Route"
+CENTS = Decimal("0.01")
+
+
+def surged_fare(base_fare, multiplier):
+    return (Decimal(base_fare) * Decimal(str(multiplier))).quantize(CENTS, ROUND_HALF_UP)
+
+
+class SurgeEngine:
+    """Sliding-window demand and supply per route, and the multipliers derived from them."""
+
+    def __init__(self, window=None, bucket=None, autotick=True):
+        self.bucket = bucket or settings.SURGE_BUCKET_SECONDS
+        self.slots = max(1, math.ceil((window or settings.SURGE_WINDOW_SECONDS) / self.bucket))
+        self.autotick = autotick  # False: only explicit tick() calls update the windows
+        self._lock = threading.Lock()
+        self._route_ids = np.zeros(0, dtype=np.int64)
+        self._columns = {}  # route pk -> column in the windows
+        self._prices = {}  # route pk -> price_af
+        self._pair_columns = np.zeros(0, dtype=np.int64)  # route column of each (route, driver) pair
+        self._pair_drivers = np.zeros(0, dtype=np.int64)  # driver pk of each pair
+        self._requests = np.zeros((self.slots, 0))
+        self._drivers = np.zeros((self.slots, 0))
+        self._sampled = np.zeros(self.slots, dtype=bool)
+        self._slot = 0
+        self._slot_started = None
+        self._current = np.zeros(0)
+        self._multipliers = {}  # route pk -> multiplier, replaced whole each tick
+        self._routes_version = None
+        self._routes_loaded_at = 0.0
+        self._cursors = {}  # trip shard alias -> highest trip pk counted
+        self._thread = None
+
+    # --- reads (per quote) ---
+
+    def multiplier(self, route_id):
+        self._maybe_tick()
+        return self._multipliers.get(route_id, 1.0)
+
+    def quote(self, route_id):
+        """(base fare, multiplier, fare) for a route, or None if it is not known yet."""
+        self._maybe_tick()
+        base = self._prices.get(route_id)
+        if base is None:
+            return None
+        multiplier = self._multipliers.get(route_id, 1.0)
+        return base, multiplier, surged_fare(base, multiplier)
+
+    # --- window maintenance (pure, no database) ---
+
+    def set_routes(self, route_ids, prices, pairs):
+        """
+        Install the route set: parallel `route_ids` and `prices`, and
+        (route_id, driver_id) eligibility `pairs`. Windows of routes that
+        remain are kept.
+        """
+        route_ids = np.asarray(route_ids, dtype=np.int64)
+        columns = {pk: i for i, pk in enumerate(route_ids.tolist())}
+        with self._lock:
+            kept = [(new, self._columns[pk]) for pk, new in columns.items() if pk in self._columns]
+            new_cols, old_cols = (list(c) for c in zip(*kept)) if kept else ([], [])
+            requests = np.zeros((self.slots, len(route_ids)))
+            drivers = np.zeros((self.slots, len(route_ids)))
+            current = np.ones(len(route_ids))
+            requests[:, new_cols] = self._requests[:, old_cols]
+            drivers[:, new_cols] = self._drivers[:, old_cols]
+            current[new_cols] = self._current[old_cols]
+            pairs = [(columns[r], d) for r, d in pairs if r in columns]
+            self._pair_columns = np.array([c for c, _ in pairs], dtype=np.int64)
+            self._pair_drivers = np.array([d for _, d in pairs], dtype=np.int64)
+            self._route_ids, self._columns = route_ids, columns
+            self._requests, self._drivers, self._current = requests, drivers, current
+            self._prices = dict(zip(route_ids.tolist(), prices))
+
+    def _advance(self, now):
+        """Move to the bucket containing `now`, clearing the ones skipped."""
+        if self._slot_started is None:
+            self._slot_started = now
+            return
+        elapsed = int((now - self._slot_started) // self.bucket)
+        if elapsed <= 0:
+            return
+        for step in range(1, min(elapsed, self.slots) + 1):
+            slot = (self._slot + step) % self.slots
+            self._requests[slot] = 0
+            self._drivers[slot] = 0
+            self._sampled[slot] = False
+        self._slot = (self._slot + elapsed) % self.slots
+        self._slot_started += elapsed * self.bucket
+
+    def record_requests(self, route_ids, now=None):
+        """Count one booking for each entry of `route_ids`."""
+        with self._lock:
+            self._advance(time.monotonic() if now is None else now)
+            columns = [self._columns[pk] for pk in route_ids if pk in self._columns]
+            if columns:
+                self._requests[self._slot] += np.bincount(columns, minlength=len(self._route_ids))
+
+    def sample_drivers(self, available_driver_ids, now=None):
+        """Record how many eligible drivers each route has right now."""
+        with self._lock:
+            self._advance(time.monotonic() if now is None else now)
+            available = np.isin(
+                self._pair_drivers, np.asarray(list(available_driver_ids), dtype=np.int64)
+            )
+            # The latest sample in a bucket stands for the bucket.
+            self._drivers[self._slot] = np.bincount(
+                self._pair_columns, weights=available, minlength=len(self._route_ids)
+            )
+            self._sampled[self._slot] = True
+
+    def recompute(self):
+        """Derive every route's multiplier from the windows in one vectorised pass."""
+        with self._lock:
+            demand = self._requests.sum(axis=0)
+            supply = (
+                self._drivers[self._sampled].mean(axis=0)
+                if self._sampled.any() else np.zeros(len(self._route_ids))
+            )
+            ratio = demand / np.maximum(supply, 1)
+            target = np.clip(
+                1 + settings.SURGE_SENSITIVITY * (ratio - settings.SURGE_RATIO_THRESHOLD),
+                1,
+                settings.SURGE_MAX_MULTIPLIER,
+            )
+            step = settings.SURGE_MAX_STEP
+            current = np.clip(target, self._current - step, self._current + step)
+            rounding = settings.SURGE_ROUNDING
+            self._current = np.clip(
+                np.round(current / rounding) * rounding, 1, settings.SURGE_MAX_MULTIPLIER
+            )
+            self._multipliers = dict(zip(self._route_ids.tolist(), self._current.round(2).tolist()))
+
+    # --- ticking (database) ---
+
+    def _sync_routes(self):
+        version = model_versions([ROUTE_LABEL])[ROUTE_LABEL]
+        now = time.monotonic()
+        if version == self._routes_version and now - self._routes_loaded_at < settings.MODEL_INDEX_MAX_AGE:
+            return
+        routes = list(Route.objects.values_list("pk", "price_af"))
+        pairs = Route.drivers.through.objects.values_list("route_id", "user_id")
+        self.set_routes([pk for pk, _ in routes], [price for _, price in routes], pairs)
+        self._routes_version, self._routes_loaded_at = version, now
+
+    def _new_bookings(self):
+        route_ids = []
+        for alias in trip_shard_aliases():
+            trips = Trip.objects.using(alias)
+            cursor = self._cursors.get(alias)
+            if cursor is None:
+                # First tick: start from the bookings already inside the window.
+                cursor = trips.aggregate(last=Max("pk"))["last"] or 0
+                since = timezone.now() - timedelta(seconds=self.slots * self.bucket)
+                new = trips.filter(pk__lte=cursor, request_time__gte=since)
+            else:
+                new = trips.filter(pk__gt=cursor)
+            rows = list(new.values_list("pk", "route_id"))
+            self._cursors[alias] = max([cursor, *(pk for pk, _ in rows)])
+            route_ids.extend(route_id for _, route_id in rows)
+        return route_ids
+
+    def _available_drivers(self):
+        locations.grid.sync_from_db()
+        live = locations.grid.live_driver_ids()
+        if not live:
+            return []
+        busy = locations.busy_driver_ids(live)
+        return [driver_id for driver_id in live if driver_id not in busy]
+
+    def tick(self):
+        self._sync_routes()
+        self.record_requests(self._new_bookings())
+        self.sample_drivers(self._available_drivers())
+        self.recompute()
+
+    def _maybe_tick(self):
+        if not self.autotick:
+            return
+        if not settings.SURGE_TICK_SECONDS:
+            self.tick()
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="surge-pricing", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Surge pricing tick failed; keeping the last multipliers")
+            finally:
+                connections.close_all()
+            time.sleep(settings.SURGE_TICK_SECONDS)
+
+
+engine = SurgeEngine()
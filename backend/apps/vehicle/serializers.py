@@ -1,13 +1,22 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers
 
+from apps.common.images import variant_url
+
+from . import availability, booking, pricing
+from .exceptions import BookingTimeout
 from .models import Location, Route, Trip, Vehicle, DriverApplication
 
 User = get_user_model()
 
 
 class VehicleSerializer(serializers.ModelSerializer):
-    driver_name = serializers.CharField(source="driver.get_full_name", read_only=True)
+    driver_name = serializers.CharField(source="driver.full_name", read_only=True)
     driver = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(role=User.Role.DRIVER),
         required=False,
@@ -27,11 +36,18 @@ class VehicleSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["driver_name"]
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        representation["license"] = variant_url(
+            instance.license, "medium", request=self.context.get("request")
+        )
+        return representation
+
 
 class LocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Location
-        fields = ["id", "name","pk"]
+        fields = ["id", "name","pk", "latitude", "longitude"]
 
 
 class RouteSerializer(serializers.ModelSerializer):
@@ -54,7 +70,9 @@ class RouteSerializer(serializers.ModelSerializer):
             'drivers',
             'vehicles',
             'pickup_id', 
-            'drop_id'
+            'drop_id',
+            'eta_p50_minutes',
+            'eta_p90_minutes',
         ]
         # Prevent DRF from automatically adding UniqueTogetherValidator
         validators = []
@@ -112,31 +130,63 @@ class TripRequestSerializer(serializers.ModelSerializer):
             "route",
             "distance_km",
             "fare",
+            "surge_multiplier",
             "status",
             "request_time",
             "start_time",
             "end_time",
             "passenger_count",    # New
+            "vehicle_type",
             "notes_for_driver",   # New
             "scheduled_for",      # New
         ]
         read_only_fields = [
-            "fare", "status", "request_time", "start_time", "end_time", "route",
-            "passenger_count", "notes_for_driver", "scheduled_for"
+            "fare", "surge_multiplier", "status", "request_time", "start_time", "end_time", "route",
+            "notes_for_driver", "scheduled_for"
         ]
 
+    def validate(self, attrs):
+        # Only offer trips some vehicle can carry.
+        vehicle_type = attrs.get("vehicle_type")
+        seats = (
+            Vehicle.SEAT_CAPACITY[vehicle_type] if vehicle_type
+            else max(Vehicle.SEAT_CAPACITY.values())
+        )
+        if not 1 <= attrs.get("passenger_count", 1) <= seats:
+            raise serializers.ValidationError(
+                {"passenger_count": f"Must be between 1 and {seats}."}
+            )
+        return attrs
+
     def create(self, validated_data):
         route = validated_data.get('route')
         if route:
-            validated_data['fare'] = route.price_af
+            multiplier = pricing.engine.multiplier(route.pk)
+            validated_data['surge_multiplier'] = Decimal(str(multiplier))
+            validated_data['fare'] = pricing.surged_fare(route.price_af, multiplier)
         
         validated_data['passenger'] = self.context['request'].user
-        
+
+        if settings.BOOKING_GROUP_COMMIT:
+            try:
+                return booking.writer.save(Trip(**validated_data))
+            except TimeoutError:
+                # Withdrawn from the queue: nothing was booked.
+                raise BookingTimeout()
         return super().create(validated_data)
 
+class RouteQuoteSerializer(serializers.Serializer):
+    route = serializers.IntegerField()
+    base_fare = serializers.DecimalField(max_digits=10, decimal_places=2)
+    surge_multiplier = serializers.FloatField()
+    fare = serializers.DecimalField(max_digits=10, decimal_places=2)
+    eta_p50_minutes = serializers.FloatField(allow_null=True)
+    eta_p90_minutes = serializers.FloatField(allow_null=True)
+
+
 class DriverTripSerializer(serializers.ModelSerializer):
     passenger_name = serializers.CharField(
-        source="passenger.get_full_name", read_only=True
+        source="passenger.full_name", read_only=True
     )
     pickup = serializers.CharField(source="route.pickup.name", read_only=True)
     drop = serializers.CharField(source="route.drop.name", read_only=True)
@@ -172,6 +222,35 @@ class AdminTripUpdateSerializer(serializers.ModelSerializer):
         # List only the fields an admin should be able to change.
         fields = ['driver', 'status']
 
+    def check_conflicts(self, driver, trip_status, fresh=False):
+        if driver is not None and trip_status not in availability.FREE_STATUSES:
+            trip = self.instance or Trip()
+            conflicts = availability.calendar.conflicts(driver.pk, trip, fresh=fresh)
+            if conflicts:
+                raise serializers.ValidationError(
+                    {'driver': f'The driver has overlapping trips: {sorted(conflicts)}.'}
+                )
+
+    def validate(self, attrs):
+        driver = attrs.get('driver', self.instance.driver if self.instance else None)
+        trip_status = attrs.get('status', self.instance.status if self.instance else 'requested')
+        self.check_conflicts(driver, trip_status)
+        return attrs
+
+    def update(self, instance, validated_data):
+        # Again from the database under the shard's write lock, as the
+        # in-memory calendar may lag another worker's assignment.
+        with transaction.atomic(using=instance._state.db):
+            self.check_conflicts(
+                validated_data.get('driver', instance.driver),
+                validated_data.get('status', instance.status),
+                fresh=True,
+            )
+            trip = super().update(instance, validated_data)
+        if trip.driver_id and trip.status not in availability.FREE_STATUSES:
+            availability.calendar.record(trip)
+        return trip
+
 
 class AdminTripListSerializer(serializers.ModelSerializer):
     """
@@ -180,7 +259,7 @@ class AdminTripListSerializer(serializers.ModelSerializer):
     """
     passenger = serializers.SerializerMethodField()
     route = RouteSerializer(read_only=True)
-    driver_name = serializers.CharField(source='driver.get_full_name', read_only=True, allow_null=True)
+    driver_name = serializers.CharField(source='driver.full_name', read_only=True, allow_null=True)
 
     class Meta:
         model = Trip
@@ -201,7 +280,7 @@ class AdminTripListSerializer(serializers.ModelSerializer):
 
     def get_passenger(self, obj):
         if obj.passenger:
-            return obj.passenger.get_full_name
+            return obj.passenger.full_name
         return "N/A"
     
 class DriverApplicationSerializer(serializers.ModelSerializer):
@@ -219,7 +298,7 @@ class DriverApplicationSerializer(serializers.ModelSerializer):
         return application
 
 class AdminDriverApplicationSerializer(serializers.ModelSerializer):
-    applicant_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    applicant_name = serializers.CharField(source='user.full_name', read_only=True)
     
     class Meta:
         model = DriverApplication
@@ -232,17 +311,41 @@ class AvailableTripRequestSerializer(serializers.ModelSerializer):
     Shows detailed trip info for the "Trip Request Board" for drivers.
     """
     route = RouteSerializer(read_only=True)
-    passenger_name = serializers.CharField(source='passenger.get_full_name', read_only=True)
+    passenger_name = serializers.CharField(source='passenger.full_name', read_only=True)
 
     class Meta:
         model = Trip
         fields = [
-            'id', 'pk', 'passenger_name', 'route', 'fare', 'passenger_count',
+            'id', 'pk', 'passenger_name', 'route', 'fare', 'passenger_count', 'vehicle_type',
             'notes_for_driver', 'scheduled_for', 'request_time'
         ]
 
+class PooledTripSerializer(AvailableTripRequestSerializer):
+    fare_share = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta(AvailableTripRequestSerializer.Meta):
+        fields = AvailableTripRequestSerializer.Meta.fields + ['fare_share']
+
+
+class TripBundleSerializer(serializers.Serializer):
+    """
+    One unit of the pooled trip board (apps.vehicle.pooling): a single trip
+    or trips sharing the vehicle, each with its share of the fare.
+    """
+    pooled = serializers.BooleanField(read_only=True)
+    passenger_count = serializers.IntegerField(read_only=True)
+    fare = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    trips = PooledTripSerializer(many=True, read_only=True)
+
+
+class AcceptBundleSerializer(serializers.Serializer):
+    trips = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=8)
+
+    def validate_trips(self, value):
+        return sorted(set(value))
+
 class DashboardRecentTripSerializer(serializers.ModelSerializer):
-    passenger_name = serializers.CharField(source='passenger.get_full_name', read_only=True)
+    passenger_name = serializers.CharField(source='passenger.full_name', read_only=True)
     route_display = serializers.SerializerMethodField()
 
     class Meta:
@@ -250,4 +353,27 @@ class DashboardRecentTripSerializer(serializers.ModelSerializer):
         fields = ['id', 'passenger_name', 'route_display', 'status', 'request_time']
 
     def get_route_display(self, obj):
-        return f"{obj.route.pickup.name} ➜ {obj.route.drop.name}"
\ No newline at end of file
+        return f"{obj.route.pickup.name} ➜ {obj.route.drop.name}"
+
+class DriverLocationPointSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    # Device time of the fix; defaults to when the batch arrives.
+    recorded_at = serializers.DateTimeField(required=False)
+
+
+class DriverLocationBatchSerializer(serializers.Serializer):
+    points = DriverLocationPointSerializer(
+        many=True, allow_empty=False, max_length=settings.DRIVER_LOCATION_MAX_POINTS
+    )
+
+
+class NearbyDriverSerializer(serializers.Serializer):
+    driver = serializers.IntegerField(source="driver_id")
+    distance_km = serializers.FloatField()
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    age_seconds = serializers.SerializerMethodField()
+
+    def get_age_seconds(self, obj):
+        return round(time.time() - obj.recorded_at, 1)
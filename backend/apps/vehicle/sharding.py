@@ -0,0 +1,267 @@
+"""
+Region-sharded Trip storage.
+
+settings.TRIP_SHARDS maps a Location.region to a database alias. A trip is
+written to the shard of its pickup region (Trip.region); unmapped regions and
+trips created before sharding live in `default`. Shards hold only the trip
+table, so queries that span shards go through TripQuerySet.scatter(), which
+runs the query on every shard, merges the rows in query order and attaches
+passengers, drivers, vehicles and routes loaded from `default`.
+
+Primary keys are offset per shard by TRIP_SHARD_PK_STRIDE times the shard's
+number in TRIP_SHARD_NUMBERS (`default` is 0), so an integer pk identifies
+its shard (see shard_for_pk()). The numbers are explicit because they are
+baked into stored pks: reordering or extending TRIP_SHARDS must not move
+existing trips to another shard.
+
+Shard connections run with foreign_keys OFF, so a deleted passenger,
+driver, vehicle or route cascades to its trips on `default` only.
+cascade_to_shards() applies the same on_delete to the trips on every other
+shard.
+
+With TRIP_SHARDS empty every helper degrades to a plain query on `default`.
+"""
+
+from functools import cmp_to_key
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models.signals import pre_delete
+
+TRIP_MODEL = "vehicle.Trip"
+
+
+def trip_shard_aliases():
+    """`default` first, then each configured shard once, in settings order."""
+    return [DEFAULT_DB_ALIAS, *dict.fromkeys(settings.TRIP_SHARDS.values())]
+
+
+def is_trip_shard(alias):
+    return alias != DEFAULT_DB_ALIAS and alias in settings.TRIP_SHARDS.values()
+
+
+def shard_for_region(region):
+    return settings.TRIP_SHARDS.get(region or "", DEFAULT_DB_ALIAS)
+
+
+def shards_for_regions(regions):
+    return list(dict.fromkeys(shard_for_region(region) for region in regions))
+
+
+def shard_numbers():
+    """{alias: number} for every alias, validated against TRIP_SHARD_NUMBERS."""
+    numbers = {DEFAULT_DB_ALIAS: 0}
+    for alias in trip_shard_aliases()[1:]:
+        number = settings.TRIP_SHARD_NUMBERS.get(alias)
+        if not isinstance(number, int) or number < 1:
+            raise ImproperlyConfigured(
+                f"TRIP_SHARD_NUMBERS needs a number of 1 or more for {alias!r}."
+            )
+        numbers[alias] = number
+    if len(set(numbers.values())) != len(numbers):
+        raise ImproperlyConfigured("TRIP_SHARD_NUMBERS must give each trip shard its own number.")
+    return numbers
+
+
+def shard_for_pk(pk):
+    number = int(pk) // settings.TRIP_SHARD_PK_STRIDE
+    for alias, shard_number in shard_numbers().items():
+        if shard_number == number:
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def ensure_shard_sequence(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate hook: start each shard's trip pks at its own offset."""
+    if not is_trip_shard(using):
+        return
+    offset = shard_numbers()[using] * settings.TRIP_SHARD_PK_STRIDE
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'vehicle_trip', %s "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'vehicle_trip')",
+            [offset],
+        )
+
+
+def _ordering_cmp(ordering):
+    fields = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+    for name, _ in fields:
+        if "__" in name or name == "?":
+            raise ValueError(f"Cannot merge shards on ordering {name!r}.")
+
+    def compare(a, b):
+        for name, descending in fields:
+            left, right = getattr(a, name), getattr(b, name)
+            if left == right:
+                continue
+            # NULLs sort first ascending, as in SQLite.
+            if left is None or (right is not None and left < right):
+                result = -1
+            else:
+                result = 1
+            return -result if descending else result
+        return 0
+
+    return cmp_to_key(compare)
+
+
+def attach_related(trips):
+    """
+    Load the default-database relations of shard-resident trips in bulk and
+    cache them on each trip, replacing select_related().
+    """
+    from .models import Route, Trip
+
+    relations = {
+        "passenger": None,
+        "driver": None,
+        "vehicle": None,
+        "route": Route.objects.select_related("pickup", "drop").prefetch_related(
+            "drivers", "vehicles"
+        ),
+    }
+    for name, queryset in relations.items():
+        field = Trip._meta.get_field(name)
+        if queryset is None:
+            queryset = field.related_model._default_manager.all()
+        ids = {getattr(trip, field.attname) for trip in trips} - {None}
+        objects = queryset.using(DEFAULT_DB_ALIAS).in_bulk(ids) if ids else {}
+        for trip in trips:
+            field.set_cached_value(trip, objects.get(getattr(trip, field.attname)))
+    return trips
+
+
+class TripQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # QuerySet.create() pins the write to self.db; let the router pick
+        # the shard from the instance instead.
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+    def scatter(self, aliases=None):
+        """Evaluate this query on every shard (or `aliases`) and merge the rows."""
+        aliases = aliases or trip_shard_aliases()
+        if aliases == [DEFAULT_DB_ALIAS]:
+            return list(self)
+
+        query = self.query
+        low, high = query.low_mark, query.high_mark
+        base = self._chain()
+        base.query.clear_limits()
+        # Shards hold no user/route tables, so joins and prefetches are
+        # replaced by attach_related().
+        base = base.select_related(None).prefetch_related(None)
+        if high is not None:
+            base.query.set_limits(0, high)
+
+        rows = []
+        for alias in aliases:
+            rows.extend(base.using(alias))
+        ordering = query.order_by or (
+            self.model._meta.ordering if query.default_ordering else []
+        )
+        if ordering:
+            rows.sort(key=_ordering_cmp(ordering))
+        rows = rows[low:high]
+        return attach_related(rows)
+
+    async def ascatter(self, aliases=None):
+        """scatter() for async views."""
+        aliases = aliases or trip_shard_aliases()
+        if aliases == [DEFAULT_DB_ALIAS]:
+            return [trip async for trip in self]
+        return await sync_to_async(self.scatter)(aliases)
+
+    def scatter_count(self):
+        return sum(self.using(alias).count() for alias in trip_shard_aliases())
+
+    def scatter_get(self, **lookup):
+        """get() across shards; integer pks go straight to their shard."""
+        if "pk" in lookup and len(lookup) == 1:
+            trip = self.using(shard_for_pk(lookup["pk"])).get(**lookup)
+            return attach_related([trip])[0]
+        for alias in trip_shard_aliases():
+            try:
+                trip = self.using(alias).get(**lookup)
+            except self.model.DoesNotExist:
+                continue
+            return attach_related([trip])[0] if alias != DEFAULT_DB_ALIAS else trip
+        raise self.model.DoesNotExist(f"No trip matches {lookup}.")
+
+
+TripManager = models.Manager.from_queryset(TripQuerySet)
+
+
+def cascade_to_shards(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """pre_delete hook: apply Trip's on_delete to the trips on other shards."""
+    from .models import Trip
+
+    if is_trip_shard(using):
+        return
+    for field in Trip._meta.concrete_fields:
+        if not field.is_relation or field.related_model is not sender:
+            continue
+        for alias in trip_shard_aliases()[1:]:
+            trips = Trip.objects.using(alias).filter(**{field.attname: instance.pk})
+            if field.remote_field.on_delete is models.CASCADE:
+                trips.delete()
+            else:
+                trips.update(**{field.attname: None})
+
+
+def connect_signals():
+    from .models import Trip
+
+    for model in {field.related_model for field in Trip._meta.concrete_fields if field.is_relation}:
+        pre_delete.connect(
+            cascade_to_shards, sender=model, dispatch_uid=f"trip-shards-{model._meta.label}"
+        )
+
+
+class TripShardRouter:
+    """
+    Sends Trip writes to the shard of their region and keeps every other
+    model (including relations followed from a sharded trip) on `default`.
+    """
+
+    def _is_trip(self, model):
+        return model._meta.label == TRIP_MODEL
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is None or not instance._state.db:
+            return None
+        if self._is_trip(model):
+            return instance._state.db
+        if is_trip_shard(instance._state.db):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        if self._is_trip(model):
+            if instance._state.adding or not instance._state.db:
+                return shard_for_region(getattr(instance, "region", ""))
+            return instance._state.db
+        if instance._state.db and is_trip_shard(instance._state.db):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self._is_trip(type(obj1)) or self._is_trip(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if is_trip_shard(db):
+            return f"{app_label}.{model_name}" == TRIP_MODEL.lower()
+        return None
@@ -1,3 +1,1162 @@
-from django.test import TestCase
+import bisect
+import math
+import random
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.counts import get_count
+
+from . import (
+    availability, booking, distances, eligibility, eta, expiry, forecasting, locations, pooling,
+    pricing, views,
+)
+from .admin import TripAdmin, TripShardFilter
+from .availability import IntervalTree
+from .booking import BookingWriter
+from .distances import DistanceMatrix, haversine_matrix
+from .locations import DriverGrid, haversine_km
+from .pricing import SurgeEngine
+from .models import DriverLocation, Location, Route, RouteDurationSketch, Trip, Vehicle
+from .sharding import (
+    TripShardRouter,
+    _ordering_cmp,
+    cascade_to_shards,
+    shard_for_pk,
+    shard_for_region,
+    shards_for_regions,
+    trip_shard_aliases,
+)
+
+SHARDS = {"kabul": "trips_kabul", "herat": "trips_herat", "mazar": "trips_kabul"}
+SHARD_NUMBERS = {"trips_kabul": 1, "trips_herat": 2}
+
+
+def add_vehicle(driver, vehicle_type=Vehicle.ECONOMY):
+    return Vehicle.objects.create(
+        driver=driver,
+        model="Corolla",
+        plate_number=f"KBL-{driver.pk}-{vehicle_type}",
+        type=vehicle_type,
+        license="license/test.jpg",
+    )
+
+
+@override_settings(TRIP_SHARDS=SHARDS, TRIP_SHARD_NUMBERS=SHARD_NUMBERS, TRIP_SHARD_PK_STRIDE=1000)
+class TripShardingTests(TestCase):
+    def test_aliases_are_unique_and_default_first(self):
+        self.assertEqual(trip_shard_aliases(), ["default", "trips_kabul", "trips_herat"])
+
+    def test_region_lookup_falls_back_to_default(self):
+        self.assertEqual(shard_for_region("herat"), "trips_herat")
+        self.assertEqual(shard_for_region(""), "default")
+        self.assertEqual(shard_for_region("kandahar"), "default")
+        self.assertEqual(
+            shards_for_regions(["kabul", "mazar", "herat"]), ["trips_kabul", "trips_herat"]
+        )
+
+    def test_pk_identifies_shard(self):
+        self.assertEqual(shard_for_pk(12), "default")
+        self.assertEqual(shard_for_pk(1001), "trips_kabul")
+        self.assertEqual(shard_for_pk(2500), "trips_herat")
+        self.assertEqual(shard_for_pk(9000), "default")
+
+    def test_pk_ranges_do_not_follow_settings_order(self):
+        reordered = {"herat": "trips_herat", "kabul": "trips_kabul"}
+        with override_settings(TRIP_SHARDS=reordered):
+            self.assertEqual(shard_for_pk(1001), "trips_kabul")
+            self.assertEqual(shard_for_pk(2500), "trips_herat")
+        with override_settings(TRIP_SHARD_NUMBERS={"trips_kabul": 1}):
+            with self.assertRaises(ImproperlyConfigured):
+                shard_for_pk(1001)
+        with override_settings(TRIP_SHARD_NUMBERS={"trips_kabul": 1, "trips_herat": 1}):
+            with self.assertRaises(ImproperlyConfigured):
+                shard_for_pk(1001)
+
+    def test_deletes_cascade_to_trips_on_other_shards(self):
+        User = get_user_model()
+        passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        other = User.objects.create_user("Omar", "Other", "omar@example.com", "x")
+        driver = User.objects.create_user("Dawood", "Driver", "dawood@example.com", "x", role="driver")
+        route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        kept = Trip.objects.create(passenger=other, route=route, driver=driver)
+        Trip.objects.create(passenger=passenger, route=route, driver=driver)
+        # Stand `default` in for a shard: foreign keys there are not enforced.
+        with mock.patch(
+            "apps.vehicle.sharding.trip_shard_aliases", return_value=["default", "default"]
+        ):
+            cascade_to_shards(User, driver)
+            cascade_to_shards(User, passenger)
+        self.assertEqual(list(Trip.objects.all()), [kept])
+        kept.refresh_from_db()
+        self.assertIsNone(kept.driver_id)
+        # Shard-side deletes are not repeated for deletes made on a shard.
+        with mock.patch("apps.vehicle.sharding.trip_shard_aliases") as aliases:
+            cascade_to_shards(Route, route, using="trips_kabul")
+        aliases.assert_not_called()
+        self.assertTrue(Trip.objects.exists())
+
+    def test_admin_lists_and_opens_trips_per_shard(self):
+        request = APIRequestFactory().get("/", {"shard": "trips_herat"})
+        shard_filter = TripShardFilter(request, {"shard": ["trips_herat"]}, Trip, TripAdmin)
+        self.assertEqual(
+            [alias for alias, _ in shard_filter.lookup_choices],
+            ["default", "trips_kabul", "trips_herat"],
+        )
+        self.assertEqual(shard_filter.queryset(request, Trip.objects.all()).db, "trips_herat")
+        unfiltered = TripShardFilter(request, {}, Trip, TripAdmin)
+        self.assertEqual(unfiltered.queryset(request, Trip.objects.all()).db, "default")
+
+        trip_admin = TripAdmin(Trip, admin.site)
+        with mock.patch.object(TripAdmin, "get_queryset") as get_queryset:
+            trip = trip_admin.get_object(request, "2500")
+            self.assertIsNone(trip_admin.get_object(request, "not-a-pk"))
+        get_queryset.return_value.using.assert_called_once_with("trips_herat")
+        self.assertEqual(trip, get_queryset.return_value.using.return_value.get.return_value)
+
+    def test_merge_follows_query_ordering(self):
+        now = timezone.now()
+        rows = [
+            SimpleNamespace(status="requested", request_time=now),
+            SimpleNamespace(status="completed", request_time=now - timedelta(hours=1)),
+            SimpleNamespace(status="requested", request_time=now + timedelta(hours=1)),
+        ]
+        rows.sort(key=_ordering_cmp(["-status", "request_time"]))
+        self.assertEqual(
+            [(r.status, r.request_time) for r in rows],
+            [
+                ("requested", now),
+                ("requested", now + timedelta(hours=1)),
+                ("completed", now - timedelta(hours=1)),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            _ordering_cmp(["route__price_af"])
+
+    def test_router_keeps_non_trip_models_off_shards(self):
+        from .models import Location, Trip
+
+        router = TripShardRouter()
+        self.assertTrue(router.allow_migrate("trips_kabul", "vehicle", "trip"))
+        self.assertFalse(router.allow_migrate("trips_kabul", "vehicle", "route"))
+        self.assertIsNone(router.allow_migrate("default", "vehicle", "route"))
+
+        trip = Trip(region="herat")
+        self.assertEqual(router.db_for_write(Trip, instance=trip), "trips_herat")
+        trip._state.db, trip._state.adding = "trips_herat", False
+        self.assertEqual(router.db_for_read(Location, instance=trip), "default")
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.driver = User.objects.create_user(
+            "Dawood", "Driver", "dawood@example.com", "x", role="driver"
+        )
+        self.admin = User.objects.create_user("Ada", "Admin", "ada@example.com", "x", role="admin")
+        route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        route.drivers.add(self.driver)
+        add_vehicle(self.driver)
+        eligibility.index.refresh(force=True)
+        Trip.objects.create(passenger=self.passenger, route=route)
+        Trip.objects.create(passenger=self.passenger, route=route, driver=self.driver)
+        self.factory = APIRequestFactory()
+
+    def get(self, view_class, user=None):
+        headers = {}
+        if user is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+        request = self.factory.get("/", **headers)
+        return async_to_sync(view_class.as_view())(request)
+
+    def assertSameAsSync(self, async_view, sync_view, user):
+        response = self.get(async_view, user)
+        self.assertEqual(response.status_code, 200)
+        request = self.factory.get("/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        self.assertEqual(response.data, sync_view.as_view()(request).data)
+        return response
+
+    def test_async_views_match_sync_views(self):
+        board = self.assertSameAsSync(
+            views.AsyncAvailableTripRequestListView, views.AvailableTripRequestListView, self.driver
+        )
+        self.assertEqual(len(board.data), 1)
+        self.assertSameAsSync(views.AsyncDriverTripListView, views.DriverTripListView, self.driver)
+        self.assertSameAsSync(views.AsyncAdminTripListView, views.AdminTripListView, self.admin)
+        self.assertSameAsSync(
+            views.AsyncPassengerTripListView, views.TripRequestCreateView, self.passenger
+        )
+
+    def test_dashboard_and_routes(self):
+        views.dashboard_stats()  # seeds the maintained row counts
+        dashboard = self.assertSameAsSync(
+            views.AsyncAdminDashboardStatsView, views.AdminDashboardStatsView, self.admin
+        )
+        self.assertEqual(dashboard.data["kpi"]["total_trips"], 2)
+        self.assertEqual(len(dashboard.data["recent_trips"]), 2)
+        routes = self.get(views.AsyncRouteListView)
+        self.assertEqual(routes.data[0]["drivers"], [self.driver.pk])
+
+    def test_async_auth_and_permissions(self):
+        self.assertEqual(self.get(views.AsyncDriverTripListView).status_code, 401)
+        self.assertEqual(self.get(views.AsyncDriverTripListView, self.passenger).status_code, 403)
+
+
+class DriverGridTests(TestCase):
+    def setUp(self):
+        self.grid = DriverGrid(cell_deg=0.01, ttl=60)
+
+    def test_nearest_orders_by_distance(self):
+        now = 1_000_000.0
+        self.grid.update_many([
+            (1, 34.5300, 69.1700, now),  # ~0.3 km
+            (2, 34.5553, 69.2075, now),  # ~4 km
+            (3, 34.6500, 69.1700, now),  # ~13 km
+            (4, 36.7000, 67.1100, now),  # Mazar, out of range
+        ])
+        found = self.grid.nearest(34.5281, 69.1723, k=3, radius_km=15, now=now)
+        self.assertEqual([d.driver_id for d in found], [1, 2, 3])
+        self.assertAlmostEqual(
+            found[1].distance_km, haversine_km(34.5281, 69.1723, 34.5553, 69.2075)
+        )
+        self.assertEqual(
+            [d.driver_id for d in self.grid.nearest(34.5281, 69.1723, k=5, radius_km=5, now=now)],
+            [1, 2],
+        )
+        restricted = self.grid.nearest(34.5281, 69.1723, k=5, drivers={3, 4}, now=now)
+        self.assertEqual([d.driver_id for d in restricted], [3])
+
+    def test_stale_and_out_of_order_points(self):
+        self.grid.update(1, 34.53, 69.17, recorded_at=100)
+        self.assertFalse(self.grid.update(1, 34.60, 69.20, recorded_at=90))
+        self.assertTrue(self.grid.update(1, 34.54, 69.18, recorded_at=110))
+        self.assertEqual(len(self.grid._cells), 1)
+        self.assertEqual(self.grid.nearest(34.54, 69.18, now=165)[0].driver_id, 1)
+        self.assertEqual(self.grid.nearest(34.54, 69.18, now=175), [])
+        self.assertEqual(self.grid.sweep(now=175), 1)
+        self.assertEqual((len(self.grid), self.grid._cells), (0, {}))
+
+
+@override_settings(DRIVER_LOCATION_FLUSH_INTERVAL=0)
+class DriverLocationViewTests(TestCase):
+    def setUp(self):
+        locations.grid.clear()
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.driver = User.objects.create_user(
+            "Dawood", "Driver", "dawood@example.com", "x", role="driver"
+        )
+        self.other = User.objects.create_user(
+            "Omar", "Driver", "omar@example.com", "x", role="driver"
+        )
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul", latitude=34.5281, longitude=69.1723),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        self.route.drivers.add(self.driver, self.other)
+        add_vehicle(self.driver)
+        add_vehicle(self.other)
+        eligibility.index.refresh(force=True)
+        self.trip = Trip.objects.create(passenger=self.passenger, route=self.route)
+        self.client = APIClient()
+
+    def post_points(self, driver, *points):
+        self.client.force_authenticate(driver)
+        return self.client.post(
+            reverse("driver-location"),
+            {"points": [{"latitude": lat, "longitude": lon} for lat, lon in points]},
+            format="json",
+        )
+
+    def nearby(self):
+        self.client.force_authenticate(self.passenger)
+        return self.client.get(reverse("trip-nearby-drivers", args=[self.trip.pk]))
+
+    def test_ingest_persists_and_matches(self):
+        response = self.post_points(self.driver, (34.60, 69.30), (34.53, 69.18))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["accepted"], 2)
+        self.assertEqual(DriverLocation.objects.filter(driver=self.driver).count(), 2)
+        self.post_points(self.other, (34.58, 69.25))
+
+        response = self.nearby()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([d["driver"] for d in response.data], [self.driver.pk, self.other.pk])
+
+        Trip.objects.create(
+            passenger=self.passenger, route=self.route, driver=self.driver, status="in_progress"
+        )
+        self.assertEqual([d["driver"] for d in self.nearby().data], [self.other.pk])
+
+    def test_positions_flushed_elsewhere_are_synced(self):
+        self.post_points(self.driver, (34.53, 69.18))
+        locations.grid.clear()  # as if another worker had ingested the point
+        self.assertEqual([d["driver"] for d in self.nearby().data], [self.driver.pk])
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.post_points(self.driver, (91, 69)).status_code, 400)
+        self.assertEqual(self.post_points(self.passenger, (34.5, 69.1)).status_code, 403)
+        self.client.force_authenticate(self.other)
+        response = self.client.get(reverse("trip-nearby-drivers", args=[self.trip.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(DRIVER_LOCATION_TTL=60, DRIVER_LOCATION_RETENTION=600)
+    def test_old_points_are_pruned(self):
+        now = timezone.now()
+        for age in (0, 120, 599, 601, 3600, 7200):
+            DriverLocation.objects.create(
+                driver=self.driver, latitude=34.5, longitude=69.1,
+                recorded_at=now - timedelta(seconds=age),
+            )
+        self.assertEqual(locations.prune(batch_size=1), 3)
+        self.assertEqual(DriverLocation.objects.count(), 3)
+        # Never below the TTL the grid reads back on a cold start.
+        self.assertEqual(locations.prune(retention=1), 2)
+
+        writer = locations.LocationWriter()
+        with mock.patch.object(locations, "prune", return_value=0) as prune:
+            writer.maybe_prune()
+            writer.maybe_prune()
+        prune.assert_called_once_with()
+        call_command("prune_driver_locations", "--seconds", "60", stdout=StringIO())
+        self.assertEqual(DriverLocation.objects.count(), 1)
+
+    def test_exit_flush_is_registered_once(self):
+        with mock.patch("atexit.register") as register, \
+                mock.patch.object(locations.LocationWriter, "_run"):
+            writer = locations.LocationWriter()
+            for _ in range(3):
+                writer._ensure_thread()
+                writer._thread.join()
+        register.assert_called_once_with(writer.flush)
+
+
+class DistanceMatrixTests(TestCase):
+    def setUp(self):
+        self.kabul = Location.objects.create(name="Kabul", latitude=34.5281, longitude=69.1723)
+        self.herat = Location.objects.create(name="Herat", latitude=34.3529, longitude=62.2040)
+        self.nowhere = Location.objects.create(name="Nowhere")
+
+    def test_haversine_matrix(self):
+        points = [(34.5281, 69.1723), (34.3529, 62.2040), (float("nan"), float("nan"))]
+        km = haversine_matrix(points, points)
+        self.assertEqual(km.dtype, "float32")
+        self.assertAlmostEqual(float(km[0, 1]), haversine_km(*points[0], *points[1]), places=2)
+        self.assertEqual(float(km[1, 1]), 0)
+        self.assertTrue(all(v != v for v in km[2].tolist()))
+
+    def test_lookups_follow_location_changes(self):
+        matrix = DistanceMatrix()
+        matrix.refresh()
+        kabul_herat = haversine_km(34.5281, 69.1723, 34.3529, 62.2040)
+        self.assertAlmostEqual(matrix.distance(self.kabul.pk, self.herat.pk), kabul_herat, places=2)
+        self.assertIsNone(matrix.distance(self.kabul.pk, self.nowhere.pk))
+        snapshot = matrix._snapshot
+
+        # A new location is picked up on first lookup, without a rebuild.
+        mazar = Location.objects.create(name="Mazar", latitude=36.7090, longitude=67.1109)
+        self.assertAlmostEqual(
+            matrix.distance(mazar.pk, self.kabul.pk),
+            haversine_km(36.7090, 67.1109, 34.5281, 69.1723),
+            places=2,
+        )
+        # A moved one once the version counter changes (on commit).
+        Location.objects.filter(pk=self.herat.pk).update(latitude=34.5553, longitude=69.2075)
+        matrix.refresh()
+        self.assertAlmostEqual(
+            matrix.distance(self.herat.pk, self.kabul.pk),
+            haversine_km(34.5553, 69.2075, 34.5281, 69.1723),
+            places=2,
+        )
+        self.assertIs(matrix._snapshot, snapshot)
+        self.assertEqual(set(matrix._overlay), {mazar.pk, self.herat.pk})
+        found = matrix.distances(
+            [self.kabul.pk, mazar.pk, self.nowhere.pk],
+            [self.herat.pk, self.kabul.pk, self.kabul.pk],
+        )
+        self.assertAlmostEqual(float(found[0]), haversine_km(34.5281, 69.1723, 34.5553, 69.2075), places=2)
+        self.assertAlmostEqual(float(found[1]), haversine_km(36.7090, 67.1109, 34.5281, 69.1723), places=2)
+        self.assertTrue(found[2] != found[2])
+
+    def test_matrix_is_sized_by_located_locations_not_pks(self):
+        far = Location.objects.create(pk=40_000, name="Far", latitude=36.7090, longitude=67.1109)
+        matrix = DistanceMatrix()
+        matrix.refresh()
+        self.assertEqual(matrix._snapshot.shape, (3, 3))
+        self.assertAlmostEqual(
+            matrix.distance(far.pk, self.kabul.pk),
+            haversine_km(36.7090, 67.1109, 34.5281, 69.1723),
+            places=2,
+        )
+        self.assertIsNone(matrix.distance(far.pk, self.nowhere.pk))
+        self.assertIsNone(matrix.distance(far.pk, 39_999))
+
+    def test_only_the_first_snapshot_is_built_by_lookups(self):
+        matrix = DistanceMatrix()
+        self.assertIsNotNone(matrix.distance(self.kabul.pk, self.herat.pk))
+        self.assertFalse(matrix._deferred)
+
+        # Enough new locations to call for a rebuild: left to refresh().
+        Location.objects.bulk_create(
+            Location(name=f"Stop {i}", latitude=34 + i / 100, longitude=66) for i in range(17)
+        )
+        added = Location.objects.latest("pk")
+        with mock.patch.object(DistanceMatrix, "_rebuild") as rebuild:
+            self.assertIsNone(matrix.distance(self.kabul.pk, added.pk))
+        rebuild.assert_not_called()
+        self.assertTrue(matrix._deferred)
+        matrix.refresh()
+        self.assertFalse(matrix._deferred)
+        self.assertIsNotNone(matrix.distance(self.kabul.pk, added.pk))
+
+    def test_memory_mapped_snapshot_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/distances.npy"
+            first = DistanceMatrix(path)
+            first.refresh()
+            expected = first.distance(self.kabul.pk, self.herat.pk)
+            second = DistanceMatrix(path)
+            second.refresh()
+            self.assertEqual(second._snapshot_stat, first._snapshot_stat)
+            self.assertEqual(second.distance(self.kabul.pk, self.herat.pk), expected)
+            self.assertEqual(second._overlay, {})
+
+    def test_first_booking_in_a_fresh_process_gets_a_distance(self):
+        passenger = get_user_model().objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        route = Route.objects.create(pickup=self.kabul, drop=self.herat, price_af=500)
+        with mock.patch.object(distances, "matrix", DistanceMatrix()):
+            trip = Trip.objects.create(passenger=passenger, route=route)
+        self.assertAlmostEqual(float(trip.distance_km), haversine_km(34.5281, 69.1723, 34.3529, 62.2040), delta=1)
+
+    def test_trip_distance_filled_on_booking_and_backfilled(self):
+        distances.matrix.refresh()
+        passenger = get_user_model().objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        route = Route.objects.create(pickup=self.kabul, drop=self.herat, price_af=500)
+        trip = Trip.objects.create(passenger=passenger, route=route)
+        self.assertAlmostEqual(trip.distance_km, distances.matrix.distance(self.kabul.pk, self.herat.pk))
+
+        Trip.objects.filter(pk=trip.pk).update(distance_km=0)
+        untracked = Trip.objects.create(
+            passenger=passenger,
+            route=Route.objects.create(pickup=self.kabul, drop=self.nowhere, price_af=100),
+        )
+        self.assertEqual(untracked.distance_km, 0)
+        call_command("backfill_trip_distances", stdout=StringIO())
+        trip.refresh_from_db()
+        untracked.refresh_from_db()
+        self.assertAlmostEqual(trip.distance_km, distances.matrix.distance(self.kabul.pk, self.herat.pk))
+        self.assertEqual(untracked.distance_km, 0)
+
+
+@override_settings(SURGE_RATIO_THRESHOLD=1.0, SURGE_SENSITIVITY=0.5, SURGE_MAX_MULTIPLIER=2.5,
+                   SURGE_MAX_STEP=0.25, SURGE_ROUNDING=0.05)
+class SurgeEngineTests(TestCase):
+    def setUp(self):
+        self.engine = SurgeEngine(window=120, bucket=60, autotick=False)
+        self.engine.set_routes([1, 2], [Decimal("500"), Decimal("300")], [(1, 10), (1, 11), (2, 12)])
+
+    def test_multiplier_follows_the_window(self):
+        self.engine.sample_drivers([10, 11, 12], now=0)
+        self.engine.record_requests([1] * 6 + [2], now=0)
+        # Route 1: 6 bookings for 2 drivers -> target 2.0, reached in steps.
+        self.engine.recompute()
+        self.assertEqual(self.engine.quote(1), (Decimal("500"), 1.25, Decimal("625.00")))
+        self.engine.recompute()
+        self.assertEqual(self.engine.multiplier(1), 1.5)
+        self.assertEqual(self.engine.multiplier(2), 1.0)
+
+        # A new route keeps the other routes' windows.
+        self.engine.set_routes([1, 2, 3], [Decimal("500"), Decimal("300"), Decimal("100")], [])
+        self.engine.recompute()
+        self.assertEqual(self.engine.multiplier(1), 1.75)
+        self.assertEqual(self.engine.multiplier(3), 1.0)
+
+        # Once the bookings leave the window the surge winds down.
+        self.engine.sample_drivers([10, 11, 12], now=200)
+        self.engine.recompute()
+        self.assertEqual(self.engine.multiplier(1), 1.5)
+        self.assertIsNone(self.engine.quote(4))
+
+
+@override_settings(SURGE_TICK_SECONDS=0, SURGE_MAX_STEP=10, DRIVER_LOCATION_FLUSH_INTERVAL=0)
+class SurgePricingViewTests(TestCase):
+    def setUp(self):
+        locations.grid.clear()
+        patcher = mock.patch.object(pricing, "engine", SurgeEngine())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul", latitude=34.5281, longitude=69.1723),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        for i in range(2):
+            driver = User.objects.create_user(
+                "Driver", str(i), f"driver{i}@example.com", "x", role="driver"
+            )
+            self.route.drivers.add(driver)
+            locations.grid.update(driver.pk, 34.53, 69.17, time.time())
+        for _ in range(6):
+            Trip.objects.create(passenger=self.passenger, route=self.route)
+        self.client = APIClient()
+
+    def test_quote_and_booking_apply_the_surge(self):
+        response = self.client.get(reverse("routes-quote", args=[self.route.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            {
+                "route": self.route.pk, "base_fare": "500.00", "surge_multiplier": 2.0, "fare": "1000.00",
+                "eta_p50_minutes": None, "eta_p90_minutes": None,
+            },
+        )
+
+        self.client.force_authenticate(self.passenger)
+        response = self.client.post(reverse("trip-list-create"), {"route_id": self.route.pk})
+        self.assertEqual(response.status_code, 201)
+        trip = Trip.objects.get(id=response.data["id"])
+        self.assertEqual((trip.fare, trip.surge_multiplier), (Decimal("1000.00"), Decimal("2.00")))
+        # The booking itself counts towards the next quote.
+        self.assertEqual(pricing.engine.quote(self.route.pk)[1], 2.25)
+
+    def test_unknown_route(self):
+        self.assertEqual(self.client.get(reverse("routes-quote", args=[999])).status_code, 404)
+
+    def test_quote_and_booking_agree_on_a_price_changed_elsewhere(self):
+        self.client.get(reverse("routes-quote", args=[self.route.pk]))
+        # Repriced by another worker: this one's Route version never moved.
+        Route.objects.filter(pk=self.route.pk).update(price_af=600)
+        quote = self.client.get(reverse("routes-quote", args=[self.route.pk])).data
+        self.assertEqual((quote["base_fare"], quote["fare"]), ("600.00", "1200.00"))
+
+        self.client.force_authenticate(self.passenger)
+        response = self.client.post(reverse("trip-list-create"), {"route_id": self.route.pk})
+        self.assertEqual(Trip.objects.get(id=response.data["id"]).fare, Decimal("1200.00"))
+
+    def test_routes_reload_after_max_age(self):
+        engine = SurgeEngine(autotick=False)
+        engine.tick()
+        route = Route.objects.create(
+            pickup=self.route.pickup, drop=Location.objects.create(name="Mazar"), price_af=300
+        )
+        Route.objects.filter(pk=route.pk).update(price_af=350)
+        engine.tick()
+        self.assertIsNone(engine.quote(route.pk))
+        with override_settings(MODEL_INDEX_MAX_AGE=0):
+            engine.tick()
+        self.assertEqual(engine.quote(route.pk)[0], Decimal("350"))
+
+
+@override_settings(SURGE_TICK_SECONDS=0)
+class EligibilityTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.sedan = User.objects.create_user("Sami", "Sedan", "sami@example.com", "x", role="driver")
+        self.van = User.objects.create_user("Vali", "Van", "vali@example.com", "x", role="driver")
+        self.idle = User.objects.create_user("Ilyas", "Idle", "ilyas@example.com", "x", role="driver")
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        self.route.drivers.add(self.sedan, self.van, self.idle)
+        add_vehicle(self.sedan, Vehicle.ECONOMY)
+        add_vehicle(self.van, Vehicle.VAN)
+        eligibility.index.refresh(force=True)
+        self.pair = Trip.objects.create(passenger=self.passenger, route=self.route, passenger_count=2)
+        self.family = Trip.objects.create(passenger=self.passenger, route=self.route, passenger_count=6)
+        self.suv = Trip.objects.create(
+            passenger=self.passenger, route=self.route, passenger_count=3, vehicle_type=Vehicle.SUV
+        )
+        self.client = APIClient()
+
+    def board(self, driver):
+        self.client.force_authenticate(driver)
+        response = self.client.get(reverse("driver-available-trips"))
+        self.assertEqual(response.status_code, 200)
+        return [trip["pk"] for trip in response.data]
+
+    def test_index(self):
+        index = eligibility.index
+        self.assertEqual(index.drivers_for(self.route.pk), {self.sedan.pk, self.van.pk})
+        self.assertEqual(index.drivers_for(self.route.pk, passengers=5), {self.van.pk})
+        self.assertEqual(index.drivers_for(self.route.pk, Vehicle.SUV), set())
+        self.assertTrue(index.can_take(self.van.pk, self.family))
+        self.assertFalse(index.can_take(self.sedan.pk, self.family))
+        self.assertFalse(index.can_take(self.idle.pk, self.pair))
+
+    def test_board_and_accept_respect_capacity_and_type(self):
+        self.assertEqual(self.board(self.sedan), [self.pair.pk])
+        self.assertEqual(self.board(self.van), [self.pair.pk, self.family.pk])
+        self.assertEqual(self.board(self.idle), [])
+
+        self.client.force_authenticate(self.sedan)
+        response = self.client.post(reverse("driver-accept-trip", args=[self.family.pk]))
+        self.assertEqual(response.status_code, 403)
+        self.client.force_authenticate(self.van)
+        response = self.client.post(reverse("driver-accept-trip", args=[self.family.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_accept_rechecks_the_database(self):
+        # Another worker took the van off the route; this one's index has not noticed.
+        Route.drivers.through.objects.filter(route=self.route, user=self.van).delete()
+        self.assertTrue(eligibility.index.can_take(self.van.pk, self.family))
+        self.assertFalse(eligibility.index.can_take(self.van.pk, self.family, fresh=True))
+
+        self.client.force_authenticate(self.van)
+        response = self.client.post(reverse("driver-accept-trip", args=[self.family.pk]))
+        self.assertEqual(response.status_code, 403)
+        self.family.refresh_from_db()
+        self.assertIsNone(self.family.driver)
+
+    def test_index_reloads_after_max_age(self):
+        Route.drivers.through.objects.filter(route=self.route, user=self.van).delete()
+        self.assertTrue(eligibility.index.serves(self.van.pk, self.route.pk))
+        with override_settings(MODEL_INDEX_MAX_AGE=0):
+            self.assertFalse(eligibility.index.serves(self.van.pk, self.route.pk))
+
+    def test_booking_validates_seats(self):
+        self.client.force_authenticate(self.passenger)
+        url = reverse("trip-list-create")
+        response = self.client.post(url, {"route_id": self.route.pk, "passenger_count": 9})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            url, {"route_id": self.route.pk, "passenger_count": 5, "vehicle_type": Vehicle.ECONOMY}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            url, {"route_id": self.route.pk, "passenger_count": 5, "vehicle_type": Vehicle.SUV}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["vehicle_type"], Vehicle.SUV)
+
+
+class IntervalTreeTests(TestCase):
+    def test_queries(self):
+        tree = IntervalTree([(0, 10, "a"), (5, 7, "b"), (20, 30, "c")])
+        self.assertTrue(tree.is_free(10, 20))
+        self.assertFalse(tree.is_free(9, 11))
+        self.assertEqual(sorted(tree.overlapping(6, 21)), ["a", "b", "c"])
+        self.assertEqual(tree.overlapping(7, 20), ["a"])
+        self.assertFalse(tree.is_free(25))
+        self.assertTrue(tree.is_free(15))
+        tree.add(12, 18, "d")
+        self.assertFalse(tree.is_free(10, 20))
+        self.assertEqual(tree.overlapping(17, 19), ["d"])
+        self.assertEqual(len(tree), 4)
+
+
+class DriverAvailabilityTests(TestCase):
+    def setUp(self):
+        availability.calendar.clear()
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.driver = User.objects.create_user(
+            "Dawood", "Driver", "dawood@example.com", "x", role="driver"
+        )
+        self.admin = User.objects.create_user("Ada", "Admin", "ada@example.com", "x", role="admin")
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        self.route.drivers.add(self.driver)
+        add_vehicle(self.driver)
+        eligibility.index.refresh(force=True)
+        distances.matrix.refresh()  # no coordinates: default trip duration
+        self.at = timezone.now() + timedelta(days=1)
+        self.booked = Trip.objects.create(
+            passenger=self.passenger, route=self.route, scheduled_for=self.at,
+            driver=self.driver, status="in_progress",
+        )
+        # Within the 30 + 15 minute default slot of `booked`, and well after it.
+        self.clash = Trip.objects.create(
+            passenger=self.passenger, route=self.route, scheduled_for=self.at + timedelta(minutes=20)
+        )
+        self.later = Trip.objects.create(
+            passenger=self.passenger, route=self.route, scheduled_for=self.at + timedelta(hours=3)
+        )
+        self.client = APIClient()
+
+    def accept(self, trip):
+        self.client.force_authenticate(self.driver)
+        return self.client.post(reverse("driver-accept-trip", args=[trip.pk]))
+
+    def test_accept_refuses_overlapping_trips(self):
+        response = self.accept(self.clash)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["conflicts"], [self.booked.pk])
+        self.assertEqual(self.accept(self.later).status_code, 200)
+        # Recorded at once, before any version bump.
+        overlapping = Trip.objects.create(
+            passenger=self.passenger, route=self.route, scheduled_for=self.at + timedelta(hours=3, minutes=10)
+        )
+        self.assertEqual(self.accept(overlapping).status_code, 409)
+
+    def test_accept_rechecks_the_database(self):
+        # Another worker assigns `later` after this one loaded the calendar.
+        availability.calendar.tree(self.driver.pk)
+        Trip.objects.filter(pk=self.later.pk).update(driver=self.driver, status="in_progress")
+        overlapping = Trip.objects.create(
+            passenger=self.passenger, route=self.route, scheduled_for=self.at + timedelta(hours=3, minutes=10)
+        )
+        self.assertEqual(availability.calendar.conflicts(self.driver.pk, overlapping), [])
+
+        response = self.accept(overlapping)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["conflicts"], [self.later.pk])
+        overlapping.refresh_from_db()
+        self.assertIsNone(overlapping.driver)
+
+    def test_admin_assignment_rechecks_the_database(self):
+        availability.calendar.tree(self.driver.pk)
+        Trip.objects.filter(pk=self.later.pk).update(driver=self.driver, status="in_progress")
+        overlapping = Trip.objects.create(
+            passenger=self.passenger, route=self.route, scheduled_for=self.at + timedelta(hours=3, minutes=10)
+        )
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(
+            reverse("trip-detail", args=[overlapping.id]), {"driver": self.driver.pk, "status": "in_progress"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.later.pk), str(response.data["driver"]))
+        overlapping.refresh_from_db()
+        self.assertIsNone(overlapping.driver)
+
+    def test_admin_assignment_and_free_drivers(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse("trip-detail", args=[self.clash.id])
+        response = self.client.patch(url, {"driver": self.driver.pk, "status": "in_progress"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("driver", response.data)
+
+        free = reverse("routes-free-drivers", args=[self.route.pk])
+        during = (self.at + timedelta(minutes=10)).isoformat()
+        self.assertEqual(self.client.get(free, {"at": during}).data["drivers"], [])
+        after = (self.at + timedelta(hours=1)).isoformat()
+        self.assertEqual(self.client.get(free, {"at": after}).data["drivers"], [self.driver.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("trip-detail", args=[self.booked.id]), {"status": "cancelled"})
+        response = self.client.patch(url, {"driver": self.driver.pk, "status": "in_progress"})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SURGE_TICK_SECONDS=0, BOOKING_BATCH_SIZE=3)
+class BookingWriterTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul", region="kabul", latitude=34.5553, longitude=69.2075),
+            drop=Location.objects.create(name="Herat", region="herat", latitude=34.3529, longitude=62.2040),
+            price_af=500,
+        )
+        distances.matrix.refresh()
+
+    def trip(self, **extra):
+        return Trip(passenger=self.passenger, route=self.route, fare=self.route.price_af, **extra)
+
+    @override_settings(BOOKING_FLUSH_INTERVAL_MS=5)
+    def test_flush_commits_queued_trips_in_batches(self):
+        writer = BookingWriter()
+        get_count(Trip)
+        with mock.patch.object(writer, "_ensure_thread"):
+            futures = [writer.submit(self.trip()) for _ in range(7)]
+        self.assertEqual(len(writer), 7)
+        self.assertFalse(any(future.done() for future in futures))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(writer.flush(), 7)
+        trips = [future.result() for future in futures]
+        self.assertEqual(Trip.objects.filter(pk__in=[trip.pk for trip in trips]).count(), 7)
+        self.assertEqual({trip.region for trip in trips}, {"kabul"})
+        self.assertAlmostEqual(float(trips[0].distance_km), 643, delta=5)
+        self.assertFalse(trips[0]._state.adding)
+        self.assertEqual(get_count(Trip), (7, True))
+
+    @override_settings(BOOKING_FLUSH_INTERVAL_MS=5)
+    def test_failed_row_only_fails_its_own_booking(self):
+        writer = BookingWriter()
+        with mock.patch.object(writer, "_ensure_thread"):
+            good = writer.submit(self.trip())
+            bad = writer.submit(self.trip(passenger_count=None))
+        with self.assertLogs("apps.vehicle.booking", "ERROR"):
+            self.assertEqual(writer.flush(), 1)
+        self.assertIsNotNone(good.result().pk)
+        with self.assertRaises(IntegrityError):
+            bad.result()
+
+    @override_settings(BOOKING_FLUSH_INTERVAL_MS=5, BOOKING_COMMIT_TIMEOUT=0.01)
+    def test_timed_out_booking_is_withdrawn(self):
+        writer = BookingWriter()
+        # A stalled writer: nothing flushes the queue while save() waits.
+        with mock.patch.object(writer, "_ensure_thread"):
+            with self.assertRaises(TimeoutError):
+                writer.save(self.trip())
+        self.assertEqual(len(writer), 0)
+        self.assertEqual(writer.flush(), 0)
+        self.assertFalse(Trip.objects.exists())
+
+    @override_settings(BOOKING_FLUSH_INTERVAL_MS=5, BOOKING_COMMIT_TIMEOUT=0.01)
+    def test_cancelled_booking_is_skipped_by_flush(self):
+        writer = BookingWriter()
+        with mock.patch.object(writer, "_ensure_thread"):
+            kept = writer.submit(self.trip())
+            dropped = writer.submit(self.trip())
+        dropped.cancel()
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(Trip.objects.get().pk, kept.result().pk)
+
+    @override_settings(BOOKING_GROUP_COMMIT=True, BOOKING_FLUSH_INTERVAL_MS=5, BOOKING_COMMIT_TIMEOUT=0.01)
+    def test_timed_out_booking_is_a_503(self):
+        client = APIClient()
+        client.force_authenticate(self.passenger)
+        with mock.patch.object(booking.writer, "_ensure_thread"):
+            response = client.post(reverse("trip-list-create"), {"route_id": self.route.pk})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(len(booking.writer), 0)
+        self.assertFalse(Trip.objects.exists())
+
+    @override_settings(BOOKING_GROUP_COMMIT=True, BOOKING_FLUSH_INTERVAL_MS=0)
+    def test_booking_through_the_api(self):
+        client = APIClient()
+        client.force_authenticate(self.passenger)
+        response = client.post(reverse("trip-list-create"), {"route_id": self.route.pk})
+        self.assertEqual(response.status_code, 201)
+        trip = Trip.objects.get(id=response.data["id"])
+        self.assertEqual((trip.passenger, trip.region), (self.passenger, "kabul"))
+        self.assertEqual(len(booking.writer), 0)
+
+
+@override_settings(TRIP_EXPIRY_MINUTES=30, TRIP_EXPIRY_INTERVAL_SECONDS=0)
+class TripExpiryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.driver = User.objects.create_user(
+            "Dawood", "Driver", "dawood@example.com", "x", role="driver"
+        )
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        self.stale = [self.trip(minutes_ago=45 + i) for i in range(3)]
+        self.fresh = self.trip(minutes_ago=5)
+        self.scheduled = self.trip(minutes_ago=45, scheduled_for=timezone.now() + timedelta(hours=2))
+        self.assigned = self.trip(minutes_ago=45, driver=self.driver, status="in_progress")
+
+    def trip(self, minutes_ago, **extra):
+        trip = Trip.objects.create(passenger=self.passenger, route=self.route, **extra)
+        Trip.objects.filter(pk=trip.pk).update(request_time=timezone.now() - timedelta(minutes=minutes_ago))
+        return trip
+
+    def test_sweep_cancels_only_stale_open_requests(self):
+        before = expiry.get_expiry_metrics()
+        self.assertEqual(expiry.sweep(batch_size=2), 3)
+        statuses = dict(Trip.objects.values_list("pk", "status"))
+        self.assertEqual({statuses[trip.pk] for trip in self.stale}, {"cancelled"})
+        self.assertEqual(statuses[self.fresh.pk], "requested")
+        self.assertEqual(statuses[self.scheduled.pk], "requested")
+        self.assertEqual(statuses[self.assigned.pk], "in_progress")
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ["pari@example.com"])
+        metrics = expiry.get_expiry_metrics()
+        self.assertEqual(metrics["last_expired"], 3)
+        self.assertEqual(metrics["expired"] - before["expired"], 3)
+        self.assertEqual(expiry.sweep(), 0)
+
+    def test_sweeper_starts_with_the_app_not_the_board(self):
+        with mock.patch.object(expiry.sweeper, "start") as start:
+            client = APIClient()
+            client.force_authenticate(self.driver)
+            client.get(reverse("driver-available-trips"))
+            start.assert_not_called()
+            config = django_apps.get_app_config("vehicle")
+            with mock.patch("apps.vehicle.apps.post_migrate"), \
+                    mock.patch("apps.vehicle.sharding.connect_signals"), \
+                    mock.patch("apps.vehicle.availability.connect_signals"), \
+                    mock.patch("apps.vehicle.eta.connect_signals"):
+                config.ready()
+                start.assert_not_called()
+                with override_settings(TRIP_EXPIRY_INTERVAL_SECONDS=60):
+                    config.ready()
+        start.assert_called_once_with()
+
+    def test_sweep_reads_the_status_request_time_index(self):
+        plan = expiry.stale_trips(timezone.now(), "default").order_by("request_time").explain()
+        self.assertIn("trip_status_request_time_idx", plan)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("expire_trips", "--minutes", "1", "--no-notify", stdout=out)
+        self.assertIn("Expired 4 trip requests", out.getvalue())
+        self.assertEqual(mail.outbox, [])
+
+
+class PoolingTests(TestCase):
+    def test_pack_is_first_fit_decreasing(self):
+        self.assertEqual(
+            pooling.pack([(1, 3), (2, 2), (3, 1), (4, 2), (5, 1)], 4), [(1, 3), (2, 4), (5,)]
+        )
+        self.assertEqual(pooling.pack([(1, 6), (2, 1)], 4), [(1,), (2,)])
+
+    @override_settings(POOL_FARE_FACTOR=1.3)
+    def test_split_fares(self):
+        self.assertEqual(
+            pooling.split_fares([Decimal("500"), Decimal("500")], [1, 3]),
+            [Decimal("162.50"), Decimal("487.50")],
+        )
+        # Nobody pays more than their own fare; the others cover the rest.
+        self.assertEqual(
+            pooling.split_fares([Decimal("100"), Decimal("1000")], [3, 1]),
+            [Decimal("100"), Decimal("1000.00")],
+        )
+        self.assertEqual(
+            pooling.split_fares([Decimal("100"), Decimal("500"), Decimal("500")], [2, 1, 1]),
+            [Decimal("100"), Decimal("275.00"), Decimal("275.00")],
+        )
+
+
+@override_settings(SURGE_TICK_SECONDS=0, POOL_WINDOW_MINUTES=15, POOL_DEFAULT_SEATS=4, POOL_FARE_FACTOR=1.3)
+class PooledBoardTests(TestCase):
+    def setUp(self):
+        availability.calendar.clear()
+        pooling.engine.clear()
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.driver = User.objects.create_user(
+            "Dawood", "Driver", "dawood@example.com", "x", role="driver"
+        )
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+        self.route.drivers.add(self.driver)
+        add_vehicle(self.driver, Vehicle.ECONOMY)
+        eligibility.index.refresh(force=True)
+        distances.matrix.refresh()
+        self.at = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.pooled = [self.trip(1), self.trip(2, minutes=5), self.trip(1, minutes=10)]
+        self.later = self.trip(1, minutes=180)
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def trip(self, passengers, minutes=0):
+        return Trip.objects.create(
+            passenger=self.passenger, route=self.route, fare=500, passenger_count=passengers,
+            scheduled_for=self.at + timedelta(minutes=minutes),
+        )
+
+    def test_board_offers_bundles_with_split_fares(self):
+        response = self.client.get(reverse("driver-available-bundles"))
+        self.assertEqual(response.status_code, 200)
+        units = sorted(response.data, key=lambda unit: -len(unit["trips"]))
+        self.assertEqual([len(unit["trips"]) for unit in units], [3, 1])
+        bundle = units[0]
+        self.assertTrue(bundle["pooled"])
+        self.assertEqual(bundle["passenger_count"], 4)
+        self.assertEqual(Decimal(bundle["fare"]), Decimal("650.00"))
+        self.assertEqual(
+            {trip["pk"]: Decimal(trip["fare_share"]) for trip in bundle["trips"]},
+            {
+                self.pooled[0].pk: Decimal("162.50"),
+                self.pooled[1].pk: Decimal("325.00"),
+                self.pooled[2].pk: Decimal("162.50"),
+            },
+        )
+
+    def test_bookings_are_pooled_as_they_arrive(self):
+        pooling.engine.sync()
+        extra = self.trip(1, minutes=181)
+        self.assertEqual(pooling.engine.bundle_of(extra.pk), (extra.pk,))
+        pooling.engine.sync()
+        self.assertEqual(set(pooling.engine.bundle_of(extra.pk)), {self.later.pk, extra.pk})
+
+    def test_accept_bundle(self):
+        pks = [trip.pk for trip in self.pooled]
+        url = reverse("driver-accept-bundle")
+        too_many = self.trip(1, minutes=1)
+        response = self.client.post(url, {"trips": [*pks, too_many.pk]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(url, {"trips": pks}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["fare"]), Decimal("650.00"))
+        trips = list(Trip.objects.filter(pk__in=pks))
+        self.assertEqual({(trip.driver_id, trip.status) for trip in trips}, {(self.driver.pk, "in_progress")})
+        self.assertEqual(len({trip.pool_id for trip in trips}), 1)
+        self.assertEqual(sum(trip.fare for trip in trips), Decimal("650.00"))
+        # Pooled trips overlap each other without conflicting.
+        self.assertEqual(availability.calendar.conflicts(self.driver.pk, trips[0]), [])
+        self.assertEqual(sorted(availability.calendar.conflicts(self.driver.pk, too_many)), sorted(pks))
+
+        response = self.client.post(url, {"trips": pks}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(FORECAST_HISTORY_WEEKS=2, FORECAST_SMOOTHING=0)
+class DemandForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.admin = User.objects.create_user("Ada", "Admin", "ada@example.com", "x", role="admin")
+        kabul, herat, mazar = (Location.objects.create(name=name) for name in ("Kabul", "Herat", "Mazar"))
+        self.busy = Route.objects.create(pickup=kabul, drop=herat, price_af=500)
+        self.quiet = Route.objects.create(pickup=kabul, drop=mazar, price_af=500)
+        # Two hours from now, one and two weeks back: 2 bookings each time.
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=2, minutes=10)
+        for weeks_ago in (1, 2):
+            for _ in range(2):
+                self.book(self.busy, hour - timedelta(weeks=weeks_ago))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def book(self, route, at):
+        trip = Trip.objects.create(passenger=self.passenger, route=route, status="completed")
+        Trip.objects.filter(pk=trip.pk).update(request_time=at)
+
+    def test_fit_smooths_across_weeks(self):
+        counts = np.concatenate([np.ones(168), np.full(168, 3)]).reshape(1, 336)
+        self.assertAlmostEqual(float(forecasting.fit(counts, 2, 0)[0, 0]), 2.0)
+        # The latest week weighs 0.5, the one before 0.25: normalised 2/3 and 1/3.
+        self.assertAlmostEqual(float(forecasting.fit(counts, 2, 0.5)[0, 0]), 7 / 3, places=5)
+
+    def test_forecast_endpoint(self):
+        url = reverse("routes-forecast")
+        response = self.client.get(url, {"hours": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["hours"]), 3)
+        busy, quiet = response.data["routes"]
+        self.assertEqual((busy["route"], busy["forecast"], busy["total"]), (self.busy.pk, [0.0, 0.0, 2.0], 2.0))
+        self.assertEqual((quiet["route"], quiet["total"]), (self.quiet.pk, 0.0))
+
+        response = self.client.get(url, {"hours": 3, "route": self.quiet.pk})
+        self.assertEqual([row["route"] for row in response.data["routes"]], [self.quiet.pk])
+        self.assertEqual(self.client.get(url, {"hours": 0}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"route": 999}).status_code, 404)
+
+        self.client.force_authenticate(self.passenger)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_forecast_is_cached_until_refreshed(self):
+        forecasting.get_forecast()
+        self.book(self.quiet, timezone.now() - timedelta(days=1))
+        self.assertEqual(forecasting.get_forecast()["trips"], 4)
+        out = StringIO()
+        call_command("refresh_demand_forecast", stdout=out)
+        self.assertIn("Forecast 2 routes from 5 trips", out.getvalue())
+        self.assertEqual(forecasting.get_forecast()["trips"], 5)
+
+
+class KLLSketchTests(TestCase):
+    def test_quantiles_memory_bound_and_merge(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(3.5, 0.4) for _ in range(50_000)]
+        ordered = sorted(values)
+        halves = eta.KLLSketch(k=100), eta.KLLSketch(k=100)
+        for i, value in enumerate(values):
+            halves[i % 2].update(value)
+        for sketch in (halves[0], halves[0].merge(halves[1])):
+            self.assertLessEqual(len(sketch), 3 * 100 + 2 * math.log2(sketch.n / 100))
+        self.assertEqual(halves[0].n, 50_000)
+        for fraction, value in zip((0.5, 0.9), halves[0].quantiles((0.5, 0.9))):
+            self.assertAlmostEqual(bisect.bisect_left(ordered, value) / len(values), fraction, delta=0.02)
+
+        restored = eta.KLLSketch.from_dict(halves[0].to_dict())
+        self.assertEqual(restored.n, halves[0].n)
+        self.assertEqual(eta.KLLSketch().quantiles((0.5,)), [None])
+
+
+@override_settings(SURGE_TICK_SECONDS=0)
+class RouteEtaTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.passenger = User.objects.create_user("Pari", "Passenger", "pari@example.com", "x")
+        self.route = Route.objects.create(
+            pickup=Location.objects.create(name="Kabul"),
+            drop=Location.objects.create(name="Herat"),
+            price_af=500,
+        )
+
+    def complete(self, minutes):
+        start = timezone.now() - timedelta(hours=5)
+        trip = Trip.objects.create(passenger=self.passenger, route=self.route, start_time=start)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.status = "completed"
+            trip.end_time = start + timedelta(minutes=minutes)
+            trip.save()
+        return trip
+
+    def test_completed_trips_update_route_eta(self):
+        for minutes in (40, 50, 60, 70, 200):
+            self.complete(minutes)
+        self.route.refresh_from_db()
+        self.assertEqual((self.route.eta_p50_minutes, self.route.eta_p90_minutes), (60.0, 200.0))
+        self.assertEqual(self.route.duration_sketch.trips, 5)
+
+        # Saving a completed trip again does not count it twice.
+        trip = Trip.objects.get(pk=self.complete(45).pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.notes_for_driver = "Thanks"
+            trip.save()
+        self.assertEqual(RouteDurationSketch.objects.get(route=self.route).trips, 6)
+
+        client = APIClient()
+        data = client.get(reverse("routes-detail", args=[self.route.pk])).data
+        self.assertEqual((data["eta_p50_minutes"], data["eta_p90_minutes"]), (50.0, 200.0))
+        data = client.get(reverse("routes-quote", args=[self.route.pk])).data
+        self.assertEqual((data["eta_p50_minutes"], data["eta_p90_minutes"]), (50.0, 200.0))
+
+    def test_rebuild_command(self):
+        start = timezone.now() - timedelta(hours=5)
+        Trip.objects.bulk_create(
+            Trip(
+                passenger=self.passenger, route=self.route, status="completed",
+                start_time=start, end_time=start + timedelta(minutes=minutes),
+            )
+            for minutes in (30, 30, 90)
+        )
+        out = StringIO()
+        call_command("rebuild_eta_sketches", stdout=out)
+        self.assertIn("Sketched 3 trips on 1 routes", out.getvalue())
+        self.route.refresh_from_db()
+        self.assertEqual((self.route.eta_p50_minutes, self.route.eta_p90_minutes), (30.0, 90.0))
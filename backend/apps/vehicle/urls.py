@@ -1,8 +1,11 @@
 # apps/vehicle/urls.py
 
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from apps.common.async_views import read_write_view
+
 # --- THIS IS THE CORRECTED IMPORT LIST ---
 from .views import (
     AdminApplicationDetailView,
@@ -19,8 +22,19 @@ from .views import (
     VehicleListCreateView,
     AvailableTripRequestListView,
     AcceptTripView,   
+    AvailableTripBundleListView,
+    AcceptBundleView,
     DriverVehicleManageView,
-    AdminDashboardStatsView
+    AdminDashboardStatsView,
+    DriverLocationIngestView,
+    TripNearbyDriversView,
+    AsyncAdminDashboardStatsView,
+    AsyncAdminTripListView,
+    AsyncAvailableTripRequestListView,
+    AsyncDriverTripListView,
+    AsyncPassengerTripListView,
+    AsyncRouteDetailView,
+    AsyncRouteListView,
 )
 # --- END OF FIX ---
 
@@ -42,7 +56,46 @@ urlpatterns = [
     path("admin/applications/<uuid:id>/", AdminApplicationDetailView.as_view(), name="admin-applications-detail"),
     path("driver/available-trips/", AvailableTripRequestListView.as_view(), name="driver-available-trips"),
     path("trips/<int:pk>/accept/", AcceptTripView.as_view(), name="driver-accept-trip"),
+    path("driver/available-bundles/", AvailableTripBundleListView.as_view(), name="driver-available-bundles"),
+    path("driver/bundles/accept/", AcceptBundleView.as_view(), name="driver-accept-bundle"),
     path("driver/vehicles/", DriverVehicleManageView.as_view(), name="driver-vehicle-list-create"),
     path("admin/vehicles/", VehicleListCreateView.as_view(), name="admin-vehicle-list-create"),
     path("admin/dashboard-stats/", AdminDashboardStatsView.as_view(), name="admin-dashboard-stats"),
-]
\ No newline at end of file
+    path("driver/location/", DriverLocationIngestView.as_view(), name="driver-location"),
+    path("trips/<int:pk>/nearby-drivers/", TripNearbyDriversView.as_view(), name="trip-nearby-drivers"),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    # Under ASGI the hot read endpoints are served by async views; these
+    # patterns come first so they shadow the synchronous ones above.
+    urlpatterns = [
+        path(
+            "vehicle/routes/",
+            read_write_view(
+                AsyncRouteListView.as_view(),
+                RouteViewSet.as_view({"get": "list", "post": "create"}),
+            ),
+            name="routes-list",
+        ),
+        path(
+            "vehicle/routes/<int:pk>/",
+            read_write_view(
+                AsyncRouteDetailView.as_view(),
+                RouteViewSet.as_view(
+                    {"put": "update", "patch": "partial_update", "delete": "destroy"}
+                ),
+            ),
+            name="routes-detail",
+        ),
+        path(
+            "trips/",
+            read_write_view(
+                AsyncPassengerTripListView.as_view(), TripRequestCreateView.as_view()
+            ),
+            name="trip-list-create",
+        ),
+        path("driver/trips/", AsyncDriverTripListView.as_view(), name="driver-trip-list"),
+        path("admin/trips/", AsyncAdminTripListView.as_view(), name="admin-trip-list"),
+        path("driver/available-trips/", AsyncAvailableTripRequestListView.as_view(), name="driver-available-trips"),
+        path("admin/dashboard-stats/", AsyncAdminDashboardStatsView.as_view(), name="admin-dashboard-stats"),
+    ] + urlpatterns
@@ -1,39 +1,61 @@
 # apps/vehicle/views.py
+import uuid
+from collections import Counter
 from datetime import date, timedelta
+
+import numpy as np
+from asgiref.sync import sync_to_async
 from django.db.models.functions import TruncDate
+from django.db import transaction
 from django.db.models import Count 
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import generics, permissions, viewsets
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.decorators import action
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from .models import Location, Route, Trip, Vehicle, DriverApplication
 from .permissions import IsAdmin, IsDriver, IsOwnerOrReadOnly, IsPassenger
+from .sharding import trip_shard_aliases
 from rest_framework.permissions import IsAuthenticated, AllowAny 
 from .serializers import (
     AdminDriverApplicationSerializer, AdminTripListSerializer, AdminTripUpdateSerializer,
     DriverApplicationSerializer, DriverTripSerializer, LocationSerializer, RouteSerializer,
-    TripRequestSerializer, TripUpdateSerializer, VehicleSerializer, AvailableTripRequestSerializer,DashboardRecentTripSerializer
+    TripRequestSerializer, TripUpdateSerializer, VehicleSerializer, AvailableTripRequestSerializer,DashboardRecentTripSerializer,
+    DriverLocationBatchSerializer, NearbyDriverSerializer, RouteQuoteSerializer,
+    AcceptBundleSerializer, TripBundleSerializer,
 )
+from . import availability, eligibility, forecasting, locations, pooling, pricing
 from django.contrib.auth import get_user_model
+from apps.common.async_views import AsyncAPIView, AsyncListAPIView, AsyncRetrieveAPIView
+from apps.common.cache import CachedResponseMixin
+from apps.common.counts import get_count
+from apps.common.routers import ReplicaReadMixin
 from rest_framework import status
 from rest_framework.response import Response # <-- Add Response
 from rest_framework.views import APIView
 User = get_user_model()
 
-class VehicleListCreateView(generics.ListCreateAPIView):
+class VehicleListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     # This view is for Admins to see ALL vehicles.
     # We will rename it to be more specific.
     queryset = Vehicle.objects.all()
+    cache_models = ("vehicle.Vehicle",)
+    cache_scope = "role"
     serializer_class = VehicleSerializer
     permission_classes = [IsAdmin] # <-- Change to IsAdmin
 
     def perform_create(self, serializer):
         # This logic is for an admin creating a vehicle for a driver
         serializer.save()
-class DriverVehicleManageView(generics.ListCreateAPIView):
+class DriverVehicleManageView(CachedResponseMixin, generics.ListCreateAPIView):
     """
     Allows a logged-in driver to list and create THEIR OWN vehicles.
     """
     serializer_class = VehicleSerializer
     permission_classes = [IsDriver] # <-- Only drivers can access this
+    cache_models = ("vehicle.Vehicle",)
+    cache_scope = "user"
 
     def get_queryset(self):
         """
@@ -54,27 +76,35 @@ class VehicleDetailView(generics.RetrieveUpdateDestroyAPIView):
     lookup_field = "id"
 
 
-class LocationListCreateView(generics.ListCreateAPIView):
+class LocationListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    cache_models = ("vehicle.Location",)
+    cache_scope = "role"
 
 
-class LocationDetailView(generics.RetrieveUpdateDestroyAPIView):
+class LocationDetailView(CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     lookup_field = "id"
+    cache_models = ("vehicle.Location",)
+    cache_scope = "role"
 
 
-class RouteViewSet(viewsets.ModelViewSet):
-    queryset = Route.objects.all()
+class RouteViewSet(CachedResponseMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Route.objects.select_related("pickup", "drop").prefetch_related(
+        "drivers", "vehicles"
+    )
     serializer_class = RouteSerializer
+    # Public landing/booking data; serializers nest Location and list vehicle ids.
+    cache_models = ("vehicle.Route", "vehicle.Location", "vehicle.Vehicle")
 
     def get_permissions(self):
        
         # For 'GET' requests (list/retrieve), allow public access.
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'quote']:
             permission_classes = [AllowAny]
         # For 'POST', 'PUT', 'DELETE' (create/edit), require an Admin.
         else:
@@ -82,30 +112,113 @@ class RouteViewSet(viewsets.ModelViewSet):
             
         return [permission() for permission in permission_classes]
 
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """
+        The route's current fare, the surge multiplier served from memory,
+        and its p50/p90 ETA (apps.vehicle.eta), one primary-key read. The
+        base fare is read there too, as a booking reads it.
+        """
+        try:
+            route_id = int(pk)
+        except ValueError:
+            raise NotFound('Route not found.')
+        row = Route.objects.filter(pk=route_id).values('price_af', 'eta_p50_minutes', 'eta_p90_minutes').first()
+        if row is None:
+            raise NotFound('Route not found.')
+        base_fare = row.pop('price_af')
+        multiplier = pricing.engine.multiplier(route_id)
+        return Response(RouteQuoteSerializer({
+            'route': route_id, 'base_fare': base_fare, 'surge_multiplier': multiplier,
+            'fare': pricing.surged_fare(base_fare, multiplier), **row,
+        }).data)
+
+    @action(detail=True, methods=['get'], url_path='free-drivers')
+    def free_drivers(self, request, pk=None):
+        """Eligible drivers with no trip at ?at= (default now), or over [?at=, ?until=)."""
+        route = self.get_object()
+        times = {}
+        for name in ('at', 'until'):
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValidationError({name: 'Must be an ISO 8601 datetime.'})
+            times[name] = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+        at = times.get('at') or timezone.now()
+        drivers = availability.calendar.free_drivers(route.pk, at, times.get('until'))
+        return Response({'route': route.pk, 'at': at, 'drivers': sorted(drivers)})
+
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """
+        Expected bookings per route for the next ?hours= (default 24, at most
+        168) hours, busiest first; ?route= limits it to one route.
+        """
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            raise ValidationError({'hours': 'Must be an integer.'})
+        if not 1 <= hours <= forecasting.HOURS_PER_WEEK:
+            raise ValidationError({'hours': f'Must be between 1 and {forecasting.HOURS_PER_WEEK}.'})
+
+        forecast = forecasting.get_forecast()
+        starts, expected = forecasting.next_hours(forecast, hours)
+        route_ids, totals = forecast['route_ids'], expected.sum(axis=1)
+        route = request.query_params.get('route')
+        if route is not None:
+            rows = np.flatnonzero(route_ids == int(route)) if route.isdigit() else []
+            if not len(rows):
+                raise NotFound('Route not found.')
+        else:
+            rows = np.argsort(-totals, kind='stable')
+        return Response({
+            'generated_at': forecast['generated_at'],
+            'hours': starts,
+            'routes': [
+                {
+                    'route': int(route_ids[i]),
+                    'total': round(float(totals[i]), 2),
+                    'forecast': [round(float(value), 2) for value in expected[i]],
+                }
+                for i in rows
+            ],
+        })
+
 
 class TripRequestCreateView(generics.ListCreateAPIView):
     serializer_class = TripRequestSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        return Trip.objects.filter(passenger=self.request.user)
+        return Trip.objects.filter(passenger=self.request.user).select_related(
+            'route__pickup', 'route__drop'
+        ).prefetch_related('route__drivers', 'route__vehicles').scatter()
 
     def perform_create(self, serializer):
         serializer.save(passenger=self.request.user)
 
 
 class AdminTripListView(generics.ListAPIView):
-    queryset = Trip.objects.select_related('passenger', 'route__pickup', 'route__drop', 'driver').all().order_by('-request_time')
     serializer_class = AdminTripListSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
+    def get_queryset(self):
+        # Scatter-gather across trip shards, merged by request_time.
+        return Trip.objects.select_related(
+            'passenger', 'route__pickup', 'route__drop', 'driver'
+        ).order_by('-request_time').scatter()
+
 
 class DriverTripListView(generics.ListAPIView):
     serializer_class = DriverTripSerializer
     permission_classes = [permissions.IsAuthenticated, IsDriver]
 
     def get_queryset(self):
-        return Trip.objects.filter(driver=self.request.user)
+        return Trip.objects.filter(driver=self.request.user).select_related(
+            'passenger', 'route__pickup', 'route__drop'
+        ).scatter()
 
 
 class TripDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -113,6 +226,14 @@ class TripDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, (IsOwnerOrReadOnly | IsAdmin)]
     lookup_field = "id"
 
+    def get_object(self):
+        try:
+            trip = Trip.objects.scatter_get(id=self.kwargs[self.lookup_field])
+        except (Trip.DoesNotExist, DjangoValidationError):
+            raise NotFound('Trip not found.')
+        self.check_object_permissions(self.request, trip)
+        return trip
+
     def get_serializer_class(self):
         user = self.request.user
         if self.request.method in ['PATCH', 'PUT']:
@@ -144,7 +265,7 @@ class AdminApplicationDetailView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     lookup_field = 'id' # Use the application's UUID for the lookup
 
-class AvailableTripRequestListView(generics.ListAPIView):
+class AvailableTripRequestListView(ReplicaReadMixin, generics.ListAPIView):
     """
     Provides a list of unassigned trips on routes the logged-in driver services.
     """
@@ -152,15 +273,17 @@ class AvailableTripRequestListView(generics.ListAPIView):
     permission_classes = [IsDriver]
 
     def get_queryset(self):
-        driver = self.request.user
-        # Get all routes this driver is assigned to
-        driver_routes = driver.available_routes.all()
-        # Return trips that are 'requested', have no driver, and are on the driver's routes
+        # Trips on the driver's routes that one of their vehicles can take,
+        # read only from the shards of those routes' pickup regions
+        board = eligibility.index.board(self.request.user.pk)
+        if board is None:
+            return []
+        fitting, aliases = board
         return Trip.objects.filter(
-            status='requested',
-            driver__isnull=True,
-            route__in=driver_routes
-        ).select_related('route__pickup', 'route__drop', 'passenger').order_by('request_time')
+            fitting, status='requested', driver__isnull=True
+        ).select_related('route__pickup', 'route__drop', 'passenger').order_by('request_time').scatter(
+            aliases=aliases
+        )
 
 
 # --- NEW VIEW 2: To securely handle the 'accept' action ---
@@ -173,7 +296,7 @@ class AcceptTripView(APIView):
     def post(self, request, pk, format=None):
         driver = request.user
         try:
-            trip = Trip.objects.get(pk=pk)
+            trip = Trip.objects.scatter_get(pk=pk)
         except Trip.DoesNotExist:
             return Response({'detail': 'Trip not found.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -184,56 +307,336 @@ class AcceptTripView(APIView):
         if trip.status != 'requested':
             return Response({'detail': 'This trip is not available for acceptance.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if driver not in trip.route.drivers.all():
+        if not eligibility.index.serves(driver.pk, trip.route_id):
              return Response({'detail': 'You are not authorized to accept trips for this route.'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Assign the trip
-        trip.driver = driver
-        trip.status = 'in_progress'
-        trip.save()
+        if not eligibility.index.can_take(driver.pk, trip):
+            return Response({'detail': 'None of your vehicles can take this trip.'}, status=status.HTTP_403_FORBIDDEN)
+
+        conflicts = availability.calendar.conflicts(driver.pk, trip)
+        if conflicts:
+            return Response(
+                {'detail': 'You have another trip at this time.', 'conflicts': sorted(conflicts)},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        # Re-check under the shard's write lock: another worker may have
+        # taken the trip, or given this driver a clashing one, meanwhile.
+        with transaction.atomic(using=trip._state.db):
+            if not Trip.objects.using(trip._state.db).filter(
+                pk=trip.pk, status='requested', driver__isnull=True
+            ).exists():
+                return Response({'detail': 'This trip has already been assigned.'}, status=status.HTTP_400_BAD_REQUEST)
+            if not eligibility.index.can_take(driver.pk, trip, fresh=True):
+                return Response({'detail': 'You can no longer accept trips for this route.'}, status=status.HTTP_403_FORBIDDEN)
+            conflicts = availability.calendar.conflicts(driver.pk, trip, fresh=True)
+            if conflicts:
+                return Response(
+                    {'detail': 'You have another trip at this time.', 'conflicts': sorted(conflicts)},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            trip.driver = driver
+            trip.status = 'in_progress'
+            trip.save()
+        availability.calendar.record(trip)
+        pooling.engine.discard([trip.pk])
 
         return Response({'detail': 'Trip accepted successfully.'}, status=status.HTTP_200_OK)
-    
 
-class AdminDashboardStatsView(APIView):
+
+class AvailableTripBundleListView(AvailableTripRequestListView):
+    """
+    The trip board with compatible trips pooled into bundles a driver
+    accepts as one unit (apps.vehicle.pooling).
+    """
+    serializer_class = TripBundleSerializer
+
+    def get_queryset(self):
+        trips = list(super().get_queryset())
+        if not trips:
+            return []
+        pooling.engine.sync()
+        return pooling.engine.bundles_for(trips, eligibility.index.vehicle_types(self.request.user.pk))
+
+
+class AcceptBundleView(APIView):
+    """
+    Assigns a driver to every trip of a bundle at once, at the split fares.
+    """
+    permission_classes = [IsDriver]
+
+    def post(self, request, format=None):
+        serializer = AcceptBundleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pks = serializer.validated_data['trips']
+        driver = request.user
+
+        trips = list(Trip.objects.filter(pk__in=pks).select_related('route').scatter())
+        if len(trips) != len(pks):
+            return Response({'detail': 'Trip not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if any(trip.driver_id is not None or trip.status != 'requested' for trip in trips):
+            return Response({'detail': 'These trips are no longer available.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        first = trips[0]
+        key = pooling.pool_key(first.route_id, first.vehicle_type, first.scheduled_for or first.request_time)
+        passengers = sum(trip.passenger_count for trip in trips)
+        if any(
+            pooling.pool_key(trip.route_id, trip.vehicle_type, trip.scheduled_for or trip.request_time) != key
+            for trip in trips
+        ) or passengers > pooling.seats_for(first.vehicle_type):
+            return Response({'detail': 'These trips cannot be pooled.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not eligibility.index.serves(driver.pk, first.route_id):
+            return Response({'detail': 'You are not authorized to accept trips for this route.'}, status=status.HTTP_403_FORBIDDEN)
+        if not eligibility.fits(eligibility.index.vehicle_types(driver.pk), first.vehicle_type, passengers):
+            return Response({'detail': 'None of your vehicles can take these trips.'}, status=status.HTTP_403_FORBIDDEN)
+
+        conflicts = {pk for trip in trips for pk in availability.calendar.conflicts(driver.pk, trip)}
+        if conflicts:
+            return Response(
+                {'detail': 'You have another trip at this time.', 'conflicts': sorted(conflicts)},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        bundle = pooling.Bundle(trips)
+        pool_id = uuid.uuid4() if bundle.pooled else None
+        # One route, so one pickup region and one shard.
+        alias = first._state.db
+        with transaction.atomic(using=alias):
+            still_open = Trip.objects.using(alias).filter(
+                pk__in=pks, status='requested', driver__isnull=True
+            ).count()
+            if still_open != len(pks):
+                return Response({'detail': 'These trips are no longer available.'}, status=status.HTTP_400_BAD_REQUEST)
+            if not (
+                eligibility.index.serves(driver.pk, first.route_id, fresh=True)
+                and eligibility.fits(
+                    eligibility.index.vehicle_types(driver.pk, fresh=True), first.vehicle_type, passengers
+                )
+            ):
+                return Response({'detail': 'You can no longer accept these trips.'}, status=status.HTTP_403_FORBIDDEN)
+            conflicts = {pk for trip in trips for pk in availability.calendar.conflicts(driver.pk, trip, fresh=True)}
+            if conflicts:
+                return Response(
+                    {'detail': 'You have another trip at this time.', 'conflicts': sorted(conflicts)},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            for trip in bundle.trips:
+                trip.driver = driver
+                trip.status = 'in_progress'
+                trip.fare = trip.fare_share
+                trip.pool_id = pool_id
+                trip.save()
+        for trip in bundle.trips:
+            availability.calendar.record(trip)
+        pooling.engine.discard(pks)
+
+        return Response(
+            {'detail': 'Trips accepted successfully.', 'fare': bundle.fare, 'trips': pks},
+            status=status.HTTP_200_OK,
+        )
+
+
+def dashboard_stats():
+    """
+    The admin dashboard's KPIs, recent trips and 7-day chart, shared by the
+    sync and async dashboard views.
+    """
+    # KPI Card Stats, served from maintained row counts (apps.common.counts)
+    counts = [
+        get_count(User),
+        get_count(User, role=User.Role.DRIVER),
+        get_count(User, role=User.Role.PASSENGER),
+        get_count(Trip),
+        get_count(DriverApplication, status='pending'),
+    ]
+    total_users, total_drivers, total_passengers, total_trips, pending_applications = (
+        count for count, _ in counts
+    )
+
+    # Recent Trips List (Last 5), gathered from every trip shard
+    recent_trips_qs = Trip.objects.select_related(
+        'passenger', 'route__pickup', 'route__drop'
+    ).order_by('-request_time')[:5].scatter()
+    recent_trips_serializer = DashboardRecentTripSerializer(recent_trips_qs, many=True)
+
+    # Bar Chart Data (Trips in the last 7 days), summed across shards
+    seven_days_ago = date.today() - timedelta(days=7)
+    trips_per_day = Counter()
+    for alias in trip_shard_aliases():
+        per_day = (
+            Trip.objects.using(alias).filter(request_time__date__gte=seven_days_ago)
+            .annotate(day=TruncDate('request_time'))
+            .values('day')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for item in per_day:
+            trips_per_day[item['day']] += item['count']
+    chart_data = [{'date': day.strftime('%b %d'), 'trips': count} for day, count in sorted(trips_per_day.items())]
+
+    # Consolidate all data into a single response object
+    return {
+        'kpi': {
+            'total_users': total_users,
+            'total_drivers': total_drivers,
+            'total_passengers': total_passengers,
+            'total_trips': total_trips,
+            'pending_applications': pending_applications,
+            'approximate': any(approximate for _, approximate in counts),
+        },
+        'recent_trips': recent_trips_serializer.data,
+        'chart_data': chart_data
+    }
+
+
+class AdminDashboardStatsView(ReplicaReadMixin, APIView):
    
     permission_classes = [IsAdmin]
 
     def get(self, request, format=None):
-        # KPI Card Stats
-        total_users = User.objects.count()
-        total_drivers = User.objects.filter(role=User.Role.DRIVER).count()
-        total_passengers = User.objects.filter(role=User.Role.PASSENGER).count()
-        total_trips = Trip.objects.count()
-        pending_applications = DriverApplication.objects.filter(status='pending').count()
-
-        # Recent Trips List (Last 5)
-        recent_trips_qs = Trip.objects.select_related(
+        return Response(dashboard_stats())
+
+
+class DriverLocationIngestView(APIView):
+    """
+    A driver posts a batch of GPS fixes: {"points": [{"latitude", "longitude",
+    "recorded_at"?}, ...]}. The newest becomes their live position; all are
+    stored write-behind.
+    """
+    permission_classes = [IsDriver]
+
+    def post(self, request, format=None):
+        serializer = DriverLocationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        accepted = locations.ingest(
+            request.user.pk,
+            [
+                (point['latitude'], point['longitude'], point.get('recorded_at'))
+                for point in serializer.validated_data['points']
+            ],
+        )
+        return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
+
+
+class TripNearbyDriversView(APIView):
+    """
+    The closest free drivers of a trip's route to its pickup location
+    (?k=, default 5), for the trip's passenger or an admin.
+    """
+    permission_classes = [IsAuthenticated]
+    max_results = 50
+
+    def get(self, request, pk, format=None):
+        try:
+            trip = Trip.objects.scatter_get(pk=pk)
+        except Trip.DoesNotExist:
+            raise NotFound('Trip not found.')
+        if request.user.role != User.Role.ADMIN and trip.passenger_id != request.user.pk:
+            raise PermissionDenied('You cannot view drivers for this trip.')
+        pickup = trip.route.pickup
+        if pickup.latitude is None or pickup.longitude is None:
+            raise ValidationError({'detail': 'The pickup location has no coordinates.'})
+        try:
+            k = min(max(int(request.query_params.get('k', 5)), 1), self.max_results)
+        except ValueError:
+            raise ValidationError({'k': 'Must be an integer.'})
+
+        drivers = eligibility.index.drivers_for(
+            trip.route_id, trip.vehicle_type, trip.passenger_count
+        )
+        nearby = locations.nearest_available_drivers(pickup, k=k, drivers=drivers)
+        return Response(NearbyDriverSerializer(nearby, many=True).data)
+
+
+# --- Async read views, routed under ASGI (settings.ASYNC_READ_VIEWS) ---
+# Each mirrors the GET side of the view above it in the URLconf and preloads
+# everything its serializer reads, since lazy queries cannot run in the loop.
+
+ROUTE_RELATIONS = ('route__drivers', 'route__vehicles')
+
+
+class AsyncRouteListView(CachedResponseMixin, ReplicaReadMixin, AsyncListAPIView):
+    queryset = RouteViewSet.queryset
+    serializer_class = RouteSerializer
+    permission_classes = [AllowAny]
+    cache_models = RouteViewSet.cache_models
+
+    async def get(self, request, *args, **kwargs):
+        return await self.acached_response(
+            request, lambda: super(AsyncRouteListView, self).get(request, *args, **kwargs)
+        )
+
+
+class AsyncRouteDetailView(CachedResponseMixin, ReplicaReadMixin, AsyncRetrieveAPIView):
+    queryset = RouteViewSet.queryset
+    serializer_class = RouteSerializer
+    permission_classes = [AllowAny]
+    cache_models = RouteViewSet.cache_models
+
+    async def get(self, request, *args, **kwargs):
+        return await self.acached_response(
+            request, lambda: super(AsyncRouteDetailView, self).get(request, *args, **kwargs)
+        )
+
+
+class AsyncPassengerTripListView(AsyncListAPIView):
+    serializer_class = TripRequestSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Trip.objects.filter(passenger=self.request.user).select_related(
+            'route__pickup', 'route__drop'
+        ).prefetch_related(*ROUTE_RELATIONS)
+
+    async def aget_objects(self):
+        return await self.get_queryset().ascatter()
+
+
+class AsyncDriverTripListView(AsyncListAPIView):
+    serializer_class = DriverTripSerializer
+    permission_classes = [permissions.IsAuthenticated, IsDriver]
+
+    def get_queryset(self):
+        return Trip.objects.filter(driver=self.request.user).select_related(
             'passenger', 'route__pickup', 'route__drop'
-        ).order_by('-request_time')[:5]
-        recent_trips_serializer = DashboardRecentTripSerializer(recent_trips_qs, many=True)
-
-        # Bar Chart Data (Trips in the last 7 days)
-        seven_days_ago = date.today() - timedelta(days=7)
-        trips_per_day = (
-            Trip.objects.filter(request_time__date__gte=seven_days_ago)
-            .annotate(day=TruncDate('request_time')) # This line will now work
-            .values('day')
-            .annotate(count=Count('id')) 
-            .order_by('day')
         )
-        chart_data = [{'date': item['day'].strftime('%b %d'), 'trips': item['count']} for item in trips_per_day]
-
-        # Consolidate all data into a single response object
-        data = {
-            'kpi': {
-                'total_users': total_users,
-                'total_drivers': total_drivers,
-                'total_passengers': total_passengers,
-                'total_trips': total_trips,
-                'pending_applications': pending_applications,
-            },
-            'recent_trips': recent_trips_serializer.data,
-            'chart_data': chart_data
-        }
-        return Response(data)
\ No newline at end of file
+
+    async def aget_objects(self):
+        return await self.get_queryset().ascatter()
+
+
+class AsyncAdminTripListView(AsyncListAPIView):
+    serializer_class = AdminTripListSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def get_queryset(self):
+        return Trip.objects.select_related(
+            'passenger', 'route__pickup', 'route__drop', 'driver'
+        ).prefetch_related(*ROUTE_RELATIONS).order_by('-request_time')
+
+    async def aget_objects(self):
+        return await self.get_queryset().ascatter()
+
+
+class AsyncAvailableTripRequestListView(ReplicaReadMixin, AsyncListAPIView):
+    serializer_class = AvailableTripRequestSerializer
+    permission_classes = [IsDriver]
+
+    async def aget_objects(self):
+        board = await sync_to_async(eligibility.index.board)(self.request.user.pk)
+        if board is None:
+            return []
+        fitting, aliases = board
+        return await Trip.objects.filter(
+            fitting, status='requested', driver__isnull=True
+        ).select_related('route__pickup', 'route__drop', 'passenger').prefetch_related(
+            *ROUTE_RELATIONS
+        ).order_by('request_time').ascatter(aliases=aliases)
+
+
+class AsyncAdminDashboardStatsView(ReplicaReadMixin, AsyncAPIView):
+    permission_classes = [IsAdmin]
+
+    async def get(self, request, format=None):
+        return Response(await sync_to_async(dashboard_stats)())
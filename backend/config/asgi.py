@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
+# Route the hot read endpoints to their async views (see apps.common.async_views).
+os.environ.setdefault("ASYNC_READ_VIEWS", "1")
 
 application = get_asgi_application()
@@ -2,6 +2,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent
 BASE_DIR = ROOT_DIR / "apps"
 ALLOWED_HOSTS = ["0.0.0.0", "localhost", "127.0.0.1", "api"]
@@ -29,18 +31,23 @@ THIRD_PARTY_APPS = [
     "corsheaders",
 ]
 INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_PARTY_APPS
+# The apps.common.middleware entries are the stock Django middleware, skipped
+# for API_PATH_PREFIXES (JWT-only routes); admin/ and the docs run all of them.
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
-    "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "apps.common.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "apps.common.middleware.CsrfViewMiddleware",
+    "apps.common.middleware.AuthenticationMiddleware",
+    "apps.common.middleware.MessageMiddleware",
+    "apps.common.middleware.XFrameOptionsMiddleware",
+    "apps.common.idempotency.IdempotencyMiddleware",
 ]
+API_PATH_PREFIXES = ("/api/",)
+# Serve the hot read endpoints with async views (apps.common.async_views).
+# config/asgi.py turns this on; WSGI deployments keep the sync views.
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "") == "1"
 ROOT_URLCONF = "config.urls"
 TEMPLATES = [
     {
@@ -61,9 +68,65 @@ WSGI_APPLICATION = "config.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": ROOT_DIR / "db.sqlite3",
+        "NAME": os.getenv("DB_NAME", ROOT_DIR / "db.sqlite3"),
+        # Persistent connections keep the PRAGMAs and page cache warm.
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Take the write lock at BEGIN so busy_timeout applies instead of
+            # failing immediately when a reader tries to upgrade.
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+}
+# Applied to every new SQLite connection by apps.common.db.configure_sqlite.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative = KiB, i.e. 64 MiB
+    "temp_store": "MEMORY",
+}
+SQLITE_LOCK_RETRIES = 3
+SQLITE_LOCK_BACKOFF = 0.05
+
+# Read replicas: comma-separated aliases, each a SQLite copy of the primary
+# kept fresh by `manage.py sync_replicas`. Views opt in with ReplicaReadMixin.
+DATABASE_REPLICAS = [alias for alias in os.getenv("DB_REPLICAS", "").split(",") if alias]
+for _alias in DATABASE_REPLICAS:
+    DATABASES[_alias] = {
+        **DATABASES["default"],
+        "NAME": ROOT_DIR / f"{_alias}.sqlite3",
+        "TEST": {"MIRROR": "default"},
     }
+# Region-sharded trip storage: TRIP_SHARDS="kabul:trips_kabul,herat:trips_herat".
+# Regions that are not listed (and pre-sharding trips) stay in "default".
+# Each shard alias also needs a fixed number of 1 or more:
+# TRIP_SHARD_NUMBERS="trips_kabul:1,trips_herat:2". A shard's trip pks start
+# at number * TRIP_SHARD_PK_STRIDE, so a number must never change once the
+# shard holds trips.
+TRIP_SHARDS = dict(
+    pair.split(":", 1) for pair in os.getenv("TRIP_SHARDS", "").split(",") if pair
+)
+TRIP_SHARD_NUMBERS = {
+    alias: int(number)
+    for alias, number in (
+        pair.split(":", 1) for pair in os.getenv("TRIP_SHARD_NUMBERS", "").split(",") if pair
+    )
 }
+TRIP_SHARD_PK_STRIDE = 10**12
+SQLITE_ALIAS_PRAGMAS = {}
+for _alias in dict.fromkeys(TRIP_SHARDS.values()):
+    DATABASES[_alias] = {**DATABASES["default"], "NAME": ROOT_DIR / f"{_alias}.sqlite3"}
+    # Shards hold only the trip table; its foreign keys point at "default".
+    SQLITE_ALIAS_PRAGMAS[_alias] = {"foreign_keys": "OFF"}
+DATABASE_ROUTERS = [
+    "apps.vehicle.sharding.TripShardRouter",
+    "apps.common.routers.ReplicaRouter",
+]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_INTERVAL = 1.0
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -87,8 +150,164 @@ STATIC_ROOT = str(ROOT_DIR / "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = str(ROOT_DIR / "mediafile")
 
+# Uploaded images (profile photos, license scans). MaxUploadSizeHandler
+# stops reading a request once one of its files passes MAX_UPLOAD_SIZE.
+MAX_UPLOAD_SIZE = 1 * 1024 * 1024
+FILE_UPLOAD_HANDLERS = [
+    "apps.common.images.MaxUploadSizeHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+IMAGE_VARIANT_SIZES = {
+    "thumb": 96,
+    "small": 320,
+    "medium": 1024,
+}
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", 2))
+# "nginx" (X-Accel-Redirect), "apache" (X-Sendfile) or None to stream from Django.
+MEDIA_SENDFILE_BACKEND = os.getenv("MEDIA_SENDFILE_BACKEND") or None
+MEDIA_SENDFILE_URL_PREFIX = os.getenv("MEDIA_SENDFILE_URL_PREFIX", "/protected-media/")
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Row counts maintained by apps.common.counts instead of COUNT(*) scans.
+# Each model maps to the filters to track; {} is the whole table.
+TRACKED_ROW_COUNTS = {
+    "users.User": [{}, {"role": "driver"}, {"role": "passenger"}],
+    "profiles.Profile": [{}],
+    "vehicle.Trip": [{}],
+    "vehicle.DriverApplication": [{"status": "pending"}],
+}
+
+# Response cache for public and role-scoped read endpoints (apps.common.cache).
+# "locmem" is per process; use "file" when several workers must share
+# entries and version bumps.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "taxi-booking",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+if CACHE_BACKEND == "file":
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_DIR", str(ROOT_DIR / "cache")),
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    }
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300))
+# How long one request may hold the rebuild lock for a key while others wait.
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+# Models whose version counter is bumped on save/delete/m2m changes.
+RESPONSE_CACHE_MODELS = ["vehicle.Route", "vehicle.Location", "vehicle.Vehicle"]
+# In-process indexes built from those models (driver eligibility, surge
+# routes) also reload after this many seconds: with "locmem", version bumps
+# in one worker never reach the others.
+MODEL_INDEX_MAX_AGE = int(os.getenv("MODEL_INDEX_MAX_AGE", 30))
+
+# Idempotency-Key on API POSTs (apps.common.idempotency): how long responses
+# are replayed, how long a first request holds off its duplicates, and how
+# often each process sweeps expired records.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_LOCK_TIMEOUT = 10
+IDEMPOTENCY_SWEEP_INTERVAL = 3600
+
+# OpenAPI schema generated at build time by `manage.py generate_schema`.
+OPENAPI_SCHEMA_DIR = os.getenv("OPENAPI_SCHEMA_DIR", str(ROOT_DIR / "schema"))
+# Generate the schema per request instead; None follows DEBUG.
+OPENAPI_SCHEMA_LIVE = None
+OPENAPI_SCHEMA_MAX_AGE = 300
+
+# Live driver positions (apps.vehicle.locations). The latest point per driver
+# is kept in an in-memory grid of DRIVER_GRID_CELL_DEG cells (~1.1 km) and
+# forgotten after DRIVER_LOCATION_TTL seconds without an update. Every point
+# is written behind to DriverLocation in batches; other processes pick them
+# up from there, so positions are at most one flush interval stale.
+DRIVER_GRID_CELL_DEG = 0.01
+DRIVER_LOCATION_TTL = int(os.getenv("DRIVER_LOCATION_TTL", 120))
+# 0 writes each ingest request synchronously.
+DRIVER_LOCATION_FLUSH_INTERVAL = float(os.getenv("DRIVER_LOCATION_FLUSH_INTERVAL", 1))
+DRIVER_LOCATION_BATCH_SIZE = 5000
+# Oldest unflushed points are dropped beyond this (database down or too slow).
+DRIVER_LOCATION_BUFFER_MAX = 200_000
+DRIVER_LOCATION_MAX_POINTS = 500
+# Points older than this are deleted by the writer, at most once per prune
+# interval per process, and by `manage.py prune_driver_locations`.
+DRIVER_LOCATION_RETENTION = int(os.getenv("DRIVER_LOCATION_RETENTION", 30 * DRIVER_LOCATION_TTL))
+DRIVER_LOCATION_PRUNE_INTERVAL = 60
+DRIVER_SEARCH_RADIUS_KM = 15
+
+# Pairwise Location distances (apps.vehicle.distances). With a path, the
+# matrix is a memory-mapped .npy shared by every worker on the host;
+# unset keeps a private copy in each process.
+DISTANCE_MATRIX_PATH = os.getenv("DISTANCE_MATRIX_PATH") or None
+
+# Surge pricing (apps.vehicle.pricing). Bookings and available drivers per
+# route are counted over a sliding SURGE_WINDOW_SECONDS window; once the
+# bookings per available driver exceed SURGE_RATIO_THRESHOLD, each extra
+# booking per driver adds SURGE_SENSITIVITY to the multiplier, up to
+# SURGE_MAX_MULTIPLIER. Multipliers move at most SURGE_MAX_STEP per tick.
+SURGE_WINDOW_SECONDS = int(os.getenv("SURGE_WINDOW_SECONDS", 900))
+SURGE_BUCKET_SECONDS = 60
+# 0 recomputes synchronously on every quote.
+SURGE_TICK_SECONDS = float(os.getenv("SURGE_TICK_SECONDS", 5))
+SURGE_RATIO_THRESHOLD = 1.0
+SURGE_SENSITIVITY = 0.5
+SURGE_MAX_MULTIPLIER = float(os.getenv("SURGE_MAX_MULTIPLIER", 2.5))
+SURGE_MAX_STEP = 0.25
+SURGE_ROUNDING = 0.05
+
+# Driver availability (apps.vehicle.availability). A trip without an
+# end_time is assumed to take distance_km at TRIP_AVERAGE_SPEED_KMH, at
+# least TRIP_MIN_DURATION_MINUTES, plus TRIP_TURNAROUND_MINUTES before the
+# driver's next trip.
+TRIP_AVERAGE_SPEED_KMH = 40
+TRIP_MIN_DURATION_MINUTES = 30
+TRIP_TURNAROUND_MINUTES = 15
+
+# Group-commit booking ingestion (apps.vehicle.booking): bookings are queued
+# and inserted by one writer thread with bulk_create(), flushed
+# BOOKING_FLUSH_INTERVAL_MS after the first queued booking or at
+# BOOKING_BATCH_SIZE, each request waiting up to BOOKING_COMMIT_TIMEOUT
+# seconds for its commit. An interval of 0 writes each booking in its request.
+BOOKING_GROUP_COMMIT = os.getenv("BOOKING_GROUP_COMMIT", "") == "1"
+BOOKING_FLUSH_INTERVAL_MS = float(os.getenv("BOOKING_FLUSH_INTERVAL_MS", 2))
+BOOKING_BATCH_SIZE = 500
+BOOKING_COMMIT_TIMEOUT = 10
+
+# Trip request expiry (apps.vehicle.expiry): unscheduled requests no driver
+# took within TRIP_EXPIRY_MINUTES are cancelled, TRIP_EXPIRY_BATCH_SIZE per
+# transaction. Run `manage.py expire_trips` from cron, or set
+# TRIP_EXPIRY_INTERVAL_SECONDS to sweep from a thread started at app loading
+# (0 = off; under `serve`, one thread in the preloaded master).
+TRIP_EXPIRY_MINUTES = int(os.getenv("TRIP_EXPIRY_MINUTES", 30))
+TRIP_EXPIRY_BATCH_SIZE = 200
+TRIP_EXPIRY_INTERVAL_SECONDS = float(os.getenv("TRIP_EXPIRY_INTERVAL_SECONDS", 0))
+
+# Ride pooling (apps.vehicle.pooling). Open trips on one route, of one
+# requested vehicle type and within one POOL_WINDOW_MINUTES window are
+# packed into bundles; trips that take any vehicle are packed into
+# POOL_DEFAULT_SEATS. A bundle's passengers split the largest member fare
+# times POOL_FARE_FACTOR. Open trips are fully reloaded every
+# POOL_RELOAD_SECONDS and tailed in between.
+POOL_WINDOW_MINUTES = int(os.getenv("POOL_WINDOW_MINUTES", 15))
+POOL_DEFAULT_SEATS = 4
+POOL_FARE_FACTOR = float(os.getenv("POOL_FARE_FACTOR", 1.3))
+POOL_RELOAD_SECONDS = 300
+
+# Demand forecasting (apps.vehicle.forecasting): hour-of-week bookings per
+# route over FORECAST_HISTORY_WEEKS, exponentially smoothed across weeks by
+# FORECAST_SMOOTHING (0 = plain average). `manage.py refresh_demand_forecast`
+# should run hourly; forecasts are cached for FORECAST_CACHE_SECONDS.
+FORECAST_HISTORY_WEEKS = int(os.getenv("FORECAST_HISTORY_WEEKS", 8))
+FORECAST_SMOOTHING = float(os.getenv("FORECAST_SMOOTHING", 0.3))
+FORECAST_CACHE_SECONDS = int(os.getenv("FORECAST_CACHE_SECONDS", 2 * 3600))
+
+# Route ETAs (apps.vehicle.eta): KLL sketch accuracy parameter. A sketch
+# keeps at most 3k + 2 log2(n / k) durations, under 650 (~4 KB) for k = 200.
+ETA_SKETCH_K = 200
+
 AUTH_USER_MODEL = "users.User"
 
 
@@ -105,6 +324,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
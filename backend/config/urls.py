@@ -1,16 +1,16 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+from apps.common.views import MediaServeView, SchemaView
 from drf_spectacular.views import (
-    SpectacularAPIView,
     SpectacularRedocView,
     SpectacularSwaggerView,
 )
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("api/schema/", SchemaView.as_view(), name="schema"),
     path("", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path(
         "api/schema/redoc/",
@@ -20,11 +20,14 @@ urlpatterns = [
     path("api/v1/auth/", include("apps.users.urls"), name="users"),
     path("api/v1/profiles/", include("apps.profiles.urls"), name="profiles"),
     path("api/v1/vehicle/", include("apps.vehicle.urls"), name="vehicle"),
+    path("api/v1/common/", include("apps.common.urls"), name="common"),
+    re_path(
+        r"^%s(?P<path>.+)$" % settings.MEDIA_URL.lstrip("/"),
+        MediaServeView.as_view(),
+        name="media",
+    ),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 admin.site.site_header = "Online Shopping Center Admin"
 admin.site.site_title = "Online Shopping Center Admin Portal"
 admin.site.index_title = "Welcome to Online Shopping Center API Portal"
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)